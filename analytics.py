@@ -0,0 +1,413 @@
+# analytics.py
+from __future__ import annotations
+
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Optional, Sequence
+
+from jobs import Job, report_jobs
+from models import Expense, Order, Product, Sale
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# =========================================================
+# ANÁLISES HISTÓRICAS (espelho colunar local em Parquet + DuckDB)
+# =========================================================
+#
+# sync() copia do banco só as linhas novas (id > marca d'água) de vendas,
+# cupons e despesas para arquivos Parquet particionados por empresa:
+#
+#   ANALYTICS_DIR/sales/company_id=1/part-000000000001-000000050000.parquet
+#   ANALYTICS_DIR/products/products.parquet   (reescrito inteiro: é pequeno e muda)
+#   ANALYTICS_DIR/_state.json                 (marcas d'água por tabela)
+#
+# report() roda GROUP BY no DuckDB direto sobre os arquivos, sem tocar no
+# banco de produção. Vendas, cupons e despesas são só inserção no app, mas
+# um id menor pode commitar depois de um maior (ou chegar atrasado na
+# réplica): por isso cada sync relê as ANALYTICS_OVERLAP_IDS ids abaixo da
+# marca d'água e copia só as que faltam no espelho.
+#
+# Dependências opcionais: duckdb e pyarrow (ver requirements.txt).
+
+ANALYTICS_DIR = os.getenv(
+    "ANALYTICS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".peegflow_analytics")
+)
+ANALYTICS_BATCH = int(os.getenv("ANALYTICS_BATCH", "50000"))
+ANALYTICS_SYNC_SECONDS = float(os.getenv("ANALYTICS_SYNC_SECONDS", "300"))
+ANALYTICS_COMPACT_PARTS = int(os.getenv("ANALYTICS_COMPACT_PARTS", "32"))
+ANALYTICS_OVERLAP_IDS = int(os.getenv("ANALYTICS_OVERLAP_IDS", "5000"))
+
+# tabela -> (modelo, colunas com tipo Arrow); company_id vem da partição
+TABLES = {
+    "sales": (Sale, [("id", "int64"), ("order_id", "int64"), ("product_id", "int64"), ("quantity", "int64"),
+                     ("price", "float64"), ("user_id", "int64"), ("date", "timestamp[us]")]),
+    "orders": (Order, [("id", "int64"), ("user_id", "int64"), ("subtotal", "float64"), ("discount", "float64"),
+                       ("total", "float64"), ("payment", "string"), ("date", "timestamp[us]")]),
+    "expenses": (Expense, [("id", "int64"), ("description", "string"), ("category", "string"),
+                           ("amount", "float64"), ("date", "timestamp[us]")]),
+}
+PRODUCT_COLUMNS = [("id", "int64"), ("company_id", "int64"), ("name", "string"), ("sku", "string"),
+                   ("price_retail", "float64"), ("price_wholesale", "float64")]
+
+# métrica -> (tabela, expressão)
+METRICS = {
+    "revenue": ("orders", "SUM(t.total)"),                      # líquida de desconto
+    "orders": ("orders", "COUNT(*)"),
+    "discount": ("orders", "SUM(t.discount)"),
+    "gross_revenue": ("sales", "SUM(t.price * t.quantity)"),
+    "quantity": ("sales", "SUM(t.quantity)"),
+    "expenses": ("expenses", "SUM(t.amount)"),
+}
+
+# dimensão -> (expressão, tabelas onde existe)
+_ALL = ("sales", "orders", "expenses")
+DIMENSIONS = {
+    "year": ("CAST(date_part('year', t.date) AS INTEGER)", _ALL),
+    "month": ("strftime(t.date, '%Y-%m')", _ALL),
+    "week": ("CAST(date_trunc('week', t.date) AS DATE)", _ALL),
+    "day": ("CAST(t.date AS DATE)", _ALL),
+    "weekday": ("CAST(isodow(t.date) AS INTEGER)", _ALL),      # 1 = segunda
+    "hour": ("CAST(date_part('hour', t.date) AS INTEGER)", _ALL),
+    "product": ("coalesce(p.name, 'Produto #' || t.product_id)", ("sales",)),
+    "category": ("coalesce(t.category, '-')", ("expenses",)),
+    "payment": ("coalesce(t.payment, 'Não informado')", ("orders",)),
+    "user": ("t.user_id", ("sales", "orders")),
+}
+
+
+def _duckdb_available() -> bool:
+    try:
+        import duckdb  # noqa: F401
+        import pyarrow  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+
+# =========================
+# 🔄 SINCRONIZAÇÃO INCREMENTAL
+# =========================
+
+_sync_lock = threading.Lock()
+
+
+@contextmanager
+def _file_lock(stale_after: float = 600.0):
+    """Trava entre processos (arquivo criado com O_EXCL); uma trava velha é descartada."""
+    path = os.path.join(ANALYTICS_DIR, "_sync.lock")
+    try:
+        if time.time() - os.path.getmtime(path) > stale_after:
+            os.remove(path)
+    except OSError:
+        pass
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        yield False
+        return
+    try:
+        os.write(fd, str(os.getpid()).encode("ascii"))
+        os.close(fd)
+        yield True
+    finally:
+        os.remove(path)
+
+
+def _state_path() -> str:
+    return os.path.join(ANALYTICS_DIR, "_state.json")
+
+
+def load_state() -> dict:
+    try:
+        with open(_state_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(state: dict) -> None:
+    tmp = f"{_state_path()}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, _state_path())
+
+
+def _arrow_table(rows, columns):
+    import pyarrow as pa
+
+    schema = pa.schema([(name, pa.type_for_alias(kind)) for name, kind in columns])
+    data = {name: [row[i] for row in rows] for i, (name, _) in enumerate(columns)}
+    return pa.Table.from_pydict(data, schema=schema)
+
+
+def _write_parquet(table, path: str) -> None:
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)   # arquivo só aparece completo
+
+
+def _drop_orphan_parts(name: str, high_water: int) -> None:
+    """Partes gravadas por um sync que caiu antes de salvar a marca d'água."""
+    for path in glob.glob(os.path.join(ANALYTICS_DIR, name, "company_id=*", "part-*.parquet")):
+        first = int(os.path.basename(path).split("-")[1])
+        if first > high_water:
+            os.remove(path)
+
+
+def _write_parts(name: str, rows) -> None:
+    """Grava `rows` (company_id, colunas...) em ordem de id, uma parte por empresa."""
+    columns = TABLES[name][1]
+    by_company: Dict[int, list] = {}
+    for row in rows:
+        by_company.setdefault(int(row[0] or 0), []).append(tuple(row[1:]))
+    for company_id, company_rows in by_company.items():
+        first, last = company_rows[0][0], company_rows[-1][0]
+        path = os.path.join(ANALYTICS_DIR, name, f"company_id={company_id}",
+                            f"part-{first:012d}-{last:012d}.parquet")
+        _write_parquet(_arrow_table(company_rows, columns), path)
+
+
+def _mirrored_ids(name: str, low: int, high: int) -> set:
+    import duckdb
+
+    if not _has_data(name):
+        return set()
+    path = os.path.join(ANALYTICS_DIR, name, "*", "*.parquet")
+    con = duckdb.connect()
+    try:
+        rows = con.execute(f"SELECT id FROM read_parquet('{path}') WHERE id > ? AND id <= ?", [low, high]).fetchall()
+    finally:
+        con.close()
+    return {int(i) for i, in rows}
+
+
+def _fill_gaps(db, name: str, high_water: int, overlap: int = ANALYTICS_OVERLAP_IDS) -> int:
+    """
+    Copia as linhas com id em (marca d'água - overlap, marca d'água] que
+    ainda não estão no espelho: commit atrasado ou réplica atrasada.
+    """
+    if high_water <= 0 or overlap <= 0:
+        return 0
+    model, columns = TABLES[name]
+    low = max(0, high_water - overlap)
+    in_db = {i for i, in db.query(model.id).filter(model.id > low, model.id <= high_water).all()}
+    missing = sorted(in_db - _mirrored_ids(name, low, high_water))
+    if not missing:
+        return 0
+    cols = [getattr(model, c) for c, _ in columns]
+    rows = db.query(model.company_id, *cols).filter(model.id.in_(missing)).order_by(model.id).all()
+    _write_parts(name, rows)
+    return len(rows)
+
+
+def _sync_table(db, name: str, high_water: int, batch_size: int) -> int:
+    model, columns = TABLES[name]
+    cols = [getattr(model, c) for c, _ in columns]
+    copied = 0
+    while True:
+        rows = db.query(model.company_id, *cols).filter(
+            model.id > high_water
+        ).order_by(model.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        _write_parts(name, rows)
+        high_water = int(rows[-1][1])
+        copied += len(rows)
+        state = load_state()
+        state[name] = high_water
+        _save_state(state)
+        if len(rows) < batch_size:
+            break
+    return copied
+
+
+def _sync_products(db) -> int:
+    cols = [getattr(Product, c) for c, _ in PRODUCT_COLUMNS]
+    rows = [tuple(r) for r in db.query(*cols).order_by(Product.id).all()]
+    _write_parquet(_arrow_table(rows, PRODUCT_COLUMNS), os.path.join(ANALYTICS_DIR, "products", "products.parquet"))
+    return len(rows)
+
+
+def compact(name: str, company_id: int) -> bool:
+    """Junta as partes de uma empresa num arquivo só quando passam de ANALYTICS_COMPACT_PARTS."""
+    import duckdb
+
+    folder = os.path.join(ANALYTICS_DIR, name, f"company_id={company_id}")
+    parts = sorted(glob.glob(os.path.join(folder, "part-*.parquet")))
+    if len(parts) <= ANALYTICS_COMPACT_PARTS:
+        return False
+    first = os.path.basename(parts[0]).split("-")[1]
+    # partes de lacunas (_fill_gaps) podem terminar depois da última em ordem de nome
+    last = max(int(os.path.basename(path).split("-")[2].split(".")[0]) for path in parts)
+    target = os.path.join(folder, f"part-{first}-{last:012d}.parquet")
+    tmp = f"{target}.{os.getpid()}.tmp"
+    con = duckdb.connect()
+    try:
+        con.execute(
+            f"COPY (SELECT DISTINCT ON (id) * FROM read_parquet(?) ORDER BY id) "
+            f"TO '{tmp}' (FORMAT PARQUET, COMPRESSION ZSTD)",
+            [parts],
+        )
+    finally:
+        con.close()
+    os.replace(tmp, target)
+    for path in parts:
+        if path != target:
+            os.remove(path)
+    return True
+
+
+def sync(db=None, batch_size: int = ANALYTICS_BATCH) -> Dict[str, int]:
+    """
+    Copia para o espelho as linhas novas de cada tabela e reescreve os produtos.
+    Usa a réplica de leitura quando houver. Retorna {tabela: linhas copiadas}.
+    """
+    from database import get_read_session
+
+    if not _duckdb_available():
+        raise RuntimeError("Análises históricas precisam de duckdb e pyarrow instalados")
+
+    os.makedirs(ANALYTICS_DIR, exist_ok=True)
+    with _sync_lock, _file_lock() as acquired:
+        if not acquired:
+            return {}   # outro processo já está sincronizando
+        own_session = db is None
+        db = db or get_read_session()
+        try:
+            state = load_state()
+            copied = {}
+            for name in TABLES:
+                high_water = int(state.get(name, 0))
+                _drop_orphan_parts(name, high_water)
+                copied[name] = _fill_gaps(db, name, high_water)
+                copied[name] += _sync_table(db, name, high_water, batch_size)
+            copied["products"] = _sync_products(db)
+        finally:
+            if own_session:
+                db.close()
+
+        for name in TABLES:
+            for folder in glob.glob(os.path.join(ANALYTICS_DIR, name, "company_id=*")):
+                compact(name, int(folder.rsplit("=", 1)[1]))
+
+        state = load_state()
+        state["synced_at"] = time.time()
+        _save_state(state)
+        return copied
+
+
+def _build_sync(params: dict, progress, out_path: str) -> None:
+    """Builder do job "analytics_sync" (jobs.py): o arquivo é o resumo da cópia."""
+    progress(0.0, "Sincronizando")
+    copied = sync()
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(copied, f)
+
+
+report_jobs.register("analytics_sync", _build_sync, "json", "application/json")
+
+
+def sync_in_background(max_age: float = ANALYTICS_SYNC_SECONDS, force: bool = False) -> Optional[Job]:
+    """
+    Enfileira sync() no pool de jobs se o espelho tiver mais de `max_age`
+    segundos (ou `force`). As consultas seguem no último espelho completo
+    enquanto isso. Um job por janela de `max_age`: várias telas abertas
+    reaproveitam o mesmo.
+    """
+    now = time.time()
+    if not force and now - float(load_state().get("synced_at", 0)) < max_age:
+        return None
+    window = now if force else int(now // max_age)
+    return report_jobs.submit("analytics_sync", {"window": window}, filename="sync.json")
+
+
+# =========================
+# 📊 CONSULTAS
+# =========================
+
+def _has_data(name: str) -> bool:
+    pattern = "products.parquet" if name == "products" else os.path.join("company_id=*", "*.parquet")
+    return bool(glob.glob(os.path.join(ANALYTICS_DIR, name, pattern)))
+
+
+def connect():
+    """Conexão DuckDB em memória com as views sales/orders/expenses/products sobre o Parquet."""
+    import duckdb
+
+    con = duckdb.connect()
+    for name in TABLES:
+        if _has_data(name):
+            path = os.path.join(ANALYTICS_DIR, name, "*", "*.parquet")
+            con.execute(f"CREATE VIEW {name} AS SELECT * FROM read_parquet('{path}', hive_partitioning = true)")
+    if _has_data("products"):
+        path = os.path.join(ANALYTICS_DIR, "products", "products.parquet")
+        con.execute(f"CREATE VIEW products AS SELECT * FROM read_parquet('{path}')")
+    return con
+
+
+def query(sql: str, params: Optional[Sequence] = None) -> "pd.DataFrame":
+    """SQL livre sobre as views do espelho (uso interno/administrativo)."""
+    con = connect()
+    try:
+        return con.execute(sql, list(params or [])).df()
+    finally:
+        con.close()
+
+
+def report(
+    company_id: int,
+    metric: str,
+    by: Sequence[str] = ("month",),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: Optional[int] = None,
+) -> "pd.DataFrame":
+    """
+    Agrega `metric` (ver METRICS) agrupando pelas dimensões `by` (ver DIMENSIONS),
+    ex.: report(1, "gross_revenue", ("month", "product")).
+    """
+    import pandas as pd
+
+    if metric not in METRICS:
+        raise ValueError(f"Métrica desconhecida: {metric}")
+    table, measure = METRICS[metric]
+    for dim in by:
+        if dim not in DIMENSIONS:
+            raise ValueError(f"Dimensão desconhecida: {dim}")
+        if table not in DIMENSIONS[dim][1]:
+            raise ValueError(f"A dimensão {dim} não existe para {metric}")
+
+    columns = list(by) + [metric]
+    if not _has_data(table):
+        return pd.DataFrame(columns=columns)
+
+    select = [f"{DIMENSIONS[d][0]} AS {d}" for d in by]
+    join = "LEFT JOIN products p ON p.id = t.product_id" if "product" in by else ""
+
+    where = ["t.company_id = ?"]
+    params: list = [int(company_id)]
+    if start_date is not None:
+        where.append("t.date >= ?")
+        params.append(start_date)
+    if end_date is not None:
+        where.append("t.date <= ?")
+        params.append(end_date)
+
+    sql = f"SELECT {', '.join(select + [f'{measure} AS {metric}'])} FROM {table} t {join} WHERE {' AND '.join(where)}"
+    if by:
+        positions = ", ".join(str(i + 1) for i in range(len(by)))
+        sql += f" GROUP BY {positions} ORDER BY {positions}"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    return query(sql, params)
@@ -0,0 +1,132 @@
+# benchmarks/cashier_report.py
+"""
+Relatório por caixa sobre meses de vendas e dezenas de caixas.
+
+    python benchmarks/cashier_report.py                        # 36 caixas, 180 dias, ~1,3 mi de linhas
+    python benchmarks/cashier_report.py --cashiers 12 --days 90 --orders 60
+
+Cria um banco SQLite temporário com vendas sintéticas (1 a 3 linhas por
+cupom) e mede services.get_cashier_report em cada visão (total, hora,
+turno): direto sobre sales com o índice (company_id, user_id, date), sem
+ele, depois de roll_up_cashier_hours (horas fechadas em cashier_hours +
+o trecho recente em sales) e a segunda leitura via
+get_cashier_report_cached.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cashiers", type=int, default=36)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--orders", type=int, default=100, help="cupons por caixa por dia")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="peegflow_bench_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.pop("READ_DATABASE_URL", None)
+
+    from sqlalchemy import insert, text
+
+    import services
+    from cache import report_cache
+    from database import SessionLocal, engine, init_db
+    from models import Sale, User
+
+    init_db()
+    rng = random.Random(42)
+    end = datetime.utcnow().replace(microsecond=0)
+    start = end - timedelta(days=args.days)
+
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"username": f"caixa{i:02d}", "password_hash": "-", "role": "user", "company_id": 1}
+            for i in range(args.cashiers)
+        ])
+        user_ids = [uid for uid, in conn.execute(text("SELECT id FROM users ORDER BY id"))]
+        # outras lojas no mesmo banco, como em produção
+        companies = (1, 2, 3)
+        order_id = 0
+        for day in range(args.days):
+            rows = []
+            day_start = start + timedelta(days=day)
+            for company_id in companies:
+                for user_id in user_ids:
+                    for _ in range(args.orders):
+                        order_id += 1
+                        when = day_start + timedelta(seconds=rng.randint(7 * 3600, 22 * 3600))
+                        for _ in range(rng.randint(1, 3)):
+                            rows.append({
+                                "order_id": order_id, "company_id": company_id, "product_id": rng.randint(1, 500),
+                                "quantity": rng.randint(1, 4), "price": rng.choice((4.5, 9.9, 19.9, 49.9)),
+                                "user_id": user_id, "date": when,
+                            })
+            conn.execute(insert(Sale), rows)
+    with engine.connect() as conn:
+        lines = conn.execute(text("SELECT COUNT(*) FROM sales WHERE company_id = 1")).scalar()
+        conn.execute(text("ANALYZE"))
+    print(f"{lines} linhas de venda da empresa 1 ({args.cashiers} caixas, {args.days} dias, 3 empresas) "
+          f"geradas em {time.perf_counter() - t0:.0f}s")
+
+    def timed(fn):
+        times = []
+        for _ in range(args.repeat):
+            db = SessionLocal()
+            try:
+                t = time.perf_counter()
+                fn(db)
+                times.append(time.perf_counter() - t)
+            finally:
+                db.close()
+        return statistics.median(times) * 1000
+
+    results = {}
+    for label in ("com índice", "sem índice"):
+        if label == "sem índice":
+            with engine.begin() as conn:
+                conn.execute(text("DROP INDEX ix_sales_company_user_date"))
+        for by in services.CASHIER_REPORT_GROUPS:
+            results[(label, by)] = timed(lambda db: services.get_cashier_report(db, 1, start, end, by))
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX ix_sales_company_user_date ON sales (company_id, user_id, date)"))
+
+    db = SessionLocal()
+    t = time.perf_counter()
+    hours = services.roll_up_cashier_hours(db, 1)
+    rollup_secs = time.perf_counter() - t
+    t = time.perf_counter()
+    services.roll_up_cashier_hours(db, 1)
+    incremental_ms = (time.perf_counter() - t) * 1000
+    db.close()
+    print(f"consolidação inicial: {hours} horas-caixa em {rollup_secs:.1f}s; "
+          f"rodada seguinte (nada novo): {incremental_ms:.1f}ms")
+    for by in services.CASHIER_REPORT_GROUPS:
+        results[("consolidado", by)] = timed(lambda db: services.get_cashier_report(db, 1, start, end, by))
+
+    for by in services.CASHIER_REPORT_GROUPS:
+        report_cache.clear()
+        db = SessionLocal()
+        services.get_cashier_report_cached(db, 1, start, end, by)
+        db.close()
+        results[("cache", by)] = timed(lambda db: services.get_cashier_report_cached(db, 1, start, end, by))
+
+    print(f"{'visão':<8}{'com índice ms':>16}{'sem índice ms':>16}{'consolidado ms':>16}{'cache ms':>12}")
+    for by in services.CASHIER_REPORT_GROUPS:
+        print(f"{by:<8}{results[('com índice', by)]:>16.0f}{results[('sem índice', by)]:>16.0f}"
+              f"{results[('consolidado', by)]:>16.0f}{results[('cache', by)]:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
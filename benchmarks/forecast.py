@@ -0,0 +1,131 @@
+# benchmarks/forecast.py
+"""
+Previsão de reposição para o catálogo inteiro (get_replenishment_forecast).
+
+    python benchmarks/forecast.py                               # 100.000 SKUs, 1 ano, ~2 mi de linhas
+    python benchmarks/forecast.py --products 20000 --lines 10
+
+Cria um banco SQLite temporário com um catálogo sintético e `--lines`
+linhas de venda por produto espalhadas em `--days` dias, e mede as etapas:
+consulta agrupada (produto x dia da semana x faixa), carga das linhas em
+arrays (uma coluna por vez x a conversão linha a linha de antes), cálculo
+vetorizado em forecast.py e a chamada completa.
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from operator import itemgetter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--lines", type=int, default=20, help="linhas de venda por produto")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="peegflow_bench_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.pop("READ_DATABASE_URL", None)
+
+    import numpy as np
+    from sqlalchemy import insert, select, text
+
+    import forecast
+    import services
+    from database import SessionLocal, engine, init_db
+    from models import Product, Sale
+
+    init_db()
+    rng = random.Random(42)
+    now = datetime.utcnow()
+
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"company_id": 1, "name": f"Produto {i}", "sku": f"SKU-{i:06d}", "price_retail": 10.0,
+             "price_wholesale": 5.0, "avg_cost": 5.0, "stock": rng.randint(0, 200), "stock_min": 5, "version": 1}
+            for i in range(args.products)
+        ])
+        first_id = conn.execute(text("SELECT MIN(id) FROM products")).scalar()
+        batch = []
+        for pid in range(first_id, first_id + args.products):
+            for _ in range(args.lines):
+                batch.append({"company_id": 1, "product_id": pid, "quantity": rng.randint(1, 5), "price": 10.0,
+                              "user_id": 1, "date": now - timedelta(seconds=rng.randint(0, args.days * 86400))})
+            if len(batch) >= 200_000:
+                conn.execute(insert(Sale), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Sale), batch)
+        conn.execute(text("ANALYZE"))
+    print(f"{args.products} produtos, {args.products * args.lines} linhas de venda em {args.days} dias "
+          f"geradas em {time.perf_counter() - t0:.0f}s")
+
+    # mesma consulta agrupada de get_replenishment_forecast
+    recency = services.case(
+        (Sale.date >= now - timedelta(days=forecast.RECENCY_BUCKETS[0]), 0),
+        (Sale.date >= now - timedelta(days=forecast.RECENCY_BUCKETS[1]), 1),
+        else_=2
+    )
+    dow = services.cast(services.extract("dow", Sale.date), services.Integer)
+    grouped = select(
+        Sale.product_id, dow, recency, services.func.coalesce(services.func.sum(Sale.quantity), 0)
+    ).where(Sale.company_id == 1, Sale.date >= now - timedelta(days=args.days)).group_by(Sale.product_id, dow, recency)
+
+    def timed(fn):
+        times = []
+        for _ in range(args.repeat):
+            gc.collect()
+            t = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - t)
+        return statistics.median(times), result
+
+    db = SessionLocal()
+    try:
+        query_s, history = timed(lambda: db.execute(grouped).all())
+        product_ids = np.asarray([pid for pid, in db.execute(select(Product.id).order_by(Product.id))],
+                                 dtype=np.int64)
+        stock = np.full(len(product_ids), 50.0)
+        stock_min = np.full(len(product_ids), 5.0)
+
+        old_dtype = np.dtype([("product_id", "i8"), ("dow", "i8"), ("bucket", "i8"), ("qty", "f8")])
+        rowwise_s, _ = timed(lambda: np.fromiter(map(tuple, history), dtype=old_dtype, count=len(history)))
+        dtypes = (np.int64, np.int64, np.int64, float)
+        columnar_s, columns = timed(lambda: [np.fromiter(map(itemgetter(i), history), dtype=t, count=len(history))
+                                             for i, t in enumerate(dtypes)])
+
+        def compute():
+            cube = forecast.sales_cube(product_ids, *columns)
+            return forecast.compute_replenishment(cube, stock, stock_min, now.date(), history_days=args.days)
+
+        compute_s, _ = timed(compute)
+        total_s, df = timed(lambda: services.get_replenishment_forecast(db, 1, history_days=args.days))
+    finally:
+        db.close()
+
+    print(f"{len(history)} linhas agrupadas; {len(df)} SKUs com previsão")
+    print(f"{'etapa':<34}{'s (mediana)':>12}")
+    for label, secs in (
+        ("consulta agrupada", query_s),
+        ("carga linha a linha (antes)", rowwise_s),
+        ("carga por coluna", columnar_s),
+        ("cálculo vetorizado (forecast.py)", compute_s),
+        ("get_replenishment_forecast", total_s),
+    ):
+        print(f"{label:<34}{secs:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
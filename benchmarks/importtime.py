@@ -0,0 +1,86 @@
+# benchmarks/importtime.py
+"""
+Relatório de tempo de import por página (resumo do `python -X importtime`).
+
+    python benchmarks/importtime.py            # 3 rodadas, mediana
+    python benchmarks/importtime.py --repeat 5 --top 8
+
+"login" é o que main.py importa antes de qualquer página (streamlit,
+database, services, views, cart). Cada página mostra o custo extra do
+primeiro acesso a ela e os pacotes mais pesados que ela puxa.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASE_IMPORTS = "import streamlit, database, services, views, cart"
+
+
+def run_importtime(code: str):
+    """Executa `code` num processo novo e devolve [(self_us, cumulative_us, depth, module)]."""
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite://")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        name = name.rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2   # 2 espaços por nível
+        entries.append((int(self_us), int(cum_us), depth, name.strip()))
+    return entries
+
+
+def total_ms(entries) -> float:
+    return sum(cum for _, cum, depth, _ in entries if depth == 0) / 1000
+
+
+def heaviest(entries, skip: set, top: int):
+    """Pacotes raiz novos (não importados no login), do mais pesado ao mais leve."""
+    roots = {}
+    for _, cum, _, module in entries:
+        root = module.split(".")[0]
+        if root in skip or "." in module:
+            continue
+        roots[root] = max(roots.get(root, 0), cum)
+    return sorted(roots.items(), key=lambda kv: -kv[1])[:top]
+
+
+def main() -> None:
+    from views import PAGES
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_importtime(BASE_IMPORTS) for _ in range(args.repeat)]
+    base_ms = statistics.median(total_ms(r) for r in runs)
+    base_modules = {m.split(".")[0] for _, _, _, m in runs[0]}
+
+    print(f"{'página':<24}{'ms':>10}{'extra ms':>10}  mais pesados")
+    print(f"{'login (base)':<24}{base_ms:>10.0f}{'':>10}  "
+          + ", ".join(f"{n} {c / 1000:.0f}" for n, c in heaviest(runs[0], {"__main__"}, args.top)))
+
+    for label, module in PAGES.items():
+        runs = [run_importtime(f"{BASE_IMPORTS}; import {module}") for _ in range(args.repeat)]
+        # o import da página aparece como entrada de nível 0 depois do login:
+        # o cumulativo dela é exatamente o custo extra do primeiro acesso
+        extra_ms = statistics.median(
+            next(cum for _, cum, depth, m in r if depth == 0 and m == module) / 1000 for r in runs
+        )
+        heavy = heaviest(runs[0], base_modules, args.top)
+        print(f"{label:<24}{base_ms + extra_ms:>10.0f}{extra_ms:>10.0f}  "
+              + (", ".join(f"{n} {c / 1000:.0f}" for n, c in heavy) or "-"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# benchmarks/product_edits.py
+"""
+Edições de cadastro concorrentes com vendas no mesmo produto.
+
+    python benchmarks/product_edits.py                    # 8 caixas x 200 vendas, 4 editores x 50 edições
+    DATABASE_URL=postgresql://... python benchmarks/product_edits.py
+
+Sem DATABASE_URL usa um SQLite temporário. Cada editor é uma thread que lê
+o produto, soma 1 ao estoque mínimo e salva com services.update_product
+passando a versão lida; em conflito, refaz a partir dos valores devolvidos.
+Ao mesmo tempo, os caixas vendem 1 unidade por vez com process_sale.
+
+Compara a latência das vendas sem e com editores (a versão não trava a
+linha, então não deve mudar). Que nenhuma edição nem baixa de estoque se
+perde é conferido em tests/test_product_edits.py.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cashiers", type=int, default=8)
+    parser.add_argument("--sales", type=int, default=200, help="vendas por caixa em cada fase")
+    parser.add_argument("--editors", type=int, default=4)
+    parser.add_argument("--edits", type=int, default=50, help="edições aceitas por editor")
+    parser.add_argument("--company", type=int, default=1)
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(prefix="peegflow_bench_"), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.pop("READ_DATABASE_URL", None)
+
+    import services
+    from database import SessionLocal, init_db
+    from models import Order, Product, Sale, StockMovement
+
+    init_db()
+    db = SessionLocal()
+    initial_stock = 2 * args.cashiers * args.sales
+    product = Product(company_id=args.company, name="Produto bench", sku=f"BENCH-{time.time_ns()}",
+                      price_retail=10.0, price_wholesale=5.0, avg_cost=5.0, stock=initial_stock,
+                      stock_min=1, version=1)
+    db.add(product)
+    db.commit()
+    product_id = product.id
+    db.close()
+
+    lock = threading.Lock()
+    errors = []
+
+    def cashier(latencies, sold):
+        session = SessionLocal()
+        try:
+            for _ in range(args.sales):
+                t0 = time.perf_counter()
+                try:
+                    ok, _ = services.process_sale(session, product_id, 1, "varejo", 1, args.company)
+                except Exception as exc:   # ex.: "database is locked" no SQLite
+                    with lock:
+                        errors.append(repr(exc))
+                    continue
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    latencies.append(elapsed)
+                    sold[0] += int(ok)
+        finally:
+            session.close()
+
+    accepted = [0]
+    conflicts = [0]
+
+    def editor():
+        session = SessionLocal()
+        try:
+            row = services._product_row(session, args.company, product_id)
+            done = 0
+            while done < args.edits:
+                try:
+                    ok, msg, current = services.update_product(
+                        session, args.company, product_id, row.name, row.sku, row.price_retail,
+                        row.price_wholesale, row.stock_min + 1, version=row.version
+                    )
+                except Exception as exc:
+                    with lock:
+                        errors.append(repr(exc))
+                    row = services._product_row(session, args.company, product_id)
+                    continue
+                with lock:
+                    accepted[0] += int(ok)
+                    conflicts[0] += int(not ok)
+                done += int(ok)
+                row = current
+        finally:
+            session.close()
+
+    def run_phase(with_editors: bool):
+        latencies, sold = [], [0]
+        threads = [threading.Thread(target=cashier, args=(latencies, sold)) for _ in range(args.cashiers)]
+        if with_editors:
+            threads += [threading.Thread(target=editor) for _ in range(args.editors)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return latencies, sold[0], time.perf_counter() - t0
+
+    base_lat, base_sold, base_time = run_phase(with_editors=False)
+    mix_lat, mix_sold, mix_time = run_phase(with_editors=True)
+
+    print(f"{args.cashiers} caixas x {args.sales} vendas; {args.editors} editores x {args.edits} edições")
+    print(f"{'fase':<18}{'vendas':>8}{'s':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for label, lat, n, secs in (("só vendas", base_lat, base_sold, base_time),
+                                ("vendas + edições", mix_lat, mix_sold, mix_time)):
+        print(f"{label:<18}{n:>8}{secs:>8.1f}{percentile(lat, 0.5) * 1000:>10.1f}{percentile(lat, 0.95) * 1000:>10.1f}")
+    print(f"edições aceitas: {accepted[0]}, conflitos devolvidos: {conflicts[0]}, erros: {len(errors)}")
+    for exc in errors[:5]:
+        print("  ", exc)
+
+    db = SessionLocal()
+    order_ids = [oid for oid, in db.query(Sale.order_id).filter(Sale.product_id == product_id).distinct().all()]
+    db.query(StockMovement).filter(StockMovement.product_id == product_id).delete(synchronize_session=False)
+    db.query(Sale).filter(Sale.product_id == product_id).delete(synchronize_session=False)
+    db.query(Order).filter(Order.id.in_(order_ids)).delete(synchronize_session=False)
+    db.query(Product).filter(Product.id == product_id).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/read_rows.py
+"""
+Memória e tempo de leitura do catálogo: entidades ORM x linhas só leitura.
+
+    python benchmarks/read_rows.py                  # 100.000 produtos, 5 rodadas
+    python benchmarks/read_rows.py --products 20000 --repeat 3
+
+Cria um banco SQLite temporário com um catálogo sintético e compara
+`db.query(Product).all()` (o que get_products devolvia) com
+services.get_products (ProductRow). "retido" é a memória ocupada pelo
+resultado enquanto a tela o usa; "pico" inclui o que foi alocado durante
+a leitura.
+"""
+import argparse
+import gc
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def measure(load, repeat: int):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        result = load()
+        times.append(time.perf_counter() - t0)
+        del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), retained, peak, len(result)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="peegflow_bench_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.pop("READ_DATABASE_URL", None)
+
+    from sqlalchemy import insert
+
+    import services
+    from database import SessionLocal, engine, init_db
+    from models import Product
+
+    init_db()
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [{
+            "company_id": 1,
+            "name": f"Produto {i}",
+            "sku": f"SKU-{i:06d}",
+            "price_retail": 10.0 + i % 500,
+            "price_wholesale": 5.0 + i % 250,
+            "stock": i % 80,
+            "stock_min": 5,
+        } for i in range(args.products)])
+
+    def orm_entities():
+        # sessão nova a cada leitura, como uma rerun do Streamlit
+        db = SessionLocal()
+        try:
+            return db.query(Product).filter(Product.company_id == 1).all()
+        finally:
+            db.close()
+
+    def read_rows():
+        db = SessionLocal()
+        try:
+            return services.get_products(db, 1)
+        finally:
+            db.close()
+
+    print(f"{args.products} produtos, mediana de {args.repeat} rodadas")
+    print(f"{'leitura':<22}{'ms':>10}{'retido MB':>12}{'pico MB':>10}")
+    for label, load in (("ORM (Product)", orm_entities), ("ProductRow", read_rows)):
+        seconds, retained, peak, count = measure(load, args.repeat)
+        assert count == args.products
+        print(f"{label:<22}{seconds * 1000:>10.0f}{retained / 2**20:>12.1f}{peak / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
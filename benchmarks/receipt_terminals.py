@@ -0,0 +1,112 @@
+# benchmarks/receipt_terminals.py
+"""
+Vários terminais fechando vendas ao mesmo tempo: vazão e idas ao contador.
+
+    python benchmarks/receipt_terminals.py                      # 16 terminais x 200 vendas
+    python benchmarks/receipt_terminals.py --terminals 32 --sales 100 --block 20
+    DATABASE_URL=postgresql://... python benchmarks/receipt_terminals.py --keep
+
+Sem DATABASE_URL usa um SQLite temporário. Cada terminal é uma thread com
+sessão própria chamando services.checkout_cart; parte das vendas falha de
+propósito (estoque insuficiente) para exercitar a devolução do número.
+A ausência de números repetidos ou pulados é conferida em
+tests/test_receipts.py; aqui só se medem os tempos.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terminals", type=int, default=16)
+    parser.add_argument("--sales", type=int, default=200, help="vendas por terminal")
+    parser.add_argument("--block", type=int, default=50, help="tamanho do bloco (RECEIPT_BLOCK_SIZE)")
+    parser.add_argument("--company", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="não apaga as vendas de teste no fim")
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(prefix="peegflow_bench_"), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ["RECEIPT_BLOCK_SIZE"] = str(args.block)
+
+    import services
+    from database import SessionLocal, init_db
+    from models import Order, Product, ReceiptBlock, Sale, StockMovement
+
+    init_db()
+    db = SessionLocal()
+    product = Product(company_id=args.company, name="Produto bench", sku=f"BENCH-{time.time_ns()}",
+                      price_retail=10.0, price_wholesale=5.0, stock=args.terminals * args.sales, stock_min=0)
+    db.add(product)
+    db.commit()
+    product_id = product.id
+    db.close()
+
+    errors = []
+    failed_on_purpose = [0]
+    lock = threading.Lock()
+
+    def terminal(n: int):
+        name = f"bench-{n:03d}"
+        session = SessionLocal()
+        rng = random.Random(n)
+        try:
+            for _ in range(args.sales):
+                # ~5% das vendas pedem mais do que existe e devem falhar
+                qty = 10 ** 9 if rng.random() < 0.05 else 1
+                try:
+                    ok, _, _ = services.checkout_cart(session, args.company, 1, [{"id": product_id, "qty": qty}],
+                                                      terminal=name)
+                except Exception as exc:   # ex.: "database is locked" no SQLite
+                    with lock:
+                        errors.append(repr(exc))
+                    continue
+                if not ok:
+                    with lock:
+                        failed_on_purpose[0] += 1
+        finally:
+            session.close()
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=terminal, args=(n,)) for n in range(args.terminals)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    db = SessionLocal()
+    orders = db.query(Order).filter(Order.company_id == args.company, Order.terminal.like("bench-%")).count()
+    blocks = db.query(ReceiptBlock).filter(
+        ReceiptBlock.company_id == args.company, ReceiptBlock.terminal.like("bench-%")
+    ).count()
+
+    print(f"{args.terminals} terminais, {orders} vendas em {elapsed:.1f}s ({orders / elapsed:.0f}/s)")
+    print(f"falhas esperadas: {failed_on_purpose[0]}, erros: {len(errors)}")
+    print(f"blocos reservados: {blocks} (1 ida ao contador a cada {orders / max(blocks, 1):.0f} vendas)")
+    for exc in errors[:5]:
+        print("  ", exc)
+
+    if not args.keep:
+        order_ids = [oid for oid, in db.query(Order.id).filter(
+            Order.company_id == args.company, Order.terminal.like("bench-%")
+        ).all()]
+        db.query(StockMovement).filter(StockMovement.product_id == product_id).delete(synchronize_session=False)
+        db.query(Sale).filter(Sale.order_id.in_(order_ids)).delete(synchronize_session=False)
+        db.query(Order).filter(Order.id.in_(order_ids)).delete(synchronize_session=False)
+        db.query(Product).filter(Product.id == product_id).delete(synchronize_session=False)
+        db.commit()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+# cache.py
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+# =========================================================
+# CACHE DE SNAPSHOTS (em memória, compartilhado no processo)
+# =========================================================
+#
+# O Streamlit importa os módulos uma única vez por processo, então uma
+# instância criada aqui é vista por todas as sessões abertas. As chaves
+# sempre começam com o company_id, o que permite invalidar por empresa.
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on", "sim")
+
+
+class _Entry:
+    __slots__ = ("value", "created_at", "window_start", "window_end", "stale")
+
+    def __init__(self, value: Any, window: Optional[Tuple[Optional[datetime], Optional[datetime]]]):
+        self.value = value
+        self.created_at = time.monotonic()
+        self.window_start, self.window_end = window or (None, None)
+        self.stale = False
+
+    def covers(self, when: Optional[datetime]) -> bool:
+        if when is None:
+            return True
+        if self.window_start is not None and when < self.window_start:
+            return False
+        if self.window_end is not None and when > self.window_end:
+            return False
+        return True
+
+
+class SnapshotCache:
+    """
+    Cache LRU com TTL.
+
+    - maxsize: número máximo de snapshots (o menos usado sai primeiro)
+    - ttl: segundos até o snapshot expirar
+    - stale_while_revalidate: se True, um snapshot expirado/invalidado
+      ainda é devolvido na hora enquanto uma thread recalcula em segundo plano
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0, stale_while_revalidate: bool = False):
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl)
+        self.stale_while_revalidate = bool(stale_while_revalidate)
+
+        self._data: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._refreshing: set = set()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    # ---------- leitura ----------
+
+    def _is_fresh(self, entry: _Entry) -> bool:
+        return not entry.stale and (time.monotonic() - entry.created_at) < self.ttl
+
+    def get_or_compute(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        refresh: Optional[Callable[[], Any]] = None,
+        window: Optional[Tuple[Optional[datetime], Optional[datetime]]] = None,
+    ) -> Any:
+        """
+        Devolve o snapshot da chave, calculando com `loader` se preciso.
+
+        `refresh` é usado na revalidação em segundo plano e deve abrir a
+        própria sessão de banco (a sessão do Streamlit não é thread-safe).
+        `window` é o período (início, fim) coberto pelo snapshot; fim None
+        significa janela móvel até agora.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if self._is_fresh(entry):
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry.value
+                if self.stale_while_revalidate and refresh is not None:
+                    self._data.move_to_end(key)
+                    self.stale_hits += 1
+                    self._schedule_refresh(key, refresh, window)
+                    return entry.value
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Um cálculo por chave: quem chega depois espera e reaproveita
+        with key_lock:
+            with self._lock:
+                entry = self._data.get(key)
+                if entry is not None and self._is_fresh(entry):
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry.value
+                self.misses += 1
+
+            value = loader()
+            self._store(key, value, window)
+            return value
+
+    # ---------- escrita ----------
+
+    def _store(self, key: Hashable, value: Any, window) -> None:
+        with self._lock:
+            self._data[key] = _Entry(value, window)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                old_key, _ = self._data.popitem(last=False)
+                self._key_locks.pop(old_key, None)
+
+    def _schedule_refresh(self, key: Hashable, refresh: Callable[[], Any], window) -> None:
+        # chamado com self._lock adquirido
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        def _run():
+            try:
+                self._store(key, refresh(), window)
+            except Exception:
+                # mantém o snapshot antigo; a próxima leitura tenta de novo
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=_run, name=f"cache-refresh-{key}", daemon=True).start()
+
+    def invalidate(self, company_id: int, when: Optional[datetime] = None) -> int:
+        """
+        Invalida os snapshots da empresa cujo período contém `when`
+        (ou todos, se `when` for None). Com stale-while-revalidate o
+        snapshot é só marcado como velho e recalculado na próxima leitura.
+        """
+        count = 0
+        with self._lock:
+            for key in list(self._data.keys()):
+                if not isinstance(key, tuple) or not key or key[0] != company_id:
+                    continue
+                entry = self._data[key]
+                if not entry.covers(when):
+                    continue
+                if self.stale_while_revalidate:
+                    entry.stale = True
+                else:
+                    del self._data[key]
+                count += 1
+        return count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._key_locks.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.stale_hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": ((self.hits + self.stale_hits) / total) if total else 0.0,
+            }
+
+
+# =========================================================
+# INSTÂNCIAS (configuráveis via variáveis de ambiente)
+# =========================================================
+
+dashboard_cache = SnapshotCache(
+    maxsize=int(os.getenv("DASHBOARD_CACHE_MAXSIZE", "256")),
+    ttl=float(os.getenv("DASHBOARD_CACHE_TTL", "60")),
+    stale_while_revalidate=_env_bool("DASHBOARD_CACHE_SWR", False),
+)
+
+# Relatórios por período escolhido pelo usuário (ex.: por caixa): cada
+# período distinto é uma chave, então ficam fora do cache do Dashboard
+# para não expulsar os snapshots dele
+report_cache = SnapshotCache(
+    maxsize=int(os.getenv("REPORT_CACHE_MAXSIZE", "64")),
+    ttl=float(os.getenv("REPORT_CACHE_TTL", "60")),
+)
+
+# JSON das figuras Plotly, chaveado por (empresa, "figure", gráfico, versão dos dados)
+figure_cache = SnapshotCache(
+    maxsize=int(os.getenv("FIGURE_CACHE_MAXSIZE", "512")),
+    ttl=float(os.getenv("FIGURE_CACHE_TTL", "3600")),
+)
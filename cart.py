@@ -0,0 +1,163 @@
+# cart.py
+from __future__ import annotations
+
+from typing import Dict, Iterator, List, Optional
+
+
+# =========================================================
+# CARRINHO DO PDV
+# =========================================================
+#
+# Itens indexados pelo id do produto e totais mantidos a cada operação:
+# adicionar, mudar quantidade ou remover custa O(1), e ler subtotal,
+# desconto e total não percorre os itens. Valores guardados em centavos
+# (int) para que somas e subtrações repetidas não acumulem erro.
+
+
+def _cents(value: float) -> int:
+    return int(round(float(value) * 100))
+
+
+class CartItem:
+    __slots__ = ("id", "name", "sku", "price_cents", "qty")
+
+    def __init__(self, product_id: int, name: str, sku: Optional[str], price_cents: int, qty: int):
+        self.id = product_id
+        self.name = name
+        self.sku = sku
+        self.price_cents = price_cents
+        self.qty = qty
+
+    @property
+    def price(self) -> float:
+        return self.price_cents / 100
+
+    @property
+    def line_total(self) -> float:
+        return self.price_cents * self.qty / 100
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "name": self.name, "sku": self.sku, "price": self.price, "qty": self.qty}
+
+
+class Cart:
+    def __init__(self):
+        self._items: Dict[int, CartItem] = {}
+        self._subtotal_cents = 0
+        self._units = 0
+        self.discount_type = "R$"     # "R$" | "%"
+        self.discount_value = 0.0
+        self.version = 0              # muda a cada alteração (para saber quando persistir)
+
+    # ---------- leitura ----------
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __bool__(self) -> bool:
+        return bool(self._items)
+
+    def __iter__(self) -> Iterator[CartItem]:
+        return iter(list(self._items.values()))
+
+    def __contains__(self, product_id: int) -> bool:
+        return product_id in self._items
+
+    def qty(self, product_id: int) -> int:
+        item = self._items.get(product_id)
+        return item.qty if item else 0
+
+    @property
+    def units(self) -> int:
+        return self._units
+
+    @property
+    def subtotal(self) -> float:
+        return self._subtotal_cents / 100
+
+    @property
+    def discount_amount(self) -> float:
+        if self.discount_type == "%":
+            cents = round(self._subtotal_cents * float(self.discount_value) / 100)
+        else:
+            cents = _cents(self.discount_value)
+        return min(max(cents, 0), self._subtotal_cents) / 100
+
+    @property
+    def total(self) -> float:
+        return self.subtotal - self.discount_amount
+
+    def lines(self) -> List[dict]:
+        """Itens no formato de services.checkout_cart e do cupom."""
+        return [item.to_dict() for item in self._items.values()]
+
+    # ---------- escrita ----------
+
+    def add(self, product_id: int, name: str, price: float, qty: int = 1, sku: Optional[str] = None) -> None:
+        qty = int(qty)
+        if qty <= 0:
+            return
+        item = self._items.get(product_id)
+        if item is None:
+            item = CartItem(product_id, name, sku, _cents(price), 0)
+            self._items[product_id] = item
+        item.qty += qty
+        self._subtotal_cents += item.price_cents * qty
+        self._units += qty
+        self.version += 1
+
+    def set_qty(self, product_id: int, qty: int) -> None:
+        item = self._items.get(product_id)
+        if item is None:
+            return
+        qty = int(qty)
+        if qty <= 0:
+            self.remove(product_id)
+            return
+        diff = qty - item.qty
+        item.qty = qty
+        self._subtotal_cents += item.price_cents * diff
+        self._units += diff
+        self.version += 1
+
+    def increment(self, product_id: int, step: int = 1) -> None:
+        self.set_qty(product_id, self.qty(product_id) + int(step))
+
+    def remove(self, product_id: int) -> None:
+        item = self._items.pop(product_id, None)
+        if item is not None:
+            self._subtotal_cents -= item.price_cents * item.qty
+            self._units -= item.qty
+            self.version += 1
+
+    def set_discount(self, discount_type: str, value: float) -> None:
+        discount_type = "%" if discount_type == "%" else "R$"
+        value = float(value or 0.0)
+        if (discount_type, value) != (self.discount_type, self.discount_value):
+            self.discount_type = discount_type
+            self.discount_value = value
+            self.version += 1
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._subtotal_cents = 0
+        self._units = 0
+        self.discount_value = 0.0
+        self.version += 1
+
+    # ---------- serialização ----------
+
+    def to_dict(self) -> dict:
+        return {
+            "items": self.lines(),
+            "discount_type": self.discount_type,
+            "discount_value": self.discount_value,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "Cart":
+        cart = cls()
+        for item in (data or {}).get("items", []):
+            cart.add(int(item["id"]), item.get("name") or "", item.get("price", 0.0), item.get("qty", 0), item.get("sku"))
+        cart.set_discount((data or {}).get("discount_type", "R$"), (data or {}).get("discount_value", 0.0))
+        return cart
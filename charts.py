@@ -0,0 +1,237 @@
+# charts.py
+from __future__ import annotations
+
+import json
+import os
+from datetime import datetime
+from typing import Callable, Sequence, Tuple
+
+import numpy as np
+
+from cache import figure_cache
+
+
+# =========================================================
+# CAMADA DE DADOS DOS GRÁFICOS
+# =========================================================
+#
+# Os gráficos recebem arrays já agregados e de tamanho limitado:
+# - mapa de calor: grade fixa 7 x 24 (dia da semana x hora)
+# - séries temporais: reduzidas para no máximo CHART_MAX_POINTS pontos
+# O JSON da figura fica em cache por versão dos dados.
+
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+
+WEEKDAYS_PT = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+
+
+# =========================
+# 🔥 MAPA DE CALOR (7 x 24)
+# =========================
+
+def heatmap_grid(dates, values) -> np.ndarray:
+    """
+    Soma `values` numa grade 7 x 24 (linha = dia da semana, segunda = 0;
+    coluna = hora) com binning vetorizado.
+    """
+    d = np.asarray(dates, dtype="datetime64[s]")
+    w = np.asarray(values, dtype=float)
+    if d.size == 0:
+        return np.zeros((7, 24), dtype=float)
+
+    days = d.astype("datetime64[D]")
+    # 1970-01-01 foi uma quinta-feira (índice 3)
+    weekday = (days.astype(np.int64) + 3) % 7
+    hour = (d - days).astype("timedelta64[h]").astype(np.int64)
+
+    cells = np.bincount(weekday * 24 + hour, weights=w, minlength=7 * 24)
+    return cells.reshape(7, 24)
+
+
+def heatmap_to_local(grid: np.ndarray) -> np.ndarray:
+    """
+    A grade sai das datas gravadas (UTC); para exibir, desloca as células
+    pelo fuso do servidor (a hora que passa da meia-noite vai para o dia
+    seguinte/anterior).
+    """
+    offset = datetime.now().astimezone().utcoffset()
+    hours = int(round(offset.total_seconds() / 3600)) if offset else 0
+    if hours == 0:
+        return grid
+    return np.roll(np.asarray(grid).reshape(-1), hours).reshape(7, 24)
+
+
+# =========================
+# 📉 REDUÇÃO DE SÉRIES
+# =========================
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Largest-Triangle-Three-Buckets: mantém o formato visual da série
+    com `threshold` pontos (primeiro e último sempre preservados).
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    xf = x.astype(float)
+    yf = y.astype(float)
+
+    # limites dos baldes internos (o primeiro e o último ponto ficam fixos)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0] = 0
+    keep[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        nxt_start = edges[i + 1]
+        nxt_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = xf[nxt_start:nxt_end].mean()
+        avg_y = yf[nxt_start:nxt_end].mean()
+
+        bx = xf[start:end]
+        by = yf[start:end]
+        area = np.abs((xf[a] - avg_x) * (by - yf[a]) - (xf[a] - bx) * (avg_y - yf[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+
+    return x[keep], y[keep]
+
+
+def bucket_mean(x: np.ndarray, y: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Média por balde de tamanho igual (mais barato, suaviza picos)."""
+    n = len(x)
+    if threshold >= n or threshold < 1:
+        return x, y
+
+    bucket = (np.arange(n) * threshold) // n
+    counts = np.bincount(bucket, minlength=threshold)
+    y_mean = np.bincount(bucket, weights=y.astype(float), minlength=threshold) / counts
+    # x representativo: primeiro ponto de cada balde
+    first = np.searchsorted(bucket, np.arange(threshold))
+    return x[first], y_mean
+
+
+def daily_totals(dates, values) -> Tuple[np.ndarray, np.ndarray]:
+    """Soma `values` por dia; devolve (dias ordenados, totais)."""
+    d = np.asarray(dates, dtype="datetime64[s]").astype("datetime64[D]")
+    if d.size == 0:
+        return d, np.zeros(0, dtype=float)
+    days, inv = np.unique(d, return_inverse=True)
+    totals = np.bincount(inv.ravel(), weights=np.asarray(values, dtype=float), minlength=len(days))
+    return days, totals
+
+
+def downsample(dates, values, max_points: int = CHART_MAX_POINTS, method: str = "lttb"):
+    """
+    Reduz uma série temporal para no máximo `max_points` pontos.
+    `dates` pode ser qualquer coisa conversível para datetime64.
+    """
+    x = np.asarray(dates, dtype="datetime64[ns]")
+    y = np.asarray(values, dtype=float)
+    if len(x) <= max_points:
+        return x, y
+
+    order = np.argsort(x, kind="stable")
+    x, y = x[order], y[order]
+
+    xi = x.astype(np.int64)
+    if method == "mean":
+        xs, ys = bucket_mean(xi, y, max_points)
+    else:
+        xs, ys = lttb(xi, y, max_points)
+    return xs.astype("datetime64[ns]"), ys
+
+
+# =========================
+# 🎨 FIGURAS
+# =========================
+
+def heatmap_figure(grid: np.ndarray):
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Heatmap(
+        z=np.round(grid, 2),
+        x=list(range(24)),
+        y=WEEKDAYS_PT,
+        colorscale="Viridis",
+        colorbar={"title": "Vendas (R$)"},
+        hovertemplate="%{y} %{x}h<br>R$ %{z:,.2f}<extra></extra>",
+    ))
+    fig.update_layout(
+        title="Intensidade de Vendas (Dia x Hora)",
+        xaxis={"title": "Hora", "dtick": 1},
+        yaxis={"title": "Dia", "autorange": "reversed"},
+    )
+    return fig
+
+
+def top_products_figure(names: Sequence[str], values: Sequence[float]):
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Bar(
+        x=list(values),
+        y=list(names),
+        orientation="h",
+        texttemplate="%{x:.2s}",
+        marker={"color": list(values), "colorscale": [[0, "#A3AED0"], [1, "#6366F1"]]},
+    ))
+    fig.update_layout(title="Campeões de Receita", showlegend=False, xaxis_title=None, yaxis_title=None)
+    return fig
+
+
+def payment_mix_figure(payment_mix: dict):
+    """`payment_mix` = {forma: {"orders": n, "total": valor}} (ver services.get_order_metrics)."""
+    import plotly.graph_objects as go
+
+    labels = list(payment_mix.keys())
+    fig = go.Figure(go.Pie(
+        labels=labels,
+        values=[round(payment_mix[k]["total"], 2) for k in labels],
+        customdata=[payment_mix[k]["orders"] for k in labels],
+        hole=0.55,
+        hovertemplate="%{label}<br>R$ %{value:,.2f} (%{customdata} cupons)<extra></extra>",
+    ))
+    fig.update_layout(showlegend=True, margin={"t": 10, "b": 10})
+    return fig
+
+
+def daily_figure(series: dict, max_points: int = CHART_MAX_POINTS):
+    """
+    `series` = {"Receita": (datas, valores), "Despesa": (datas, valores)}.
+    Cada série é reduzida para `max_points` antes de virar traço.
+    """
+    import plotly.graph_objects as go
+
+    colors = {"Receita": "#10B981", "Despesa": "#FF4B4B"}
+    fig = go.Figure()
+    for name, (dates, values) in series.items():
+        x, y = downsample(dates, values, max_points=max_points)
+        fig.add_trace(go.Scatter(
+            x=x,
+            y=np.round(y, 2),
+            name=name,
+            mode="lines",
+            fill="tozeroy",
+            line={"color": colors.get(name)},
+        ))
+    fig.update_layout(title="Comparativo Diário", xaxis_title="date", yaxis_title="Valor")
+    return fig
+
+
+# =========================
+# 💾 CACHE DO JSON DA FIGURA
+# =========================
+
+def cached_figure(company_id: int, name: str, version, builder: Callable[[], object]) -> dict:
+    """
+    Devolve a figura (dict pronto para st.plotly_chart) do cache,
+    construindo e serializando só quando a versão dos dados muda.
+    """
+    def _build() -> str:
+        return builder().to_json()
+
+    fig_json = figure_cache.get_or_compute((company_id, "figure", name, version), _build)
+    return json.loads(fig_json)
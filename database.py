@@ -1,6 +1,12 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.sql import Delete, Insert, Update
 
 # =========================================================
 # CONFIGURAÇÃO SEGURA VIA VARIÁVEIS DE AMBIENTE
@@ -11,29 +17,184 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL não configurada no ambiente")
 
+# Réplica de leitura (opcional). Sem ela tudo vai para o primário.
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+# Atraso máximo aceitável da réplica, em segundos
+READ_REPLICA_MAX_LAG = float(os.getenv("READ_REPLICA_MAX_LAG", "5"))
+# De quanto em quanto tempo o atraso da réplica é medido de novo
+READ_REPLICA_CHECK_INTERVAL = float(os.getenv("READ_REPLICA_CHECK_INTERVAL", "5"))
+
+# Pool de conexões (API HTTP e app compartilham o mesmo processo/engine)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
 # =========================================================
 # ENGINE
 # =========================================================
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,     # Evita conexões mortas
-    pool_recycle=300,       # Recicla conexões
-    connect_args={"connect_timeout": 10},
-)
+def _engine_kwargs(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_pre_ping": True,     # Evita conexões mortas
+        "pool_recycle": 300,       # Recicla conexões
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "connect_args": {"connect_timeout": 10},
+    }
+
+
+engine = create_engine(DATABASE_URL, **_engine_kwargs(DATABASE_URL))
+
+read_engine = create_engine(READ_DATABASE_URL, **_engine_kwargs(READ_DATABASE_URL)) if READ_DATABASE_URL else None
+
+# =========================================================
+# ROTEAMENTO LEITURA / ESCRITA
+# =========================================================
+
+def _default_lag_probe(bind) -> float:
+    """
+    Atraso da réplica em segundos. No PostgreSQL usa o horário do último
+    replay; em outros bancos (ex.: SQLite nos testes) considera 0.
+    """
+    if bind.dialect.name != "postgresql":
+        return 0.0
+    with bind.connect() as conn:
+        lag = conn.execute(text(
+            "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+        )).scalar()
+    return float(lag or 0.0)
+
+
+class _ReplicaHealth:
+    """Mede (com cache) se a réplica está de pé e dentro da tolerância de atraso."""
+
+    def __init__(self):
+        self.lag_probe: Callable = _default_lag_probe
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._usable = False
+        self.last_lag: Optional[float] = None
+
+    def usable(self) -> bool:
+        if read_engine is None:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < READ_REPLICA_CHECK_INTERVAL:
+                return self._usable
+            self._checked_at = now
+        try:
+            lag = self.lag_probe(read_engine)
+            usable = lag <= READ_REPLICA_MAX_LAG
+        except Exception:
+            lag, usable = None, False     # réplica fora do ar: fallback no primário
+        with self._lock:
+            self.last_lag = lag
+            self._usable = usable
+        return usable
+
+    def reset(self) -> None:
+        with self._lock:
+            self._checked_at = 0.0
+
+
+replica_health = _ReplicaHealth()
+
+
+class RoutingSession(Session):
+    """
+    Sessão que manda leituras marcadas com `use_replica` para a réplica
+    e todo o resto (escritas, flush, leituras dentro de checkout) para o
+    primário. Depois que a sessão escreve, ela passa a ler só do primário
+    para enxergar o que acabou de gravar.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            self.info["wrote"] = True
+            return engine
+        if self.info.get("read_only") and not self.info.get("wrote") and replica_health.usable():
+            return read_engine
+        return engine
+
+
+@contextmanager
+def use_replica(db: Session):
+    """Marca as consultas feitas dentro do bloco como somente leitura."""
+    depth = db.info.get("read_only", 0)
+    db.info["read_only"] = depth + 1
+    try:
+        yield db
+    finally:
+        db.info["read_only"] = depth
 
 # =========================================================
 # SESSION
 # =========================================================
 
 SessionLocal = sessionmaker(
+    class_=RoutingSession,
     autocommit=False,
     autoflush=False,
     bind=engine
 )
 
+
+def get_read_session() -> Session:
+    """Sessão só de leitura (relatórios, threads de fundo): usa a réplica quando possível."""
+    db = SessionLocal()
+    db.info["read_only"] = 1
+    return db
+
 Base = declarative_base()
 
+# =========================================================
+# CRIAÇÃO DO SCHEMA
+# =========================================================
+
+def _add_missing_columns(bind):
+    """
+    Acrescenta (ALTER TABLE ... ADD COLUMN) as colunas novas dos modelos em
+    tabelas que já existem. Só colunas anuláveis/sem constraint: o suficiente
+    para evoluir o schema sem ferramenta de migração.
+    """
+    insp = inspect(bind)
+    existing_tables = set(insp.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        have = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in have:
+                continue
+            col_type = col.type.compile(dialect=bind.dialect)
+            with bind.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}'))
+
+
+_schema_ready = False
+
+
+def init_db(force: bool = False):
+    """
+    Cria tabelas novas, colunas novas em tabelas existentes e também índices
+    novos (o create_all sozinho pula tabelas que já existem).
+    Roda uma vez por processo: os reruns do Streamlit não inspecionam o schema de novo.
+    """
+    global _schema_ready
+    if _schema_ready and not force:
+        return
+
+    import models  # noqa: F401  (registra os modelos no Base)
+
+    Base.metadata.create_all(bind=engine)
+    _add_missing_columns(engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    _schema_ready = True
+
 # =========================================================
 # DEPENDÊNCIA DE BANCO (USO CORRETO)
 # =========================================================
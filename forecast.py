@@ -0,0 +1,116 @@
+# forecast.py
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+import numpy as np
+
+
+# =========================================================
+# PREVISÃO DE REPOSIÇÃO (vetorizada, todos os SKUs de uma vez)
+# =========================================================
+#
+# Entrada: vendas agregadas por (produto, dia da semana, faixa de recência),
+# vindas de UMA consulta agrupada (services.get_replenishment_forecast).
+# Faixas de recência: 0 = últimos 7 dias, 1 = de 8 a 28 dias, 2 = resto do histórico.
+#
+# Nada aqui faz laço por produto: tudo é feito em matrizes (produtos x 7 x 3).
+
+RECENCY_BUCKETS = (7, 28)       # limites das faixas, em dias
+MA_WEIGHTS = (0.5, 0.3, 0.2)    # peso das médias de 7d, 28d e histórico
+SEASONALITY_PRIOR = 14.0        # unidades para confiar no perfil semanal do próprio produto
+
+
+def weekday_counts(start: date, days: int) -> np.ndarray:
+    """Quantas vezes cada dia da semana (0 = domingo, como EXTRACT(dow)) aparece em `days` dias a partir de `start`."""
+    counts = np.zeros(7, dtype=float)
+    if days <= 0:
+        return counts
+    first = (start.weekday() + 1) % 7     # date.weekday(): segunda = 0
+    full, rest = divmod(int(days), 7)
+    counts += full
+    counts[(first + np.arange(rest)) % 7] += 1
+    return counts
+
+
+def sales_cube(product_ids: np.ndarray, rows_pid, rows_dow, rows_bucket, rows_qty) -> np.ndarray:
+    """
+    Monta a matriz (produtos x 7 dias da semana x 3 faixas) com np.bincount.
+    `product_ids` precisa estar ordenado; linhas de produtos fora dele são ignoradas.
+    """
+    n = len(product_ids)
+    pid = np.asarray(rows_pid, dtype=np.int64)
+    if n == 0 or pid.size == 0:
+        return np.zeros((n, 7, 3), dtype=float)
+
+    idx = np.searchsorted(product_ids, pid)
+    idx_clip = np.minimum(idx, n - 1)
+    valid = product_ids[idx_clip] == pid
+
+    flat = (idx_clip * 21
+            + np.asarray(rows_dow, dtype=np.int64) * 3
+            + np.asarray(rows_bucket, dtype=np.int64))[valid]
+    qty = np.asarray(rows_qty, dtype=float)[valid]
+    return np.bincount(flat, weights=qty, minlength=n * 21).reshape(n, 7, 3)
+
+
+def compute_replenishment(
+    cube: np.ndarray,
+    stock: np.ndarray,
+    stock_min: np.ndarray,
+    today: date,
+    history_days: int = 90,
+    lead_time_days: int = 7,
+    cover_days: int = 14,
+) -> dict:
+    """
+    Calcula para cada produto:
+    - velocity: unidades/dia (média móvel ponderada de 7d, 28d e histórico)
+    - days_of_cover: quantos dias o estoque atual dura nessa velocidade
+    - forecast: demanda prevista no horizonte (prazo do fornecedor + cobertura),
+      ajustada pela sazonalidade do dia da semana
+    - suggested_qty: quanto comprar para cobrir o horizonte mantendo o mínimo
+    """
+    stock = np.asarray(stock, dtype=float)
+    stock_min = np.asarray(stock_min, dtype=float)
+
+    short, mid = RECENCY_BUCKETS
+    units_7 = cube[:, :, 0].sum(axis=1)
+    units_28 = units_7 + cube[:, :, 1].sum(axis=1)
+    units_hist = units_28 + cube[:, :, 2].sum(axis=1)
+
+    w7, w28, wh = MA_WEIGHTS
+    velocity = (w7 * units_7 / short
+                + w28 * units_28 / mid
+                + wh * units_hist / max(history_days, 1))
+
+    # --- sazonalidade semanal: média por ocorrência de cada dia da semana ---
+    hist_start = today - timedelta(days=history_days)
+    occurrences = np.maximum(weekday_counts(hist_start, history_days), 1.0)
+
+    by_dow = cube.sum(axis=2) / occurrences                       # (n, 7)
+    mean_dow = by_dow.mean(axis=1, keepdims=True)
+    own_index = np.divide(by_dow, mean_dow, out=np.ones_like(by_dow), where=mean_dow > 0)
+
+    # produtos com pouco histórico puxam para o perfil geral da empresa
+    company_dow = by_dow.sum(axis=0)
+    company_index = company_dow / company_dow.mean() if company_dow.mean() > 0 else np.ones(7)
+    trust = (units_hist / (units_hist + SEASONALITY_PRIOR))[:, None]
+    season = trust * own_index + (1.0 - trust) * company_index[None, :]
+
+    # --- demanda no horizonte (a partir de amanhã) ---
+    horizon = int(lead_time_days) + int(cover_days)
+    horizon_days = weekday_counts(today + timedelta(days=1), horizon)
+    forecast = velocity * (season @ horizon_days)
+
+    days_of_cover = np.where(velocity > 0, stock / np.where(velocity > 0, velocity, 1.0), np.inf)
+
+    suggested = np.ceil(np.maximum(forecast + stock_min - stock, 0.0)).astype(np.int64)
+
+    return {
+        "velocity": velocity,
+        "days_of_cover": days_of_cover,
+        "forecast": forecast,
+        "suggested_qty": suggested,
+        "units_hist": units_hist,
+    }
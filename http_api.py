@@ -0,0 +1,278 @@
+# http_api.py
+"""
+API HTTP/JSON sobre services.py (sem Streamlit).
+
+Rodar localmente (SQLite):
+    DATABASE_URL=sqlite:///./peegflow.db SECRET_KEY=troque-me uvicorn http_api:app --workers 4
+
+As funções de services.py são síncronas (bcrypt, pandas, reserva de cupom):
+cada chamada roda no threadpool do servidor com a sessão de get_db, então o
+event loop nunca fica preso numa requisição.
+
+GET /metrics (texto Prometheus) e /metrics.json ficam sem autenticação
+para o coletor; não expõem dados de negócio, só contagens e latências.
+"""
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+from pydantic import BaseModel, Field
+
+import metrics
+import services
+from database import SessionLocal, get_db, init_db
+
+
+def _startup() -> None:
+    init_db()
+    db = SessionLocal()
+    try:
+        services.backfill_stock_ledger(db)
+        services.backfill_product_costs(db)
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    await run_in_threadpool(_startup)
+    yield
+
+
+app = FastAPI(title="PeegFlow API", version="1.0", lifespan=lifespan)
+
+
+# =========================
+# 🔌 SESSÃO
+# =========================
+
+# A API segue o mesmo padrão de dependência do app: get_db (RoutingSession,
+# leituras marcadas vão para a réplica).
+api_db = get_db
+
+
+async def call(db, fn, *args, **kwargs):
+    """Executa uma função de services.py no threadpool, com a sessão da requisição."""
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+# =========================
+# 🔐 AUTENTICAÇÃO
+# =========================
+
+class LoginIn(BaseModel):
+    username: str
+    password: str
+
+
+class Principal(BaseModel):
+    user_id: int
+    company_id: int
+    role: Optional[str] = None
+
+
+def current_user(authorization: str = Header(default="")) -> Principal:
+    scheme, _, token = authorization.partition(" ")
+    payload = services.verify_token(token) if scheme.lower() == "bearer" else None
+    if not payload or payload.get("kind") != "api":
+        raise HTTPException(status_code=401, detail="Token inválido ou expirado")
+    return Principal(user_id=payload["uid"], company_id=payload["cid"], role=payload.get("role"))
+
+
+@app.post("/auth/token")
+async def login(body: LoginIn, db=Depends(api_db)):
+    user = await call(db, services.authenticate, body.username, body.password)
+    if not user:
+        raise HTTPException(status_code=401, detail="Credenciais inválidas")
+    token = services.sign_token({"kind": "api", "uid": user.id, "cid": user.company_id, "role": user.role})
+    return {"access_token": token, "token_type": "bearer", "company_id": user.company_id}
+
+
+def _check(result):
+    ok, msg = result[0], result[1]
+    if not ok:
+        status = 404 if "não encontrado" in msg.lower() else 400
+        raise HTTPException(status_code=status, detail=msg)
+    return msg
+
+
+# =========================
+# 📦 PRODUTOS
+# =========================
+
+class ProductIn(BaseModel):
+    name: str
+    sku: str
+    price_retail: float = Field(ge=0)
+    price_wholesale: float = Field(ge=0)
+    stock_min: int = Field(default=5, ge=0)
+
+
+class ProductUpdateIn(ProductIn):
+    # versão lida em GET /products; sem ela a edição não confere conflito
+    version: Optional[int] = None
+
+
+class RestockIn(BaseModel):
+    qty: int = Field(gt=0)
+    cost_unit: float = Field(ge=0)
+
+
+def _product_dict(p) -> dict:
+    return {
+        "id": p.id,
+        "sku": p.sku,
+        "name": p.name,
+        "price_retail": p.price_retail,
+        "price_wholesale": p.price_wholesale,
+        "stock": p.stock,
+        "stock_min": p.stock_min,
+        "avg_cost": p.avg_cost,
+        "version": p.version,
+    }
+
+
+@app.get("/products")
+async def list_products(search: str = "", db=Depends(api_db), user: Principal = Depends(current_user)):
+    prods = await call(db, services.get_products, user.company_id, search or None)
+    return [_product_dict(p) for p in prods]
+
+
+@app.post("/products", status_code=201)
+async def create_product(body: ProductIn, db=Depends(api_db), user: Principal = Depends(current_user)):
+    msg = _check(await call(db, services.register_product, user.company_id, body.name,
+                            body.price_retail, body.price_wholesale, body.stock_min, body.sku))
+    return {"detail": msg}
+
+
+@app.put("/products/{product_id}")
+async def edit_product(product_id: int, body: ProductUpdateIn, db=Depends(api_db),
+                       user: Principal = Depends(current_user)):
+    ok, msg, current = await call(db, services.update_product, user.company_id, product_id, body.name, body.sku,
+                                  body.price_retail, body.price_wholesale, body.stock_min, body.version)
+    if not ok and current is not None and msg == services.PRODUCT_EDIT_CONFLICT:
+        # 409 com os valores atuais: o cliente mostra a diferença e reenvia com a nova versão
+        raise HTTPException(status_code=409, detail={"detail": msg, "current": _product_dict(current)})
+    _check((ok, msg))
+    return _product_dict(current)
+
+
+@app.post("/products/{product_id}/restock")
+async def restock(product_id: int, body: RestockIn, db=Depends(api_db), user: Principal = Depends(current_user)):
+    msg = _check(await call(db, services.restock_product, user.company_id, product_id, body.qty, body.cost_unit))
+    return {"detail": msg}
+
+
+# =========================
+# 🛒 VENDAS / CHECKOUT
+# =========================
+
+class SaleIn(BaseModel):
+    product_id: int
+    qty: int = Field(gt=0)
+
+
+class CheckoutIn(BaseModel):
+    items: List[SaleIn]
+    discount: float = Field(default=0.0, ge=0)
+    payment: Optional[str] = None
+    terminal: Optional[str] = Field(default=None, max_length=40)
+
+
+@app.post("/sales", status_code=201)
+async def create_sale(body: SaleIn, db=Depends(api_db), user: Principal = Depends(current_user)):
+    msg = _check(await call(db, services.process_sale, body.product_id, body.qty, "varejo",
+                            user.user_id, user.company_id))
+    return {"detail": msg}
+
+
+@app.post("/checkout", status_code=201)
+async def checkout(body: CheckoutIn, db=Depends(api_db), user: Principal = Depends(current_user)):
+    result = await call(db, services.checkout_cart, user.company_id, user.user_id,
+                        [{"id": i.product_id, "qty": i.qty} for i in body.items],
+                        discount_amount=body.discount, payment=body.payment, terminal=body.terminal)
+    msg = _check(result)
+    receipt_number = await call(db, services.get_receipt_number, user.company_id, result[2])
+    return {"detail": msg, "order_id": result[2], "receipt_number": receipt_number}
+
+
+# =========================
+# 💰 FINANCEIRO
+# =========================
+
+class ExpenseIn(BaseModel):
+    description: str
+    amount: float = Field(gt=0)
+    category: str = "Variável (Extra)"
+    date: Optional[datetime] = None
+
+
+@app.post("/expenses", status_code=201)
+async def create_expense(body: ExpenseIn, db=Depends(api_db), user: Principal = Depends(current_user)):
+    msg = _check(await call(db, services.add_expense, user.company_id, body.description, body.amount,
+                            body.category, body.date or datetime.utcnow()))
+    return {"detail": msg}
+
+
+@app.get("/expenses")
+async def list_expenses(start: datetime, end: datetime, page: int = 1, page_size: int = 100,
+                        category: Optional[str] = None, db=Depends(api_db),
+                        user: Principal = Depends(current_user)):
+    df, total = await call(db, services.get_expenses_page, user.company_id, start, end,
+                           page=page, page_size=min(page_size, 1000), category=category)
+    return {"total": total, "page": page, "items": df.to_dict(orient="records")}
+
+
+@app.get("/sales")
+async def list_sales(start: datetime, end: datetime, page: int = 1, page_size: int = 100,
+                     sort_by: str = "date", descending: bool = True, db=Depends(api_db),
+                     user: Principal = Depends(current_user)):
+    df, total = await call(db, services.get_sales_page, user.company_id, start, end,
+                           page=page, page_size=min(page_size, 1000), sort_by=sort_by, descending=descending)
+    return {"total": total, "page": page, "items": df.to_dict(orient="records")}
+
+
+@app.get("/financial")
+async def financial_range(start: datetime, end: datetime, db=Depends(api_db),
+                          user: Principal = Depends(current_user)):
+    totals = await call(db, services.get_financial_totals, user.company_id, start, end)
+    orders = await call(db, services.get_order_metrics, user.company_id, start, end)
+    return {**totals, **orders, "balance": totals["sales_total"] - totals["expenses_total"]}
+
+
+@app.get("/margin")
+async def margin_report(start: datetime, end: datetime, by: str = "product", db=Depends(api_db),
+                        user: Principal = Depends(current_user)):
+    if by not in services.MARGIN_GROUPS:
+        raise HTTPException(status_code=400, detail=f"by deve ser um de: {', '.join(services.MARGIN_GROUPS)}")
+    df = await call(db, services.get_margin_report, user.company_id, start, end, by)
+    return df.to_dict(orient="records")
+
+
+@app.get("/reports/cashiers")
+async def cashier_report(start: datetime, end: datetime, by: str = "total", db=Depends(api_db),
+                         user: Principal = Depends(current_user)):
+    if by not in services.CASHIER_REPORT_GROUPS:
+        raise HTTPException(status_code=400,
+                            detail=f"by deve ser um de: {', '.join(services.CASHIER_REPORT_GROUPS)}")
+    df = await call(db, services.get_cashier_report_cached, user.company_id, start, end, by)
+    return df.to_dict(orient="records")
+
+
+# =========================
+# 📈 MÉTRICAS
+# =========================
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return Response(metrics.registry.render_prometheus(), media_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+
+@app.get("/metrics.json", include_in_schema=False)
+def metrics_snapshot():
+    return metrics.registry.snapshot()
@@ -0,0 +1,198 @@
+# jobs.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+
+# =========================================================
+# JOBS EM SEGUNDO PLANO (relatórios pesados)
+# =========================================================
+#
+# Cada relatório roda num pool de threads fora do script do Streamlit.
+# O arquivo final fica em disco com nome = chave de conteúdo (hash do tipo,
+# dos parâmetros e de uma "impressão digital" dos dados), então um pedido
+# idêntico é servido direto do disco sem recalcular.
+
+REPORTS_DIR = os.getenv("REPORTS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".peegflow_reports"))
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+# Poda do cache em disco: arquivos sem uso há mais de REPORTS_KEEP_DAYS dias
+# saem; acima de REPORTS_MAX_MB saem os usados há mais tempo primeiro
+REPORTS_KEEP_DAYS = float(os.getenv("REPORTS_KEEP_DAYS", "7"))
+REPORTS_MAX_MB = float(os.getenv("REPORTS_MAX_MB", "500"))
+REPORTS_PRUNE_SECONDS = float(os.getenv("REPORTS_PRUNE_SECONDS", "60"))
+
+# builder(params, progress, out_path) -> None
+#   progress(fração 0..1, mensagem) atualiza o job
+Builder = Callable[[dict, Callable[[float, str], None], str], None]
+
+
+class Job:
+    __slots__ = ("id", "kind", "key", "params", "status", "progress", "message",
+                 "path", "filename", "mime", "error", "created_at", "finished_at")
+
+    def __init__(self, kind: str, key: str, params: dict, path: str, filename: str, mime: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.params = params
+        self.status = "queued"      # queued | running | done | error
+        self.progress = 0.0
+        self.message = "Na fila"
+        self.path = path
+        self.filename = filename
+        self.mime = mime
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "error")
+
+    def read_bytes(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+class JobManager:
+    def __init__(self, reports_dir: str = REPORTS_DIR, max_workers: int = REPORT_WORKERS, keep_seconds: float = 3600,
+                 keep_files_seconds: float = REPORTS_KEEP_DAYS * 86400, max_bytes: float = REPORTS_MAX_MB * 1024 * 1024):
+        self.reports_dir = reports_dir
+        self.keep_seconds = keep_seconds
+        self.keep_files_seconds = keep_files_seconds
+        self.max_bytes = max_bytes
+        self._pruned_at = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report")
+        self._builders: Dict[str, tuple] = {}
+        self._jobs: Dict[str, Job] = {}
+        self._by_key: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def register(self, kind: str, builder: Builder, extension: str, mime: str) -> None:
+        self._builders[kind] = (builder, extension, mime)
+
+    @staticmethod
+    def content_key(kind: str, params: dict, fingerprint=None) -> str:
+        raw = json.dumps({"kind": kind, "params": params, "data": fingerprint}, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def submit(self, kind: str, params: dict, fingerprint=None, filename: Optional[str] = None) -> Job:
+        """
+        Enfileira o relatório. Se o mesmo conteúdo já existe em disco, o job
+        nasce concluído; se já está rodando, devolve o job em andamento.
+        """
+        if kind not in self._builders:
+            raise ValueError(f"Tipo de relatório desconhecido: {kind}")
+        builder, extension, mime = self._builders[kind]
+
+        key = self.content_key(kind, params, fingerprint)
+        path = os.path.join(self.reports_dir, f"{key}.{extension}")
+        filename = filename or f"{kind}.{extension}"
+
+        with self._lock:
+            self._cleanup()
+            running = self._by_key.get(key)
+            if running is not None and not running.finished:
+                return running
+
+            job = Job(kind, key, params, path, filename, mime)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+
+            if os.path.exists(path):
+                os.utime(path)   # marca o uso: a poda por tamanho tira os menos usados
+                job.status = "done"
+                job.progress = 1.0
+                job.message = "Servido do cache"
+                job.finished_at = time.time()
+                return job
+
+        self._executor.submit(self._run, job, builder)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def _run(self, job: Job, builder: Builder) -> None:
+        def progress(fraction: float, message: str = "") -> None:
+            job.progress = max(0.0, min(1.0, float(fraction)))
+            if message:
+                job.message = message
+
+        job.status = "running"
+        job.message = "Processando"
+        os.makedirs(self.reports_dir, exist_ok=True)
+        tmp_path = f"{job.path}.{job.id}.tmp"
+        try:
+            builder(job.params, progress, tmp_path)
+            os.replace(tmp_path, job.path)   # publica o arquivo só quando completo
+            job.status = "done"
+            job.progress = 1.0
+            job.message = "Concluído"
+        except Exception as e:
+            job.status = "error"
+            job.error = str(e)
+            job.message = "Falhou"
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        finally:
+            job.finished_at = time.time()
+
+    def _cleanup(self) -> None:
+        # chamado com self._lock adquirido: esquece jobs terminados há muito tempo
+        # e, no máximo uma vez por REPORTS_PRUNE_SECONDS, poda o cache em disco
+        limit = time.time() - self.keep_seconds
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and (job.finished_at or 0) < limit:
+                del self._jobs[job_id]
+                if self._by_key.get(job.key) is job:
+                    del self._by_key[job.key]
+
+        if time.time() - self._pruned_at >= REPORTS_PRUNE_SECONDS:
+            self._pruned_at = time.time()
+            self._prune_files()
+
+    def _prune_files(self) -> None:
+        """
+        Poda REPORTS_DIR por idade e por tamanho total (mais antigos primeiro).
+        Arquivos de jobs ainda em memória (rodando ou prontos para download)
+        ficam; .tmp só sai se for sobra antiga de um processo que caiu.
+        """
+        in_use = {job.path for job in self._jobs.values()}
+        in_use |= {f"{job.path}.{job.id}.tmp" for job in self._jobs.values()}
+        now = time.time()
+        files, total = [], 0
+        try:
+            names = os.listdir(self.reports_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.reports_dir, name)
+            try:
+                info = os.stat(path)
+            except FileNotFoundError:
+                continue
+            total += info.st_size   # os em uso contam no total, mas não saem
+            if path not in in_use:
+                files.append((info.st_mtime, info.st_size, path, name.endswith(".tmp")))
+
+        files.sort()
+        for mtime, size, path, is_tmp in files:
+            expired = now - mtime > self.keep_files_seconds
+            if not expired and (is_tmp or total <= self.max_bytes):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+report_jobs = JobManager()
@@ -0,0 +1,383 @@
+# live.py
+from __future__ import annotations
+
+import logging
+import os
+import select
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from models import Expense, Order, Product, Sale
+
+
+# =========================================================
+# DASHBOARD AO VIVO (agregados incrementais por empresa)
+# =========================================================
+#
+# Cada empresa tem um LiveAggregates em memória com os totais da janela
+# (faturamento, cupons, mapa de calor, top produtos, série diária), guardados
+# também por dia. A cada atualização só entram as linhas com id acima da
+# última vista (marca d'água) em sales, orders e expenses; quando um dia sai
+# da janela, o balde dele é subtraído. O custo de cada atualização depende
+# do que foi vendido desde a anterior, não do tamanho da janela.
+#
+# No Postgres, checkout/despesas mandam NOTIFY no commit (notify()) e um
+# LISTEN em segundo plano diz quais empresas mudaram: sem aviso, nem a
+# consulta por id é feita. Nos outros bancos a consulta por id roda a cada
+# atualização (é um range no índice da chave primária).
+#
+# A marca d'água não enxerga alterações/exclusões de linhas antigas nem um
+# id menor que chegue a commitar depois de um maior; a reconstrução completa
+# a cada LIVE_REBUILD_SECONDS corrige esses casos.
+#
+# Janela, dias e "hoje" seguem o relógio das datas gravadas (utcnow()); a
+# conversão para a hora local fica só na tela.
+
+logger = logging.getLogger(__name__)
+
+LIVE_WINDOW_DAYS = int(os.getenv("LIVE_WINDOW_DAYS", "30"))
+# Intervalo do fragmento ao vivo no Dashboard
+LIVE_REFRESH_SECONDS = float(os.getenv("LIVE_REFRESH_SECONDS", "5"))
+# Várias telas abertas na mesma empresa: no máximo uma consulta por intervalo
+LIVE_MIN_POLL_SECONDS = float(os.getenv("LIVE_MIN_POLL_SECONDS", "1"))
+# Com LISTEN ativo, consulta mesmo sem aviso depois desse tempo
+LIVE_FULL_POLL_SECONDS = float(os.getenv("LIVE_FULL_POLL_SECONDS", "60"))
+LIVE_REBUILD_SECONDS = float(os.getenv("LIVE_REBUILD_SECONDS", "1800"))
+LIVE_CHANNEL = "peegflow_live"
+
+_SOURCES = {
+    "orders": (Order, (Order.id, Order.date, Order.total, Order.discount, Order.payment)),
+    "sales": (Sale, (Sale.id, Sale.date, Sale.product_id, Sale.quantity, Sale.price, Sale.order_id)),
+    "expenses": (Expense, (Expense.id, Expense.date, Expense.amount)),
+}
+
+
+def notify(db: Session, company_id: int) -> None:
+    """Avisa os painéis ao vivo da empresa (entregue no commit). Só no Postgres."""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_notify(:channel, :payload)"),
+                   {"channel": LIVE_CHANNEL, "payload": str(company_id)})
+
+
+# =========================
+# 🧮 AGREGADOS
+# =========================
+
+class _Bucket:
+    """Totais de um dia (ou da janela inteira, somando os dias)."""
+
+    __slots__ = ("revenue", "orders", "discount", "payment", "lines", "heat", "products", "expenses")
+
+    def __init__(self):
+        self.revenue = 0.0      # cupons, líquido de desconto
+        self.orders = 0
+        self.discount = 0.0
+        self.payment: Dict[str, list] = {}   # forma -> [cupons, total]
+        self.lines = 0.0        # soma preço x qtd das linhas (gráficos)
+        self.heat = [0.0] * (7 * 24)   # dia da semana x hora (segunda = 0)
+        self.products: Counter = Counter()
+        self.expenses = 0.0
+
+    def add_order(self, payment: Optional[str], total: float, discount: float) -> None:
+        self.revenue += total
+        self.orders += 1
+        self.discount += discount
+        entry = self.payment.setdefault(payment or "Não informado", [0, 0.0])
+        entry[0] += 1
+        entry[1] += total
+
+    def add_line(self, when: datetime, product_id: int, value: float) -> None:
+        self.lines += value
+        self.heat[when.weekday() * 24 + when.hour] += value
+        self.products[product_id] += value
+
+    def merge(self, other: "_Bucket", sign: int = 1) -> None:
+        self.revenue += sign * other.revenue
+        self.orders += sign * other.orders
+        self.discount += sign * other.discount
+        for name, (n, total) in other.payment.items():
+            entry = self.payment.setdefault(name, [0, 0.0])
+            entry[0] += sign * n
+            entry[1] += sign * total
+            if entry[0] <= 0:
+                del self.payment[name]
+        self.lines += sign * other.lines
+        if other.lines:
+            self.heat = [a + sign * b for a, b in zip(self.heat, other.heat)]
+        for pid, value in other.products.items():
+            self.products[pid] += sign * value
+            if abs(self.products[pid]) < 1e-9:
+                del self.products[pid]
+        self.expenses += sign * other.expenses
+
+
+class LiveAggregates:
+    def __init__(self, company_id: int, days: int = LIVE_WINDOW_DAYS):
+        self.company_id = company_id
+        self.days = int(days)
+        self.lock = threading.Lock()
+        self.version = 0
+        self.built_at = 0.0
+        self.polled_at = 0.0
+        self.last_rows = 0          # linhas novas na última atualização
+        self._snapshot: Optional[dict] = None
+
+    # ---------- janela ----------
+
+    def _window_start(self, now: datetime) -> datetime:
+        """Meia-noite do primeiro dia da janela (a janela anda de dia em dia)."""
+        return datetime.combine((now - timedelta(days=self.days)).date(), dtime.min)
+
+    def _evict(self, db: Session, now: datetime) -> None:
+        """Tira da janela os dias que já saíram (e o total deles)."""
+        first_day = self._window_start(now).date()
+        for day in [d for d in self._days if d < first_day]:
+            self.totals.merge(self._days.pop(day), sign=-1)
+            self.version += 1
+        if first_day != self._prev_day:
+            self._load_previous(db, now)
+
+    def _load_previous(self, db: Session, now: datetime) -> None:
+        """Período anterior de mesmo tamanho (não muda durante o dia)."""
+        from services import get_order_metrics
+
+        start = self._window_start(now)
+        self.prev = get_order_metrics(db, self.company_id, start - timedelta(days=self.days), start)
+        self._prev_day = start.date()
+
+    # ---------- leitura incremental ----------
+
+    def _fetch(self, db: Session, name: str, since: Optional[datetime] = None) -> list:
+        model, columns = _SOURCES[name]
+        query = db.query(*columns).filter(model.company_id == self.company_id)
+        if since is not None:
+            query = query.filter(model.date >= since)
+        else:
+            query = query.filter(model.id > self.high_water[name])
+        rows = query.order_by(model.id).all()
+        if rows:
+            self.high_water[name] = max(self.high_water[name], rows[-1].id)
+        return rows
+
+    def _fold(self, db: Session, days: Dict[date, _Bucket], orders, sales, expenses, start: datetime) -> int:
+        """Soma as linhas nos baldes diários de `days`. Retorna quantas linhas leu."""
+        def bucket_for(when: datetime) -> _Bucket:
+            bucket = days.get(when.date())
+            if bucket is None:
+                bucket = days[when.date()] = _Bucket()
+            return bucket
+
+        for _, when, total, discount, payment in orders:
+            if when is not None and when >= start:
+                bucket_for(when).add_order(payment, float(total or 0.0), float(discount or 0.0))
+
+        new_products = set()
+        for _, when, product_id, quantity, price, order_id in sales:
+            if when is None or when < start:
+                continue
+            value = float(price or 0.0) * int(quantity or 0)
+            bucket = bucket_for(when)
+            bucket.add_line(when, product_id, value)
+            if order_id is None:
+                # venda antiga sem cupom: cada linha conta como um cupom
+                bucket.add_order(None, value, 0.0)
+            if product_id not in self.names:
+                new_products.add(product_id)
+
+        for _, when, amount in expenses:
+            if when is not None and when >= start:
+                bucket_for(when).expenses += float(amount or 0.0)
+
+        if new_products:
+            self.names.update(db.query(Product.id, Product.name).filter(
+                Product.company_id == self.company_id,
+                Product.id.in_(list(new_products))
+            ).all())
+        return len(orders) + len(sales) + len(expenses)
+
+    def rebuild(self, db: Session) -> None:
+        """Carga completa da janela (primeira vez e a cada LIVE_REBUILD_SECONDS)."""
+        now = datetime.utcnow()
+        start = self._window_start(now)
+        self._days: "OrderedDict[date, _Bucket]" = OrderedDict()
+        self.names: Dict[int, str] = {}
+        # marca d'água = maior id da empresa agora (não só da janela)
+        self.high_water = {
+            name: int(db.query(func.max(model.id)).filter(model.company_id == self.company_id).scalar() or 0)
+            for name, (model, _) in _SOURCES.items()
+        }
+        self.polled_at = time.monotonic()
+        days: Dict[date, _Bucket] = {}
+        self._fold(db, days, self._fetch(db, "orders", start), self._fetch(db, "sales", start),
+                   self._fetch(db, "expenses", start), start)
+
+        self.totals = _Bucket()
+        for day in sorted(days):
+            self._days[day] = days[day]
+            self.totals.merge(days[day])
+        self._prev_day = None
+        self._load_previous(db, now)
+        self.built_at = self.polled_at
+        self.version += 1
+        self._snapshot = None
+
+    def refresh(self, db: Session) -> int:
+        """Dobra nos totais só o que chegou desde a última vez. Retorna quantas linhas."""
+        now = datetime.utcnow()
+        start = self._window_start(now)
+        self.polled_at = time.monotonic()
+        version = self.version
+        self._evict(db, now)
+
+        fresh: Dict[date, _Bucket] = {}   # baldes só com as linhas novas
+        rows = self._fold(db, fresh, self._fetch(db, "orders"), self._fetch(db, "sales"),
+                          self._fetch(db, "expenses"), start)
+        added = _Bucket()
+        for day, bucket in fresh.items():
+            if day not in self._days:
+                self._days[day] = _Bucket()
+            self._days[day].merge(bucket)
+            added.merge(bucket)
+        if rows:
+            self.totals.merge(added)
+            self.version += 1
+        if self.version != version:
+            self._snapshot = None
+        self.last_rows = rows
+        return rows
+
+    # ---------- saída (mesmo formato de services.compute_dashboard_snapshot) ----------
+
+    def snapshot(self) -> dict:
+        if self._snapshot is not None:
+            return self._snapshot
+        import numpy as np
+
+        now = datetime.utcnow()
+        totals, prev = self.totals, self.prev
+        kpis = {
+            "revenue": totals.revenue,
+            "revenue_prev": prev["revenue"],
+            "revenue_delta": totals.revenue - prev["revenue"],
+            "discount": totals.discount,
+            "expenses": totals.expenses,
+            "profit": totals.revenue - totals.expenses,
+            "avg_ticket": totals.revenue / totals.orders if totals.orders else 0.0,
+            "sales_count": totals.orders,
+            "sales_count_prev": prev["orders"],
+            "payment_mix": {name: {"orders": n, "total": total} for name, (n, total) in totals.payment.items()},
+        }
+        today = self._days.get(now.date())
+        kpis["today_revenue"] = today.revenue if today else 0.0
+        kpis["today_orders"] = today.orders if today else 0
+
+        days = sorted(self._days)
+        line_days = [d for d in days if self._days[d].lines]
+        daily = {"Receita": (np.array(line_days, dtype="datetime64[D]"),
+                             np.array([self._days[d].lines for d in line_days], dtype=float))}
+        expense_days = [d for d in days if self._days[d].expenses]
+        if expense_days:
+            daily["Despesa"] = (np.array(expense_days, dtype="datetime64[D]"),
+                                np.array([self._days[d].expenses for d in expense_days], dtype=float))
+
+        top = sorted(totals.products.items(), key=lambda kv: kv[1])[-5:]
+        self._snapshot = {
+            "company_id": self.company_id,
+            "days": self.days,
+            "start": self._window_start(now),
+            "end": now,
+            "computed_at": now,
+            "version": ("live", self.version),
+            "kpis": kpis,
+            "heatmap": np.array(totals.heat, dtype=float).reshape(7, 24),
+            "top_products": ([self.names.get(pid, f"Produto #{pid}") for pid, _ in top],
+                             np.array([value for _, value in top], dtype=float)),
+            "daily": daily,
+        }
+        return self._snapshot
+
+
+# =========================
+# 📡 LISTEN (Postgres)
+# =========================
+
+class _PgListener(threading.Thread):
+    """Guarda quando cada empresa recebeu o último NOTIFY."""
+
+    def __init__(self, engine):
+        super().__init__(name="peegflow-live-listen", daemon=True)
+        self.engine = engine
+        self.changed: Dict[int, float] = {}
+        self.healthy = False
+
+    def run(self) -> None:
+        while True:
+            try:
+                conn = self.engine.raw_connection()
+                conn.detach()
+                raw = conn.driver_connection
+                raw.autocommit = True
+                raw.cursor().execute(f"LISTEN {LIVE_CHANNEL}")
+                self.healthy = True
+                while True:
+                    if select.select([raw], [], [], 5.0)[0]:
+                        raw.poll()
+                        while raw.notifies:
+                            payload = raw.notifies.pop(0).payload
+                            if payload.isdigit():
+                                self.changed[int(payload)] = time.monotonic()
+            except Exception:
+                logger.exception("LISTEN %s caiu; voltando a consultar por tempo", LIVE_CHANNEL)
+                self.healthy = False
+                time.sleep(5.0)
+
+
+_listener: Optional[_PgListener] = None
+_registry: Dict[Tuple[int, int], LiveAggregates] = {}
+_registry_lock = threading.Lock()
+
+
+def _start_listener() -> Optional[_PgListener]:
+    global _listener
+    if _listener is None:
+        from database import engine
+
+        if engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2":
+            _listener = _PgListener(engine)
+            _listener.start()
+    return _listener
+
+
+def _should_poll(agg: LiveAggregates) -> bool:
+    now = time.monotonic()
+    if now - agg.polled_at < LIVE_MIN_POLL_SECONDS:
+        return False
+    listener = _listener
+    if listener is None or not listener.healthy:
+        return True
+    return listener.changed.get(agg.company_id, 0.0) >= agg.polled_at or now - agg.polled_at >= LIVE_FULL_POLL_SECONDS
+
+
+def get_live_snapshot(db: Session, company_id: int, days: int = LIVE_WINDOW_DAYS) -> dict:
+    """
+    Snapshot do Dashboard mantido por deltas. Todas as sessões da empresa
+    compartilham o mesmo LiveAggregates.
+    """
+    with _registry_lock:
+        _start_listener()
+        agg = _registry.get((company_id, int(days)))
+        if agg is None:
+            agg = _registry[(company_id, int(days))] = LiveAggregates(company_id, days)
+
+    with agg.lock:
+        if not agg.built_at or time.monotonic() - agg.built_at >= LIVE_REBUILD_SECONDS:
+            agg.rebuild(db)
+        elif _should_poll(agg):
+            agg.refresh(db)
+        return agg.snapshot()
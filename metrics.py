@@ -0,0 +1,374 @@
+# metrics.py
+from __future__ import annotations
+
+import bisect
+import functools
+import json
+import logging
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("peegflow.metrics")
+
+
+# =========================================================
+# MÉTRICAS OPERACIONAIS (Prometheus / JSON)
+# =========================================================
+#
+# Registro em memória, por processo: contadores, gauges e histogramas de
+# latência com rótulos. Sai em texto Prometheus (GET /metrics) ou JSON
+# (GET /metrics.json, com p50/p95/p99 estimados pelos buckets).
+#
+# METRICS_PORT liga um servidor HTTP pequeno só para as métricas (útil no
+# Streamlit, que não tem rotas próprias); a API HTTP também serve /metrics.
+# Com vários workers cada processo tem o seu registro: raspe cada um.
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0") or 0)
+
+# Limites (segundos) dos buckets de latência
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: rótulos esperados {self.labelnames}, recebidos {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[LabelValues, float]]:
+        """(rótulos, valor) de cada série, em ordem de rótulo."""
+
+    def render(self) -> List[str]:
+        return self._header() + [
+            f"{self.name}{_label_text(self.labelnames, key)} {_format_value(value)}" for key, value in self.samples()
+        ]
+
+    def snapshot(self) -> list:
+        return [{"labels": dict(zip(self.labelnames, key)), "value": value} for key, value in self.samples()]
+
+
+class Counter(_Metric):
+    """Só cresce (vendas, falhas de login...)."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[LabelValues, float]]:
+        with self._lock:
+            return sorted(self._values.items())
+
+
+class Gauge(_Metric):
+    """
+    Valor atual. `set` grava um valor; `set_function` lê na hora da coleta
+    (ex.: conexões do pool em uso, taxa de acerto de um cache).
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def set_function(self, fn: Callable[[], float], **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def samples(self) -> List[Tuple[LabelValues, float]]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = float(fn())
+            except Exception as e:   # uma leitura quebrada não derruba a coleta
+                logger.warning("Gauge %s%s falhou: %s", self.name, key, e)
+        return sorted(values.items())
+
+
+class Histogram(_Metric):
+    """Distribuição de latências em buckets cumulativos (segundos)."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # por rótulo: [contagem por bucket (+ o +Inf no fim), soma, total]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _copy(self) -> Dict[LabelValues, list]:
+        with self._lock:
+            return {key: [list(s[0]), s[1], s[2]] for key, s in sorted(self._series.items())}
+
+    def samples(self) -> List[Tuple[LabelValues, float]]:
+        # uma série por rótulo: o total de observações (render/snapshot trazem os buckets)
+        return [(key, float(series[2])) for key, series in self._copy().items()]
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        series = self._copy().get(self._key(labels))
+        return self._quantile(series, q) if series else None
+
+    def _quantile(self, series: list, q: float) -> Optional[float]:
+        """Estimativa por interpolação linear dentro do bucket (como histogram_quantile)."""
+        counts, _, total = series
+        if not total:
+            return None
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]   # acima do último limite
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, (counts, total_sum, total) in self._copy().items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {_format_value(total_sum)}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {total}")
+        return lines
+
+    def snapshot(self) -> list:
+        out = []
+        for key, series in self._copy().items():
+            counts, total_sum, total = series
+            out.append({
+                "labels": dict(zip(self.labelnames, key)),
+                "count": total,
+                "sum": total_sum,
+                "avg": total_sum / total if total else None,
+                "p50": self._quantile(series, 0.50),
+                "p95": self._quantile(series, 0.95),
+                "p99": self._quantile(series, 0.99),
+            })
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(self, cls, name: str, help: str, labelnames: Sequence[str] = (), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Métrica {name} já registrada com outro tipo ou rótulos")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def metrics(self) -> List[_Metric]:
+        with self._lock:
+            return [self._metrics[name] for name in sorted(self._metrics)]
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self.metrics():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {
+            metric.name: {"type": metric.kind, "help": metric.help, "samples": metric.snapshot()}
+            for metric in self.metrics()
+        }
+
+
+registry = Registry()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# =========================
+# ⏱️ INSTRUMENTAÇÃO
+# =========================
+
+def _outcome(result) -> str:
+    """"fail" para os retornos de recusa dos serviços: None, False ou (False, msg, ...)."""
+    if result is None or result is False:
+        return "fail"
+    if isinstance(result, tuple) and result and result[0] is False:
+        return "fail"
+    return "ok"
+
+
+def timed(histogram: Histogram):
+    """
+    Decorador: observa a duração da chamada em `histogram` (rótulo
+    `outcome` = ok / fail / error).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            outcome = "error"
+            try:
+                result = fn(*args, **kwargs)
+                outcome = _outcome(result)
+                return result
+            finally:
+                histogram.observe(time.perf_counter() - t0, outcome=outcome)
+        return wrapper
+    return decorator
+
+
+def _pool_checked_out() -> float:
+    from database import engine
+
+    checkedout = getattr(engine.pool, "checkedout", None)
+    return float(checkedout()) if checkedout else 0.0
+
+
+def _pool_size() -> float:
+    from database import engine
+
+    size = getattr(engine.pool, "size", None)
+    return float(size()) if size else 0.0
+
+
+def register_runtime_gauges() -> None:
+    """Gauges lidos na coleta: pool de conexões e caches em memória."""
+    from cache import dashboard_cache, figure_cache, report_cache
+
+    pool = registry.gauge("peegflow_db_pool_checked_out", "Conexões do pool em uso")
+    pool.set_function(_pool_checked_out)
+    registry.gauge("peegflow_db_pool_size", "Tamanho configurado do pool").set_function(_pool_size)
+
+    hit_rate = registry.gauge("peegflow_cache_hit_ratio", "Acertos / consultas do cache", ["cache"])
+    entries = registry.gauge("peegflow_cache_entries", "Entradas no cache", ["cache"])
+    for name, cache in (("dashboard", dashboard_cache), ("figure", figure_cache), ("report", report_cache)):
+        hit_rate.set_function(lambda c=cache: c.stats()["hit_rate"], cache=name)
+        entries.set_function(lambda c=cache: c.stats()["size"], cache=name)
+
+
+# =========================
+# 🌐 SERVIDOR LOCAL
+# =========================
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path in ("/metrics", "/"):
+            body, content_type = registry.render_prometheus().encode("utf-8"), PROMETHEUS_CONTENT_TYPE
+        elif path == "/metrics.json":
+            body, content_type = json.dumps(registry.snapshot()).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """
+    Sobe o endpoint em segundo plano (uma vez por processo). Sem porta
+    configurada não faz nada; porta ocupada (outro worker) só gera um aviso.
+    """
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _Handler)
+            except OSError as e:
+                logger.warning("Métricas: não foi possível abrir %s:%s (%s)", host, port, e)
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info("Métricas em http://%s:%s/metrics", host, _server.server_address[1])
+        return _server
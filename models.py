@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -24,6 +24,18 @@ class User(Base):
     company = relationship("Company", back_populates="users")
 
 
+class CompanyAdmin(Base):
+    """Empresas extras que um usuário administra (dono com várias lojas)."""
+    __tablename__ = "company_admins"
+    __table_args__ = (
+        UniqueConstraint("user_id", "company_id", name="uq_company_admins_user_company"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+
+
 class Product(Base):
     __tablename__ = "products"
 
@@ -35,22 +47,171 @@ class Product(Base):
     price_wholesale = Column(Float)
     stock = Column(Integer, default=0)
     stock_min = Column(Integer, default=5)
+    # Custo médio ponderado do saldo em estoque, atualizado a cada reposição
+    avg_cost = Column(Float)
+    # Versão do cadastro (nome, SKU, preços, mínimo): sobe a cada edição e é
+    # conferida no WHERE do UPDATE. Vendas e reposições não mexem nela
+    version = Column(Integer, default=1)
+
+
+class StockMovement(Base):
+    """
+    Razão de estoque (só inserção): cada mudança em Product.stock grava uma
+    linha na mesma transação. delta > 0 entra, delta < 0 sai.
+    """
+    __tablename__ = "stock_movements"
+    __table_args__ = (
+        Index("ix_stock_movements_company_product_date", "company_id", "product_id", "date"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, nullable=False)
+    product_id = Column(Integer, nullable=False)
+    delta = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)  # abertura | venda | reposicao | ajuste
+    ref_id = Column(Integer)               # Order.id (venda) ou Expense.id (reposição)
+    balance_after = Column(Integer)        # Product.stock logo após o movimento
+    user_id = Column(Integer)
+    date = Column(DateTime, default=datetime.utcnow)
+
+
+class StockSnapshot(Base):
+    """Saldo de cada produto num corte (soma do razão até `taken_at`)."""
+    __tablename__ = "stock_snapshots"
+    __table_args__ = (
+        UniqueConstraint("product_id", "taken_at", name="uq_stock_snapshots_product_taken_at"),
+        Index("ix_stock_snapshots_company_taken_at", "company_id", "taken_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, nullable=False)
+    product_id = Column(Integer, nullable=False)
+    stock = Column(Integer, nullable=False)
+    taken_at = Column(DateTime, nullable=False)
+
+
+class Order(Base):
+    """Cabeçalho do cupom: um por checkout, com as linhas em Sale."""
+    __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_company_date", "company_id", "date"),
+        Index("uq_orders_company_receipt", "company_id", "receipt_number", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, nullable=False)
+    user_id = Column(Integer)
+    subtotal = Column(Float, default=0.0)
+    discount = Column(Float, default=0.0)
+    total = Column(Float, default=0.0)
+    payment = Column(String)  # PIX | Dinheiro | Cartão
+    receipt_number = Column(Integer)  # nº do cupom, único por empresa (receipts.py)
+    terminal = Column(String)
+    date = Column(DateTime, default=datetime.utcnow)
+
+    items = relationship("Sale", back_populates="order")
+
+
+class ReceiptCounter(Base):
+    """Último nº de cupom já reservado por empresa (só muda uma vez por bloco)."""
+    __tablename__ = "receipt_counters"
+
+    company_id = Column(Integer, primary_key=True, autoincrement=False)
+    last_number = Column(Integer, nullable=False, default=0)
+
+
+class ReceiptBlock(Base):
+    """Faixa [start, end] de números de cupom reservada por um terminal."""
+    __tablename__ = "receipt_blocks"
+    __table_args__ = (
+        UniqueConstraint("company_id", "start", name="uq_receipt_blocks_company_start"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, nullable=False)
+    terminal = Column(String, nullable=False)
+    start = Column(Integer, nullable=False)
+    end = Column(Integer, nullable=False)
+    reserved_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ReceiptReturn(Base):
+    """
+    Número devolvido por uma venda que não foi gravada. O terminal o
+    reaproveita na próxima venda; se reiniciar antes, a conferência mostra
+    o número como devolvido, não como buraco.
+    """
+    __tablename__ = "receipt_returns"
+    __table_args__ = (
+        Index("ix_receipt_returns_company_number", "company_id", "receipt_number"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, nullable=False)
+    terminal = Column(String, nullable=False)
+    receipt_number = Column(Integer, nullable=False)
+    returned_at = Column(DateTime, default=datetime.utcnow)
 
 
 class Sale(Base):
     __tablename__ = "sales"
+    __table_args__ = (
+        Index("ix_sales_company_date", "company_id", "date"),
+        # relatório por caixa (get_cashier_report)
+        Index("ix_sales_company_user_date", "company_id", "user_id", "date"),
+    )
 
     id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     company_id = Column(Integer)
     product_id = Column(Integer)
     quantity = Column(Integer)
     price = Column(Float)
+    # Custo médio do produto no momento da venda (margem bruta por linha)
+    unit_cost = Column(Float)
     user_id = Column(Integer)
     date = Column(DateTime, default=datetime.utcnow)
 
+    order = relationship("Order", back_populates="items")
+
+
+class CashierHour(Base):
+    """
+    Vendas de um caixa numa hora já fechada (agregado de Sale). O relatório
+    por caixa soma estas linhas e lê de Sale só o que ainda não foi agregado.
+    """
+    __tablename__ = "cashier_hours"
+    __table_args__ = (
+        Index("uq_cashier_hours_company_start_user", "company_id", "start", "user_id", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, nullable=False)
+    user_id = Column(Integer)
+    start = Column(DateTime, nullable=False)    # início da hora
+    orders = Column(Integer, nullable=False)
+    units = Column(Integer, nullable=False)
+    revenue = Column(Float, nullable=False)
+
+
+class CashierRollup(Base):
+    """
+    Até onde CashierHour já foi agregado por empresa: horas antes de
+    `rolled_until` e vendas com id até `last_sale_id` (marca d'água).
+    """
+    __tablename__ = "cashier_rollups"
+
+    company_id = Column(Integer, primary_key=True, autoincrement=False)
+    rolled_until = Column(DateTime, nullable=False)
+    last_sale_id = Column(Integer, nullable=False, default=0)
+
 
 class Expense(Base):
     __tablename__ = "expenses"
+    __table_args__ = (
+        Index("ix_expenses_company_date", "company_id", "date"),
+        Index("uq_expenses_company_import_hash", "company_id", "import_hash", unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
     company_id = Column(Integer)
@@ -58,3 +219,4 @@ class Expense(Base):
     category = Column(String)
     amount = Column(Float)
     date = Column(DateTime)
+    import_hash = Column(String(64))  # lançamento de extrato importado (statements.py)
@@ -0,0 +1,194 @@
+# profiling.py
+from __future__ import annotations
+
+import cProfile
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("peegflow.profiling")
+
+
+# =========================================================
+# PERFILAMENTO POR RERUN (opcional)
+# =========================================================
+#
+# PEEGFLOW_PROFILE=timer      -> cronometra a página e as seções marcadas
+# PEEGFLOW_PROFILE=cprofile   -> idem + cProfile da página inteira; cada rerun
+#                                grava um .pstats em PROFILE_DIR (abre com
+#                                snakeviz, flameprof ou gprof2dot)
+# Sem a variável, um admin pode ligar pela barra lateral (só na sessão dele).
+#
+# Orçamentos em ms: PEEGFLOW_PROFILE_BUDGET_MS (padrão para todas as seções) e
+# PEEGFLOW_PROFILE_BUDGETS="dashboard=800,pdv=300,dashboard.figuras=200".
+# Seção acima do orçamento vai para o log como warning e aparece com ⚠️.
+
+MODES = ("off", "timer", "cprofile")
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".peegflow_profiles"))
+# Poda dos .pstats: ficam os PROFILE_KEEP_FILES mais recentes, e nenhum com
+# mais de PROFILE_KEEP_DAYS dias
+PROFILE_KEEP_FILES = int(os.getenv("PROFILE_KEEP_FILES", "200"))
+PROFILE_KEEP_DAYS = float(os.getenv("PROFILE_KEEP_DAYS", "7"))
+DEFAULT_BUDGET_MS = float(os.getenv("PEEGFLOW_PROFILE_BUDGET_MS", "500"))
+
+
+def _parse_budgets(raw: str) -> Dict[str, float]:
+    budgets = {}
+    for part in (raw or "").split(","):
+        name, sep, value = part.partition("=")
+        if sep and name.strip():
+            try:
+                budgets[name.strip()] = float(value)
+            except ValueError:
+                logger.warning("Orçamento inválido em PEEGFLOW_PROFILE_BUDGETS: %s", part)
+    return budgets
+
+
+BUDGETS_MS = _parse_budgets(os.getenv("PEEGFLOW_PROFILE_BUDGETS", ""))
+
+
+def env_mode() -> str:
+    value = (os.getenv("PEEGFLOW_PROFILE") or "").strip().lower()
+    if value in ("1", "true", "yes", "on", "sim"):
+        return "timer"
+    return value if value in MODES else "off"
+
+
+def budget_for(name: str) -> float:
+    return BUDGETS_MS.get(name, DEFAULT_BUDGET_MS)
+
+
+class RerunProfile:
+    """Tempos de um rerun: a página (seção raiz) e as seções internas."""
+
+    def __init__(self, page: str, mode: str):
+        self.page = page
+        self.mode = mode
+        self.started_at = datetime.now()
+        self.sections: List[dict] = []
+        self.stats_path: Optional[str] = None
+        self._stack: List[str] = []
+
+    def add(self, name: str, elapsed_ms: float) -> None:
+        budget = budget_for(name)
+        over = elapsed_ms > budget
+        self.sections.append({"section": name, "ms": elapsed_ms, "budget_ms": budget, "over_budget": over})
+        if over:
+            logger.warning("Seção %s levou %.0f ms (orçamento %.0f ms)", name, elapsed_ms, budget)
+
+    @property
+    def over_budget(self) -> List[dict]:
+        return [s for s in self.sections if s["over_budget"]]
+
+    def to_dict(self) -> dict:
+        return {
+            "page": self.page,
+            "mode": self.mode,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "sections": self.sections,
+            "stats_path": self.stats_path,
+        }
+
+
+# Cada sessão do Streamlit roda o script na sua própria thread
+_local = threading.local()
+
+# Últimos reruns perfilados neste processo (para o painel do admin)
+history: "deque[RerunProfile]" = deque(maxlen=200)
+
+
+def current() -> Optional[RerunProfile]:
+    return getattr(_local, "run", None)
+
+
+@contextmanager
+def section(name: str):
+    """Cronometra um trecho da página. Sem perfilamento ativo, não faz nada."""
+    run = current()
+    if run is None:
+        yield
+        return
+    full_name = ".".join(run._stack + [name])
+    run._stack.append(name)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        run._stack.pop()
+        run.add(full_name, (time.perf_counter() - t0) * 1000)
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-") or "pagina"
+
+
+@contextmanager
+def rerun(page: str, mode: str = "off"):
+    """
+    Envolve a renderização de uma página. `page` é o nome da seção raiz
+    (ex.: "dashboard"); as seções internas ficam "dashboard.<nome>".
+    Devolve o RerunProfile (ou None com o modo "off").
+    """
+    if mode not in ("timer", "cprofile"):
+        yield None
+        return
+
+    run = RerunProfile(page, mode)
+    _local.run = run
+    profiler = cProfile.Profile() if mode == "cprofile" else None
+    try:
+        if profiler is not None:
+            profiler.enable()
+        with section(page):
+            yield run
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _local.run = None
+        history.append(run)
+        _save(run, profiler)
+
+
+def _save(run: RerunProfile, profiler: Optional[cProfile.Profile]) -> None:
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = run.started_at.strftime("%Y%m%d-%H%M%S-%f")
+        if profiler is not None:
+            run.stats_path = os.path.join(PROFILE_DIR, f"{stamp}_{_slug(run.page)}.pstats")
+            profiler.dump_stats(run.stats_path)
+            _prune_stats()
+        with open(os.path.join(PROFILE_DIR, "timings.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(run.to_dict(), ensure_ascii=False) + "\n")
+    except OSError as e:
+        logger.warning("Não foi possível gravar o perfil em %s: %s", PROFILE_DIR, e)
+
+
+def _prune_stats() -> None:
+    """Apaga os .pstats além dos PROFILE_KEEP_FILES mais novos ou mais velhos que PROFILE_KEEP_DAYS."""
+    limit = time.time() - PROFILE_KEEP_DAYS * 86400
+    files = []
+    for name in os.listdir(PROFILE_DIR):
+        if not name.endswith(".pstats"):
+            continue
+        path = os.path.join(PROFILE_DIR, name)
+        try:
+            files.append((os.stat(path).st_mtime, path))
+        except FileNotFoundError:
+            continue
+
+    files.sort(reverse=True)   # mais novos primeiro
+    for position, (mtime, path) in enumerate(files):
+        if position < PROFILE_KEEP_FILES and mtime >= limit:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
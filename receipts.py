@@ -0,0 +1,228 @@
+# receipts.py
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import Order, ReceiptBlock, ReceiptCounter, ReceiptReturn
+
+
+# =========================================================
+# NUMERAÇÃO DE CUPONS (blocos hi/lo por terminal)
+# =========================================================
+#
+# O contador da empresa (ReceiptCounter) só é tocado quando um terminal
+# precisa de um bloco novo: UPDATE last_number = last_number + N, numa
+# transação curta e separada da venda. Dentro do bloco os números saem da
+# memória, sem ida ao banco. A unicidade por empresa é garantida pelos
+# blocos disjuntos e pelo índice único (company_id, receipt_number).
+#
+# Um terminal que reinicia perde o resto do bloco: a numeração fica com
+# saltos, mas nunca repete. check_receipt_numbers separa esses saltos
+# (sobra de bloco) dos buracos de verdade (número pulado no meio do bloco).
+# Números devolvidos por vendas que falharam ficam gravados em
+# ReceiptReturn: se o terminal reinicia antes de reaproveitá-los, a
+# conferência os mostra como devolvidos, não como buracos.
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_BLOCK_SIZE = int(os.getenv("RECEIPT_BLOCK_SIZE", "50"))
+# Nome do terminal (caixa). Padrão: um por processo
+TERMINAL_ID = os.getenv("PDV_TERMINAL") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def reserve_block(db: Session, company_id: int, terminal: str, size: int = RECEIPT_BLOCK_SIZE) -> Tuple[int, int]:
+    """Reserva a próxima faixa [start, end] da empresa para `terminal` e faz commit."""
+    for _ in range(5):
+        try:
+            end = db.execute(
+                update(ReceiptCounter)
+                .where(ReceiptCounter.company_id == company_id)
+                .values(last_number=ReceiptCounter.last_number + size)
+                .returning(ReceiptCounter.last_number)
+                .execution_options(synchronize_session=False)
+            ).scalar_one_or_none()
+            if end is None:
+                # primeiro bloco da empresa
+                db.add(ReceiptCounter(company_id=company_id, last_number=size))
+                db.flush()
+                end = size
+            start = end - size + 1
+            db.add(ReceiptBlock(company_id=company_id, terminal=terminal, start=start, end=end))
+            db.commit()
+            return start, end
+        except IntegrityError:
+            # outro terminal criou o contador ao mesmo tempo: tenta de novo
+            db.rollback()
+    raise RuntimeError(f"Não foi possível reservar números de cupom para a empresa {company_id}")
+
+
+class ReceiptAllocator:
+    """
+    Entrega números de cupom a partir dos blocos reservados por
+    (empresa, terminal). Thread-safe; só vai ao banco ao esgotar o bloco.
+    """
+
+    def __init__(self, block_size: int = RECEIPT_BLOCK_SIZE, session_factory=None):
+        self.block_size = block_size
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[int, str], threading.Lock] = {}
+        self._next: Dict[Tuple[int, str], int] = {}
+        self._end: Dict[Tuple[int, str], int] = {}
+        self._returned: Dict[Tuple[int, str], List[int]] = {}
+
+    def _new_session(self) -> Session:
+        if self._session_factory is None:
+            # Conexão fora do pool: quem pede um bloco normalmente já segura uma
+            # conexão do pool (a sessão da venda); com o pool esgotado, esperar
+            # por outra travaria todos os caixas ao mesmo tempo
+            from sqlalchemy import create_engine
+            from sqlalchemy.orm import sessionmaker
+            from sqlalchemy.pool import NullPool
+
+            from database import DATABASE_URL, _engine_kwargs
+
+            # mesmas opções do engine principal (connect_args: timeout, SSL...),
+            # menos as de dimensionamento do pool, que não valem para o NullPool
+            kwargs = {k: v for k, v in _engine_kwargs(DATABASE_URL).items()
+                      if k not in ("pool_size", "max_overflow", "pool_recycle")}
+            self._session_factory = sessionmaker(bind=create_engine(DATABASE_URL, poolclass=NullPool, **kwargs))
+        return self._session_factory()
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def take(self, company_id: int, terminal: Optional[str] = None) -> int:
+        key = (company_id, terminal or TERMINAL_ID)
+        with self._key_lock(key):
+            returned = self._returned.get(key)
+            if returned:
+                return returned.pop()
+            number = self._next.get(key, 1)
+            if number > self._end.get(key, 0):
+                db = self._new_session()
+                try:
+                    number, self._end[key] = reserve_block(db, company_id, key[1], self.block_size)
+                finally:
+                    db.close()
+            self._next[key] = number + 1
+            return number
+
+    def give_back(self, company_id: int, number: int, terminal: Optional[str] = None) -> None:
+        """
+        Devolve o número de uma venda que não foi gravada (é o próximo a sair)
+        e registra a devolução no banco, numa transação própria.
+        """
+        key = (company_id, terminal or TERMINAL_ID)
+        with self._key_lock(key):
+            returned = self._returned.setdefault(key, [])
+            returned.append(number)
+            returned.sort(reverse=True)
+
+        db = self._new_session()
+        try:
+            db.add(ReceiptReturn(company_id=company_id, terminal=key[1], receipt_number=number))
+            db.commit()
+        except Exception:
+            # a venda já falhou; sem o registro, só um reinício antes do
+            # reaproveitamento faria o número aparecer como buraco
+            db.rollback()
+            logger.exception("Falha ao registrar o cupom %s devolvido (empresa %s)", number, company_id)
+        finally:
+            db.close()
+
+
+allocator = ReceiptAllocator()
+
+
+def check_receipt_numbers(db: Session, company_id: int) -> dict:
+    """
+    Conferência da numeração da empresa:
+    - duplicates: números usados por mais de um cupom
+    - holes: números pulados antes do último usado de cada bloco
+    - returned: números pulados que foram devolvidos por vendas que não
+      gravaram (terminal reiniciado antes de reaproveitar); não são buracos
+    - unused: sobras no fim dos blocos (terminal reiniciado ou bloco em uso)
+    - outside: cupons com número fora de qualquer bloco reservado
+    """
+    duplicates = [
+        number for number, in db.query(Order.receipt_number).filter(
+            Order.company_id == company_id,
+            Order.receipt_number.isnot(None)
+        ).group_by(Order.receipt_number).having(func.count(Order.id) > 1).order_by(Order.receipt_number).all()
+    ]
+
+    in_block = and_(
+        Order.company_id == ReceiptBlock.company_id,
+        Order.receipt_number >= ReceiptBlock.start,
+        Order.receipt_number <= ReceiptBlock.end
+    )
+    blocks = db.query(
+        ReceiptBlock.id,
+        ReceiptBlock.terminal,
+        ReceiptBlock.start,
+        ReceiptBlock.end,
+        func.count(func.distinct(Order.receipt_number)),
+        func.max(Order.receipt_number)
+    ).outerjoin(Order, in_block).filter(
+        ReceiptBlock.company_id == company_id
+    ).group_by(ReceiptBlock.id, ReceiptBlock.terminal, ReceiptBlock.start, ReceiptBlock.end).order_by(
+        ReceiptBlock.start
+    ).all()
+
+    holes = []
+    returned = 0
+    unused = 0
+    used = 0
+    for block_id, terminal, start, end, count, max_used in blocks:
+        used += int(count or 0)
+        if max_used is None:
+            unused += end - start + 1
+            continue
+        unused += end - max_used
+        if max_used - start + 1 > count:
+            present = {
+                n for n, in db.query(Order.receipt_number).filter(
+                    Order.company_id == company_id,
+                    Order.receipt_number >= start,
+                    Order.receipt_number <= max_used
+                ).all()
+            }
+            given_back = {
+                n for n, in db.query(ReceiptReturn.receipt_number).filter(
+                    ReceiptReturn.company_id == company_id,
+                    ReceiptReturn.receipt_number >= start,
+                    ReceiptReturn.receipt_number <= max_used
+                ).all()
+            }
+            missing = [n for n in range(start, max_used + 1) if n not in present]
+            returned += sum(1 for n in missing if n in given_back)
+            missing = [n for n in missing if n not in given_back]
+            if missing:
+                holes.append({"block_id": block_id, "terminal": terminal, "numbers": missing})
+
+    outside = db.query(func.count(Order.id)).filter(
+        Order.company_id == company_id,
+        Order.receipt_number.isnot(None),
+        ~db.query(ReceiptBlock.id).filter(in_block).exists()
+    ).scalar()
+
+    return {
+        "blocks": len(blocks),
+        "used": used,
+        "duplicates": duplicates,
+        "holes": holes,
+        "returned": returned,
+        "unused": unused,
+        "outside": int(outside or 0),
+        "ok": not duplicates and not holes and not outside,
+    }
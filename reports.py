@@ -0,0 +1,209 @@
+# reports.py
+from __future__ import annotations
+
+import csv
+from datetime import datetime, timedelta
+from typing import Callable, List, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from jobs import Job, report_jobs
+from models import Product, Sale, Expense
+
+
+# =========================================================
+# RELATÓRIOS DE FECHAMENTO (rodam no pool de jobs.py)
+# =========================================================
+
+def _month_chunks(start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+    """Quebra o período em meses para processar (e reportar progresso) aos poucos."""
+    chunks = []
+    cur = start
+    while cur <= end:
+        nxt = (cur.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        chunk_end = min(nxt - timedelta(microseconds=1), end)
+        chunks.append((cur, chunk_end))
+        cur = nxt
+    return chunks
+
+
+def _params_range(params: dict) -> Tuple[int, datetime, datetime]:
+    return (
+        int(params["company_id"]),
+        datetime.fromisoformat(params["start"]),
+        datetime.fromisoformat(params["end"]),
+    )
+
+
+def _open_session(params: dict) -> Session:
+    """
+    Sessão de leitura (réplica, se houver). Se a réplica ainda não tem os
+    mesmos dados que geraram a chave do relatório, lê do primário: o arquivo
+    fica em cache pela chave e não pode ser gerado com dados atrasados.
+    """
+    from database import SessionLocal, get_read_session
+    from services import get_data_fingerprint
+
+    company_id, start, end = _params_range(params)
+    db = get_read_session()
+    expected = params.get("fingerprint")
+    if expected is None or get_data_fingerprint(db, company_id, start, end) == expected:
+        return db
+    db.close()
+    return SessionLocal()
+
+
+def build_closing_csv(params: dict, progress: Callable[[float, str], None], out_path: str) -> None:
+    """Extrato completo (vendas e despesas) em CSV, gravado mês a mês."""
+    company_id, start, end = _params_range(params)
+    chunks = _month_chunks(start, end)
+
+    db = _open_session(params)
+    try:
+        names = dict(db.query(Product.id, Product.name).filter(Product.company_id == company_id).all())
+
+        with open(out_path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(["Tipo", "Data", "Descrição", "Categoria", "Qtd", "Valor Unit.", "Total"])
+
+            for i, (c_start, c_end) in enumerate(chunks):
+                progress(i / len(chunks), f"{c_start:%m/%Y}")
+
+                sales = db.query(Sale.date, Sale.product_id, Sale.quantity, Sale.price).filter(
+                    Sale.company_id == company_id,
+                    Sale.date >= c_start,
+                    Sale.date <= c_end
+                ).order_by(Sale.date).yield_per(2000)
+                for s in sales:
+                    price = float(s.price or 0.0)
+                    qty = int(s.quantity or 0)
+                    writer.writerow([
+                        "Venda", f"{s.date:%d/%m/%Y %H:%M}",
+                        names.get(s.product_id, f"Produto #{s.product_id}"), "",
+                        qty, f"{price:.2f}", f"{price * qty:.2f}",
+                    ])
+
+                expenses = db.query(Expense.date, Expense.description, Expense.category, Expense.amount).filter(
+                    Expense.company_id == company_id,
+                    Expense.date >= c_start,
+                    Expense.date <= c_end
+                ).order_by(Expense.date).yield_per(2000)
+                for e in expenses:
+                    writer.writerow([
+                        "Despesa", f"{e.date:%d/%m/%Y %H:%M}", e.description or "", e.category or "",
+                        "", "", f"{-float(e.amount or 0.0):.2f}",
+                    ])
+    finally:
+        db.close()
+
+
+def build_closing_pdf(params: dict, progress: Callable[[float, str], None], out_path: str) -> None:
+    """Fechamento resumido em PDF: totais do período e movimento por dia."""
+    from fpdf import FPDF
+
+    company_id, start, end = _params_range(params)
+    chunks = _month_chunks(start, end)
+
+    daily = {}
+    categories = {}
+    db = _open_session(params)
+    try:
+        for i, (c_start, c_end) in enumerate(chunks):
+            progress(0.9 * i / len(chunks), f"Agregando {c_start:%m/%Y}")
+
+            day = func.date(Sale.date)
+            for d, total in db.query(day, func.sum(Sale.price * Sale.quantity)).filter(
+                Sale.company_id == company_id,
+                Sale.date >= c_start,
+                Sale.date <= c_end
+            ).group_by(day).all():
+                daily.setdefault(str(d), [0.0, 0.0])[0] += float(total or 0.0)
+
+            day = func.date(Expense.date)
+            for d, total in db.query(day, func.sum(Expense.amount)).filter(
+                Expense.company_id == company_id,
+                Expense.date >= c_start,
+                Expense.date <= c_end
+            ).group_by(day).all():
+                daily.setdefault(str(d), [0.0, 0.0])[1] += float(total or 0.0)
+
+            for cat, total in db.query(Expense.category, func.sum(Expense.amount)).filter(
+                Expense.company_id == company_id,
+                Expense.date >= c_start,
+                Expense.date <= c_end
+            ).group_by(Expense.category).all():
+                categories[cat or "-"] = categories.get(cat or "-", 0.0) + float(total or 0.0)
+    finally:
+        db.close()
+
+    progress(0.9, "Gerando PDF")
+
+    def txt(s: str) -> str:
+        return s.encode("latin-1", "replace").decode("latin-1")
+
+    total_in = sum(v[0] for v in daily.values())
+    total_out = sum(v[1] for v in daily.values())
+
+    pdf = FPDF("P", "mm", "A4")
+    pdf.set_auto_page_break(auto=True, margin=12)
+    pdf.add_page()
+
+    pdf.set_font("Helvetica", "B", 14)
+    pdf.cell(0, 8, "PEEGFLOW - FECHAMENTO DE CAIXA", ln=True, align="C")
+    pdf.set_font("Helvetica", "", 10)
+    pdf.cell(0, 6, f"Periodo: {start:%d/%m/%Y} a {end:%d/%m/%Y}", ln=True, align="C")
+    pdf.ln(4)
+
+    pdf.set_font("Helvetica", "B", 11)
+    pdf.cell(0, 6, f"Total Entradas: R$ {total_in:,.2f}", ln=True)
+    pdf.cell(0, 6, f"Total Saidas:   R$ {total_out:,.2f}", ln=True)
+    pdf.cell(0, 6, f"Saldo Liquido:  R$ {total_in - total_out:,.2f}", ln=True)
+    pdf.ln(4)
+
+    if categories:
+        pdf.set_font("Helvetica", "B", 10)
+        pdf.cell(0, 6, "Saidas por categoria", ln=True)
+        pdf.set_font("Helvetica", "", 9)
+        for cat, total in sorted(categories.items(), key=lambda kv: -kv[1]):
+            pdf.cell(120, 5, txt(cat)[:60])
+            pdf.cell(0, 5, f"R$ {total:,.2f}", ln=True, align="R")
+        pdf.ln(4)
+
+    pdf.set_font("Helvetica", "B", 9)
+    for label, width in (("Dia", 40), ("Entradas", 50), ("Saidas", 50), ("Saldo", 50)):
+        pdf.cell(width, 6, label, border=1)
+    pdf.ln()
+    pdf.set_font("Helvetica", "", 9)
+    for d in sorted(daily):
+        rec, desp = daily[d]
+        pdf.cell(40, 5, d, border=1)
+        pdf.cell(50, 5, f"{rec:,.2f}", border=1, align="R")
+        pdf.cell(50, 5, f"{desp:,.2f}", border=1, align="R")
+        pdf.cell(50, 5, f"{rec - desp:,.2f}", border=1, align="R")
+        pdf.ln()
+
+    pdf.output(out_path, "F")
+
+
+report_jobs.register("fechamento_csv", build_closing_csv, "csv", "text/csv")
+report_jobs.register("fechamento_pdf", build_closing_pdf, "pdf", "application/pdf")
+
+
+def submit_closing_report(db: Session, company_id: int, start_date: datetime, end_date: datetime, fmt: str) -> Job:
+    """
+    Enfileira o fechamento do período no formato `fmt` ("csv" ou "pdf").
+    A impressão digital dos dados entra na chave: se nada mudou no período,
+    o arquivo já gerado é reaproveitado.
+    """
+    from services import get_data_fingerprint
+
+    fingerprint = get_data_fingerprint(db, company_id, start_date, end_date)
+    params = {
+        "company_id": company_id,
+        "start": start_date.isoformat(),
+        "end": end_date.isoformat(),
+        "fingerprint": fingerprint,
+    }
+    filename = f"fechamento_{start_date:%Y%m%d}_{end_date:%Y%m%d}.{fmt}"
+    return report_jobs.submit(f"fechamento_{fmt}", params, filename=filename)
@@ -1,14 +1,87 @@
 # services.py
 from __future__ import annotations
 
+import base64
+import functools
 import hashlib
-from datetime import datetime
-from typing import Tuple, Optional
-
-import pandas as pd
+import hmac
+import itertools
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import TYPE_CHECKING, List, Tuple, Optional
+
+from sqlalchemy import Integer, and_, case, cast, extract, func, insert, or_, select, union_all, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from models import User, Company, Product, Sale, Expense
+import live
+import metrics
+import receipts
+import statements
+from cache import dashboard_cache, report_cache
+from models import (
+    User, Company, CompanyAdmin, Product, Order, Sale, Expense, StockMovement, StockSnapshot, CashierHour,
+    CashierRollup
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# numpy/pandas (e charts/forecast, que dependem deles) são importados dentro
+# das funções: o login e o PDV não pagam esse custo no primeiro carregamento.
+
+logger = logging.getLogger(__name__)
+
+# Máximo de lojas consultadas ao mesmo tempo no resumo multiempresa
+ADMIN_SUMMARY_WORKERS = int(os.getenv("ADMIN_SUMMARY_WORKERS", "8"))
+
+# Intervalo (dias) entre os cortes de saldo do razão de estoque
+STOCK_SNAPSHOT_DAYS = int(os.getenv("STOCK_SNAPSHOT_DAYS", "7"))
+# A cada quantos movimentos de estoque da empresa o corte é conferido
+STOCK_SNAPSHOT_CHECK_EVERY = int(os.getenv("STOCK_SNAPSHOT_CHECK_EVERY", "200"))
+
+# Métricas operacionais (metrics.py): latência por resultado (ok/fail/error)
+_CHECKOUT_SECONDS = metrics.registry.histogram(
+    "peegflow_checkout_seconds", "Duração do fechamento de venda (checkout_cart/process_sale)", ["outcome"])
+_RESTOCK_SECONDS = metrics.registry.histogram(
+    "peegflow_restock_seconds", "Duração da reposição de estoque", ["outcome"])
+_AUTH_SECONDS = metrics.registry.histogram(
+    "peegflow_auth_seconds", "Duração do login (inclui o hash da senha)", ["outcome"])
+_FINANCIAL_RANGE_SECONDS = metrics.registry.histogram(
+    "peegflow_financial_range_seconds", "Duração da leitura financeira por período", ["outcome"])
+_SALES = metrics.registry.counter("peegflow_sales_total", "Vendas concluídas")
+_SALE_UNITS = metrics.registry.counter("peegflow_sale_units_total", "Unidades vendidas")
+_STOCK_CHECK_FAILURES = metrics.registry.counter(
+    "peegflow_stock_check_failures_total", "Vendas recusadas por estoque insuficiente")
+_LOGIN_FAILURES = metrics.registry.counter("peegflow_login_failures_total", "Logins recusados")
+metrics.register_runtime_gauges()
+
+
+# =========================
+# 📖 LEITURAS (réplica quando configurada)
+# =========================
+
+def read_only(fn):
+    """
+    Marca a função de serviço como somente leitura: as consultas dela vão
+    para a réplica (READ_DATABASE_URL) quando estiver saudável.
+    """
+    @functools.wraps(fn)
+    def wrapper(db: Session, *args, **kwargs):
+        from database import use_replica
+
+        with use_replica(db):
+            return fn(db, *args, **kwargs)
+    return wrapper
 
 
 # =========================
@@ -51,14 +124,56 @@ def verify_password(password: str, hashed: str) -> bool:
     return hashlib.sha256(password.encode("utf-8")).hexdigest() == hashed
 
 
+# =========================
+# 🔑 TOKENS ASSINADOS (API / sessões)
+# =========================
+
+# Em produção defina SECRET_KEY (igual em todas as réplicas). Sem ela, cada
+# processo gera a sua e os tokens deixam de valer após reiniciar.
+SECRET_KEY = os.getenv("SECRET_KEY") or secrets.token_hex(32)
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _unb64(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def sign_token(payload: dict, ttl_seconds: int = 12 * 3600) -> str:
+    """Token `dados.assinatura` (HMAC-SHA256) com expiração em `exp`."""
+    body = dict(payload, exp=int(time.time()) + int(ttl_seconds))
+    raw = _b64(json.dumps(body, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+    sig = _b64(hmac.new(SECRET_KEY.encode("utf-8"), raw.encode("ascii"), hashlib.sha256).digest())
+    return f"{raw}.{sig}"
+
+
+def verify_token(token: str) -> Optional[dict]:
+    """Devolve o payload se a assinatura confere e o token não expirou."""
+    try:
+        raw, sig = token.split(".", 1)
+        expected = _b64(hmac.new(SECRET_KEY.encode("utf-8"), raw.encode("ascii"), hashlib.sha256).digest())
+        if not hmac.compare_digest(sig, expected):
+            return None
+        payload = json.loads(_unb64(raw))
+    except Exception:
+        return None
+    if int(payload.get("exp", 0)) < time.time():
+        return None
+    return payload
+
+
 # =========================
 # 👤 AUTH / BOOTSTRAP
 # =========================
 
+@metrics.timed(_AUTH_SECONDS)
 def authenticate(db: Session, username: str, password: str) -> Optional[User]:
     user = db.query(User).filter(User.username == username).first()
     if user and verify_password(password, user.password_hash):
         return user
+    _LOGIN_FAILURES.inc()
     return None
 
 
@@ -91,12 +206,158 @@ def create_initial_data(db: Session) -> None:
     db.commit()
 
 
+# =========================
+# 🏢 MULTIEMPRESA (dono com várias lojas)
+# =========================
+
+def get_admin_company_ids(db: Session, user_id: int) -> list:
+    """Empresas que o usuário administra: a própria (se admin) + as vinculadas em company_admins."""
+    user = db.query(User.company_id, User.role).filter(User.id == user_id).first()
+    if not user:
+        return []
+    ids = {cid for (cid,) in db.query(CompanyAdmin.company_id).filter(CompanyAdmin.user_id == user_id).all()}
+    if user.role == "admin" and user.company_id:
+        ids.add(user.company_id)
+    return sorted(ids)
+
+
+def create_company_for_admin(db: Session, user_id: int, name: str) -> Tuple[bool, str]:
+    if not name:
+        return False, "Informe o nome da loja"
+    company = Company(name=name)
+    db.add(company)
+    db.flush()
+    db.add(CompanyAdmin(user_id=user_id, company_id=company.id))
+    db.commit()
+    return True, "Loja criada"
+
+
+@read_only
+def get_company_kpis(db: Session, company_id: int, start_date: datetime, end_date: datetime) -> dict:
+    """KPIs de uma empresa no período, só com agregações no banco."""
+    name = db.query(Company.name).filter(Company.id == company_id).scalar()
+    orders = get_order_metrics(db, company_id, start_date, end_date)
+
+    expenses = db.query(func.coalesce(func.sum(Expense.amount), 0.0)).filter(
+        Expense.company_id == company_id,
+        Expense.date >= start_date,
+        Expense.date <= end_date
+    ).scalar()
+
+    low_stock, inventory_value, products = db.query(
+        func.coalesce(func.sum(case((Product.stock <= Product.stock_min, 1), else_=0)), 0),
+        # mesma base de custo da tela de Estoque: custo médio, ou o preço de custo sem histórico
+        func.coalesce(func.sum(Product.stock * func.coalesce(Product.avg_cost, Product.price_wholesale)), 0.0),
+        func.count(Product.id),
+    ).filter(Product.company_id == company_id).one()
+
+    return {
+        "company_id": company_id,
+        "company": name or f"Empresa #{company_id}",
+        "revenue": orders["revenue"],
+        "orders": orders["orders"],
+        "avg_ticket": orders["avg_ticket"],
+        "expenses": float(expenses or 0.0),
+        "profit": orders["revenue"] - float(expenses or 0.0),
+        "products": int(products or 0),
+        "low_stock": int(low_stock or 0),
+        "inventory_value": float(inventory_value or 0.0),
+    }
+
+
+def get_admin_summary(company_ids, start_date: datetime, end_date: datetime,
+                      max_workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    KPIs de todas as lojas em paralelo: cada empresa roda numa thread com
+    sessão própria, então o tempo total é o da loja mais lenta.
+    Resultado ordenado por faturamento (coluna rank).
+    """
+    import pandas as pd
+
+    columns = ["rank", "company_id", "company", "revenue", "orders", "avg_ticket", "expenses",
+               "profit", "products", "low_stock", "inventory_value", "error"]
+    company_ids = list(company_ids)
+    if not company_ids:
+        return pd.DataFrame(columns=columns)
+
+    workers = max_workers or min(len(company_ids), ADMIN_SUMMARY_WORKERS)
+    rows = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="admin-kpis") as pool:
+        futures = {
+            pool.submit(_with_new_session, get_company_kpis, cid, start_date, end_date): cid
+            for cid in company_ids
+        }
+        for fut in as_completed(futures):
+            try:
+                rows.append({**fut.result(), "error": None})
+            except Exception as e:
+                rows.append({"company_id": futures[fut], "company": f"Empresa #{futures[fut]}", "error": str(e)})
+
+    df = pd.DataFrame(rows).reindex(columns=columns)
+    df = df.sort_values(by=["revenue", "company_id"], ascending=[False, True], na_position="last").reset_index(drop=True)
+    df["rank"] = range(1, len(df) + 1)
+    return df
+
+
 # =========================
 # 📦 PRODUTOS / ESTOQUE
 # =========================
 
-def get_products(db: Session, company_id: int):
-    return db.query(Product).filter(Product.company_id == company_id).all()
+@dataclass(frozen=True, slots=True)
+class ProductRow:
+    """
+    Produto só para leitura (telas, API, relatórios): tupla com nomes, sem
+    estado de sessão nem identity map. Para alterar um produto use as funções
+    de escrita (update_product, restock_product...), que carregam a entidade.
+    """
+    id: int
+    sku: Optional[str]
+    name: Optional[str]
+    price_retail: Optional[float]
+    price_wholesale: Optional[float]
+    stock: Optional[int]
+    stock_min: Optional[int]
+    avg_cost: Optional[float]
+    version: Optional[int]
+
+
+_PRODUCT_ROW_COLUMNS = (
+    Product.id, Product.sku, Product.name, Product.price_retail,
+    Product.price_wholesale, Product.stock, Product.stock_min, Product.avg_cost, Product.version,
+)
+
+
+def _escape_like(text: str) -> str:
+    """Texto digitado pelo usuário como literal num LIKE (usar com escape="\\")."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@read_only
+def get_products(db: Session, company_id: int, search: Optional[str] = None) -> List[ProductRow]:
+    query = db.query(*_PRODUCT_ROW_COLUMNS).filter(Product.company_id == company_id)
+    if search and search.strip():
+        term = f"%{_escape_like(search.strip())}%"
+        query = query.filter(or_(Product.name.ilike(term, escape="\\"), Product.sku.ilike(term, escape="\\")))
+    return list(itertools.starmap(ProductRow, query.order_by(Product.id).all()))
+
+
+@read_only
+def _load_product_catalog(db: Session, company_id: int) -> list:
+    return db.query(
+        Product.id, Product.name, Product.sku, Product.price_retail, Product.stock
+    ).filter(Product.company_id == company_id).order_by(Product.name, Product.id).all()
+
+
+def get_product_catalog(db: Session, company_id: int) -> list:
+    """
+    Vitrine do PDV (id, nome, SKU, preço, estoque) em cache por empresa.
+    Qualquer venda, reposição ou edição de produto invalida a entrada.
+    """
+    return dashboard_cache.get_or_compute(
+        (company_id, "catalog"),
+        loader=lambda: _load_product_catalog(db, company_id),
+        refresh=lambda: _with_new_session(_load_product_catalog, company_id),
+    )
 
 
 def register_product(
@@ -126,15 +387,19 @@ def register_product(
         price_retail=float(price_retail),
         price_wholesale=float(price_wholesale),
         stock=0,
-        stock_min=int(stock_min)
+        stock_min=int(stock_min),
+        # até a primeira reposição o custo médio é o custo base informado
+        avg_cost=float(price_wholesale)
     )
     db.add(prod)
     db.commit()
+    dashboard_cache.invalidate(company_id)
     return True, "Produto cadastrado"
 
 
+@metrics.timed(_RESTOCK_SECONDS)
 def restock_product(db: Session, company_id: int, product_id: int, qty: int, cost_unit: float) -> Tuple[bool, str]:
-    product = db.query(Product).filter(
+    product = db.query(Product.id, Product.name).filter(
         Product.id == product_id,
         Product.company_id == company_id
     ).first()
@@ -144,24 +409,104 @@ def restock_product(db: Session, company_id: int, product_id: int, qty: int, cos
     if qty <= 0:
         return False, "Quantidade inválida"
 
-    product.stock = int(product.stock or 0) + int(qty)
-
-    # Registra despesa (CMV)
-    total_cost = float(qty) * float(cost_unit)
-    desc = f"Reposição Estoque: {product.name} ({qty}x R$ {cost_unit:.2f})"
+    now = datetime.utcnow()
+    try:
+        # Incremento atômico; o saldo resultante vai para o razão. O custo
+        # médio é ponderado pelo saldo anterior (os dois SETs leem os valores
+        # antigos da linha), sem reler o histórico
+        on_hand = case((Product.stock > 0, Product.stock), else_=0)
+        cost = float(cost_unit)
+        balance = db.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.company_id == company_id)
+            .values(
+                stock=func.coalesce(Product.stock, 0) + int(qty),
+                avg_cost=(func.coalesce(Product.avg_cost, cost) * on_hand + int(qty) * cost) / (on_hand + int(qty))
+            )
+            .returning(Product.stock)
+            .execution_options(synchronize_session=False)
+        ).scalar_one()
+
+        # Registra despesa (CMV)
+        total_cost = float(qty) * float(cost_unit)
+        desc = f"Reposição Estoque: {product.name} ({qty}x R$ {cost_unit:.2f})"
+
+        exp = Expense(
+            company_id=company_id,
+            description=desc,
+            category="CMV",
+            amount=total_cost,
+            date=now
+        )
+        db.add(exp)
+        db.flush()
+
+        db.add(StockMovement(
+            company_id=company_id,
+            product_id=product_id,
+            delta=int(qty),
+            kind="reposicao",
+            ref_id=exp.id,
+            balance_after=int(balance),
+            date=now
+        ))
+        live.notify(db, company_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
 
-    exp = Expense(
-        company_id=company_id,
-        description=desc,
-        category="CMV",
-        amount=total_cost,
-        date=datetime.utcnow()
-    )
-    db.add(exp)
-    db.commit()
+    dashboard_cache.invalidate(company_id, now)
+    _count_stock_movements(company_id)
     return True, "Estoque atualizado"
 
 
+def adjust_stock(
+    db: Session,
+    company_id: int,
+    product_id: int,
+    counted: int,
+    user_id: Optional[int] = None
+) -> Tuple[bool, str]:
+    """Acerto de inventário: grava a contagem física e a diferença no razão."""
+    if counted < 0:
+        return False, "Quantidade inválida"
+
+    try:
+        row = db.query(Product.id, Product.stock).filter(
+            Product.id == product_id,
+            Product.company_id == company_id
+        ).with_for_update().first()
+        if row is None:
+            db.rollback()
+            return False, "Produto não encontrado"
+
+        delta = int(counted) - int(row.stock or 0)
+        if delta == 0:
+            db.rollback()
+            return True, "Estoque já confere com a contagem"
+
+        db.query(Product).filter(Product.id == product_id).update(
+            {Product.stock: int(counted)}, synchronize_session=False
+        )
+        db.add(StockMovement(
+            company_id=company_id,
+            product_id=product_id,
+            delta=delta,
+            kind="ajuste",
+            balance_after=int(counted),
+            user_id=user_id,
+            date=datetime.utcnow()
+        ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    dashboard_cache.invalidate(company_id)
+    _count_stock_movements(company_id)
+    return True, f"Estoque ajustado ({delta:+d})"
+
+
 def delete_product(db: Session, company_id: int, product_id: int) -> Tuple[bool, str]:
     product = db.query(Product).filter(
         Product.id == product_id,
@@ -180,52 +525,612 @@ def delete_product(db: Session, company_id: int, product_id: int) -> Tuple[bool,
 
     db.delete(product)
     db.commit()
+    dashboard_cache.invalidate(company_id)
     return True, "Produto excluído"
 
 
 # =========================
-# 🛒 VENDAS (PDV) - valida estoque por empresa
+# 🏷️ REAJUSTE DE PREÇOS EM MASSA
 # =========================
 
-def process_sale(
+# rule: "percent" (+v% sobre o preço atual), "absolute" (+v R$) ou
+# "markup" (custo = price_wholesale, novo preço = custo × (1 + v%))
+REPRICE_RULES = ("percent", "absolute", "markup")
+REPRICE_TARGETS = ("price_retail", "price_wholesale")
+# Produtos por UPDATE (limite de parâmetros do banco); todos na mesma transação
+REPRICE_CHUNK = int(os.getenv("REPRICE_CHUNK", "2000"))
+
+
+def _reprice_query(
     db: Session,
-    product_id: int,
-    qty: int,
-    kind: str,
-    user_id: int,
-    company_id: int
+    company_id: int,
+    sku_pattern: Optional[str] = None,
+    name_contains: Optional[str] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None
+):
+    """Seleção por SKU (curinga *, ex.: "CAP-*"), trecho do nome e faixa de preço de venda."""
+    query = db.query(
+        Product.id, Product.sku, Product.name, Product.price_retail, Product.price_wholesale
+    ).filter(Product.company_id == company_id)
+    if sku_pattern and sku_pattern.strip():
+        query = query.filter(Product.sku.like(_escape_like(sku_pattern.strip()).replace("*", "%"), escape="\\"))
+    if name_contains and name_contains.strip():
+        query = query.filter(Product.name.ilike(f"%{_escape_like(name_contains.strip())}%", escape="\\"))
+    if price_min is not None:
+        query = query.filter(Product.price_retail >= float(price_min))
+    if price_max is not None:
+        query = query.filter(Product.price_retail <= float(price_max))
+    return query.order_by(Product.id)
+
+
+def _psychological_round(prices, ending: Optional[float]):
+    """Arredonda para o final mais próximo (ex.: 0.90 → 12,37 vira 11,90 e 12,61 vira 12,90)."""
+    import numpy as np
+
+    if ending is None:
+        return np.round(prices, 2)
+    rounded = np.round(prices - ending) + ending
+    return np.round(np.where(rounded > 0, rounded, prices), 2)
+
+
+def _reprice_frame(rows, targets, rule: str, value: float, ending: Optional[float]) -> pd.DataFrame:
+    """Preços atuais x novos e margens, calculados de uma vez (vetorizado)."""
+    import numpy as np
+    import pandas as pd
+
+    df = pd.DataFrame(rows, columns=["id", "sku", "name", "price_retail", "price_wholesale"])
+    retail = df["price_retail"].astype(float).fillna(0.0).to_numpy()
+    cost = df["price_wholesale"].astype(float).fillna(0.0).to_numpy()
+    current = {"price_retail": retail, "price_wholesale": cost}
+
+    new = dict(current)
+    for target in targets:
+        if rule == "percent":
+            prices = current[target] * (1 + value / 100)
+        elif rule == "absolute":
+            prices = current[target] + value
+        else:
+            prices = cost * (1 + value / 100)
+        new[target] = _psychological_round(prices, ending)
+
+    df["price_retail"] = retail
+    df["price_wholesale"] = cost
+    df["new_price_retail"] = new["price_retail"]
+    df["new_price_wholesale"] = new["price_wholesale"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["margin"] = np.where(retail > 0, (retail - cost) / retail, np.nan)
+        df["new_margin"] = np.where(
+            new["price_retail"] > 0, (new["price_retail"] - new["price_wholesale"]) / new["price_retail"], np.nan
+        )
+    df["changed"] = np.zeros(len(df), dtype=bool)
+    for target in targets:
+        df["changed"] |= np.abs(new[target] - current[target]) >= 0.005
+    return df
+
+
+def _check_reprice_args(targets, rule: str) -> Optional[str]:
+    if not targets or any(t not in REPRICE_TARGETS for t in targets):
+        return "Escolha o preço a reajustar"
+    if rule not in REPRICE_RULES:
+        return "Regra de reajuste inválida"
+    if rule == "markup" and "price_wholesale" in targets:
+        return "Markup é aplicado sobre o custo: use-o só no preço de venda"
+    return None
+
+
+@read_only
+def preview_reprice(
+    db: Session,
+    company_id: int,
+    targets=("price_retail",),
+    rule: str = "percent",
+    value: float = 0.0,
+    ending: Optional[float] = None,
+    **filters
+) -> pd.DataFrame:
+    """
+    Prévia do reajuste: uma linha por produto selecionado com preços atuais,
+    novos e margens. `filters` são os de _reprice_query.
+    """
+    error = _check_reprice_args(targets, rule)
+    if error:
+        raise ValueError(error)
+    rows = _reprice_query(db, company_id, **filters).all()
+    return _reprice_frame(rows, targets, rule, float(value), ending)
+
+
+def apply_reprice(
+    db: Session,
+    company_id: int,
+    targets=("price_retail",),
+    rule: str = "percent",
+    value: float = 0.0,
+    ending: Optional[float] = None,
+    **filters
 ) -> Tuple[bool, str]:
-    qty = int(qty)
+    """
+    Grava o reajuste com UPDATE ... SET preço = CASE id ... (em blocos de
+    REPRICE_CHUNK produtos, mesma transação). Os preços são recalculados
+    sobre as linhas travadas, então o resultado é o da prévia se ninguém
+    alterou os produtos no meio tempo.
+    """
+    error = _check_reprice_args(targets, rule)
+    if error:
+        return False, error
 
-    product = db.query(Product).filter(
-        Product.id == product_id,
+    try:
+        rows = _reprice_query(db, company_id, **filters).with_for_update().all()
+        df = _reprice_frame(rows, targets, rule, float(value), ending)
+        df = df[df["changed"]]
+        if df.empty:
+            db.rollback()
+            return False, "Nenhum preço a alterar com esses filtros"
+
+        invalid = int(sum((df[f"new_{t}"] <= 0).sum() for t in targets))
+        if invalid:
+            db.rollback()
+            return False, f"A regra deixa {invalid} preço(s) zerado(s) ou negativo(s)"
+
+        ids = df["id"].astype(int).tolist()
+        new_prices = {t: df[f"new_{t}"].astype(float).tolist() for t in targets}
+        for start in range(0, len(ids), REPRICE_CHUNK):
+            chunk = ids[start:start + REPRICE_CHUNK]
+            values = {
+                getattr(Product, t): case(
+                    dict(zip(chunk, new_prices[t][start:start + REPRICE_CHUNK])),
+                    value=Product.id,
+                    else_=getattr(Product, t)
+                )
+                for t in targets
+            }
+            values[Product.version] = func.coalesce(Product.version, 0) + 1
+            db.execute(
+                update(Product)
+                .where(Product.company_id == company_id, Product.id.in_(chunk))
+                .values(values)
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    dashboard_cache.invalidate(company_id)
+    return True, f"{len(ids)} produto(s) reajustado(s)"
+
+
+# =========================
+# 📜 RAZÃO DE ESTOQUE (movimentos + cortes de saldo)
+# =========================
+#
+# Saldo em uma data = último corte (StockSnapshot) até a data + soma dos
+# movimentos entre o corte e a data. Os cortes são feitos a cada
+# STOCK_SNAPSHOT_DAYS, então a soma nunca percorre o histórico inteiro.
+# Quem confere se já é hora do corte são as escritas de estoque
+# (_count_stock_movements), em segundo plano.
+
+_ledger_backfilled = False
+
+
+def backfill_stock_ledger(db: Session) -> int:
+    """
+    Produtos com estoque e sem nenhum movimento (dados anteriores ao razão)
+    ganham um movimento de abertura com o saldo atual. Roda uma vez por processo.
+    """
+    global _ledger_backfilled
+    if _ledger_backfilled:
+        return 0
+
+    has_movement = db.query(StockMovement.id).filter(StockMovement.product_id == Product.id).exists()
+    rows = db.query(Product.id, Product.company_id, Product.stock).filter(
+        func.coalesce(Product.stock, 0) != 0,
+        ~has_movement
+    ).all()
+
+    now = datetime.utcnow()
+    db.add_all([
+        StockMovement(
+            company_id=company_id,
+            product_id=pid,
+            delta=int(stock),
+            kind="abertura",
+            balance_after=int(stock),
+            date=now
+        )
+        for pid, company_id, stock in rows
+    ])
+    db.commit()
+    _ledger_backfilled = True
+    return len(rows)
+
+
+def _ledger_balances(db: Session, company_id: int, at: Optional[datetime] = None, product_ids=None) -> dict:
+    """{product_id: saldo} pelo razão em `at` (None = agora)."""
+    snap_q = db.query(
+        StockSnapshot.product_id,
+        func.max(StockSnapshot.taken_at).label("taken_at")
+    ).filter(StockSnapshot.company_id == company_id)
+    if at is not None:
+        snap_q = snap_q.filter(StockSnapshot.taken_at <= at)
+    if product_ids is not None:
+        snap_q = snap_q.filter(StockSnapshot.product_id.in_(list(product_ids)))
+    last_snap = snap_q.group_by(StockSnapshot.product_id).subquery()
+
+    balances = {
+        int(pid): int(stock)
+        for pid, stock in db.query(StockSnapshot.product_id, StockSnapshot.stock).join(
+            last_snap,
+            and_(
+                StockSnapshot.product_id == last_snap.c.product_id,
+                StockSnapshot.taken_at == last_snap.c.taken_at
+            )
+        ).all()
+    }
+
+    mv_q = db.query(StockMovement.product_id, func.sum(StockMovement.delta)).outerjoin(
+        last_snap, StockMovement.product_id == last_snap.c.product_id
+    ).filter(
+        StockMovement.company_id == company_id,
+        or_(last_snap.c.taken_at.is_(None), StockMovement.date > last_snap.c.taken_at)
+    )
+    if at is not None:
+        mv_q = mv_q.filter(StockMovement.date <= at)
+    if product_ids is not None:
+        mv_q = mv_q.filter(StockMovement.product_id.in_(list(product_ids)))
+
+    for pid, delta in mv_q.group_by(StockMovement.product_id).all():
+        balances[int(pid)] = balances.get(int(pid), 0) + int(delta or 0)
+    return balances
+
+
+@read_only
+def get_stock_at(db: Session, company_id: int, at: datetime, product_ids=None) -> dict:
+    """Estoque de cada produto no instante `at`: {product_id: saldo}."""
+    return _ledger_balances(db, company_id, at, product_ids)
+
+
+def take_stock_snapshots(db: Session, company_id: int, now: Optional[datetime] = None) -> int:
+    """
+    Grava um corte de saldo por produto à meia-noite de hoje, se o último
+    corte da empresa tiver mais de STOCK_SNAPSHOT_DAYS. Retorna quantos cortes gravou.
+    """
+    cut = (now or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+    last = db.query(func.max(StockSnapshot.taken_at)).filter(StockSnapshot.company_id == company_id).scalar()
+    if last is not None and cut - last < timedelta(days=STOCK_SNAPSHOT_DAYS):
+        return 0
+
+    balances = _ledger_balances(db, company_id, cut)
+    if not balances:
+        return 0
+
+    db.add_all([
+        StockSnapshot(company_id=company_id, product_id=pid, stock=stock, taken_at=cut)
+        for pid, stock in balances.items()
+    ])
+    try:
+        db.commit()
+    except IntegrityError:
+        # outra sessão gravou o mesmo corte primeiro
+        db.rollback()
+        return 0
+    return len(balances)
+
+
+# Movimentos por empresa desde a última conferência dos cortes (None = ainda
+# não conferiu neste processo)
+_movements_since_snapshot_check: dict = {}
+_snapshot_check_lock = threading.Lock()
+
+
+def _count_stock_movements(company_id: int, count: int = 1) -> None:
+    """
+    Chamado depois de gravar movimentos: a cada STOCK_SNAPSHOT_CHECK_EVERY
+    (e no primeiro do processo) confere em segundo plano se já é hora de um
+    corte. Os cortes seguem as escritas, não as visitas à tela de Estoque.
+    """
+    with _snapshot_check_lock:
+        seen = _movements_since_snapshot_check.get(company_id)
+        total = (seen or 0) + count
+        due = seen is None or total >= STOCK_SNAPSHOT_CHECK_EVERY
+        _movements_since_snapshot_check[company_id] = 0 if due else total
+    if due:
+        _in_background(take_stock_snapshots, company_id)
+
+
+def verify_stock_ledger(db: Session, company_id: int) -> pd.DataFrame:
+    """Produtos cujo Product.stock não bate com o saldo do razão."""
+    import pandas as pd
+
+    ledger = _ledger_balances(db, company_id)
+    rows = []
+    for pid, sku, name, stock in db.query(Product.id, Product.sku, Product.name, Product.stock).filter(
         Product.company_id == company_id
-    ).first()
+    ).all():
+        expected = ledger.get(pid, 0)
+        if int(stock or 0) != expected:
+            rows.append({
+                "product_id": pid,
+                "sku": sku,
+                "name": name,
+                "stock": int(stock or 0),
+                "ledger": expected,
+                "diff": int(stock or 0) - expected,
+            })
+    return pd.DataFrame(rows, columns=["product_id", "sku", "name", "stock", "ledger", "diff"])
+
+
+@read_only
+def get_stock_movements(
+    db: Session,
+    company_id: int,
+    product_id: int,
+    start_date: datetime,
+    end_date: datetime,
+    limit: int = 500
+) -> pd.DataFrame:
+    import pandas as pd
+
+    rows = db.query(
+        StockMovement.date,
+        StockMovement.kind,
+        StockMovement.delta,
+        StockMovement.balance_after,
+        StockMovement.ref_id
+    ).filter(
+        StockMovement.company_id == company_id,
+        StockMovement.product_id == product_id,
+        StockMovement.date >= start_date,
+        StockMovement.date <= end_date
+    ).order_by(StockMovement.date.desc(), StockMovement.id.desc()).limit(limit).all()
+    return pd.DataFrame(rows, columns=["date", "kind", "delta", "balance_after", "ref_id"])
 
-    if not product:
-        return False, "Produto não encontrado"
 
-    if qty <= 0:
-        return False, "Quantidade inválida"
+# =========================
+# 🔮 PREVISÃO DE REPOSIÇÃO
+# =========================
+
+@read_only
+def get_replenishment_forecast(
+    db: Session,
+    company_id: int,
+    history_days: int = 90,
+    lead_time_days: int = 7,
+    cover_days: int = 14
+) -> pd.DataFrame:
+    """
+    Velocidade de venda, dias de cobertura e quantidade sugerida de compra
+    para todos os produtos da empresa.
 
-    stock_now = int(product.stock or 0)
-    if stock_now < qty:
-        return False, f"Estoque insuficiente ({stock_now} disponível)"
+    O histórico vem de UMA consulta agrupada por (produto, dia da semana,
+    faixa de recência); o cálculo é vetorizado em forecast.py.
+    """
+    import numpy as np
+    import pandas as pd
+    from forecast import RECENCY_BUCKETS, compute_replenishment, sales_cube
 
-    product.stock = stock_now - qty
+    now = datetime.utcnow()
+    start = now - timedelta(days=int(history_days))
 
-    sale = Sale(
-        company_id=company_id,
-        product_id=product_id,
-        quantity=qty,
-        price=float(product.price_retail or 0.0),
-        user_id=user_id,
-        date=datetime.utcnow()
+    recency = case(
+        (Sale.date >= now - timedelta(days=RECENCY_BUCKETS[0]), 0),
+        (Sale.date >= now - timedelta(days=RECENCY_BUCKETS[1]), 1),
+        else_=2
     )
+    dow = cast(extract("dow", Sale.date), Integer)
+    history = db.execute(select(
+        Sale.product_id, dow, recency, func.coalesce(func.sum(Sale.quantity), 0)
+    ).where(
+        Sale.company_id == company_id,
+        Sale.date >= start
+    ).group_by(Sale.product_id, dow, recency)).all()
+
+    products = db.query(
+        Product.id, Product.sku, Product.name, Product.stock, Product.stock_min
+    ).filter(Product.company_id == company_id).order_by(Product.id).all()
+
+    columns = ["product_id", "sku", "name", "stock", "stock_min",
+               "velocity", "days_of_cover", "forecast", "suggested_qty"]
+    if not products:
+        return pd.DataFrame(columns=columns)
+
+    pids, skus, names, stock, stock_min = zip(*products)
+    product_ids = np.asarray(pids, dtype=np.int64)
+    stock = np.nan_to_num(np.asarray(stock, dtype=float))          # None -> nan -> 0
+    stock_min = np.nan_to_num(np.asarray(stock_min, dtype=float))
+
+    # uma coluna por vez direto das linhas, sem tupla intermediária por linha
+    h_pid, h_dow, h_bucket, h_qty = (
+        np.fromiter(map(itemgetter(i), history), dtype=dtype, count=len(history))
+        for i, dtype in enumerate((np.int64, np.int64, np.int64, float))
+    )
+    cube = sales_cube(product_ids, h_pid, h_dow, h_bucket, h_qty)
 
-    db.add(sale)
-    db.commit()
-    return True, "Venda concluída"
+    result = compute_replenishment(
+        cube, stock, stock_min, now.date(),
+        history_days=history_days, lead_time_days=lead_time_days, cover_days=cover_days
+    )
+
+    return pd.DataFrame({
+        "product_id": product_ids,
+        "sku": skus,
+        "name": names,
+        "stock": stock.astype(np.int64),
+        "stock_min": stock_min.astype(np.int64),
+        "velocity": result["velocity"],
+        "days_of_cover": result["days_of_cover"],
+        "forecast": result["forecast"],
+        "suggested_qty": result["suggested_qty"],
+    }, columns=columns)
+
+
+def get_replenishment_forecast_cached(db: Session, company_id: int, history_days: int = 90,
+                                      lead_time_days: int = 7, cover_days: int = 14) -> pd.DataFrame:
+    """Previsão compartilhada entre sessões; vendas e reposições invalidam (ver dashboard_cache)."""
+    return dashboard_cache.get_or_compute(
+        (company_id, "forecast", int(history_days), int(lead_time_days), int(cover_days)),
+        loader=lambda: get_replenishment_forecast(db, company_id, history_days, lead_time_days, cover_days),
+        refresh=lambda: _with_new_session(get_replenishment_forecast, company_id,
+                                          history_days, lead_time_days, cover_days),
+    )
+
+
+# =========================
+# 🛒 VENDAS (PDV) - valida estoque por empresa
+# =========================
+
+@metrics.timed(_CHECKOUT_SECONDS)
+def checkout_cart(
+    db: Session,
+    company_id: int,
+    user_id: int,
+    items,
+    discount_amount: float = 0.0,
+    payment: Optional[str] = None,
+    terminal: Optional[str] = None
+) -> Tuple[bool, str, Optional[int]]:
+    """
+    Fecha o carrinho inteiro numa única transação: cria o Order (cabeçalho
+    com subtotal, desconto, total, pagamento e nº do cupom do `terminal`)
+    e uma linha Sale por produto, com o custo médio do momento.
+
+    `items` = [{"id": product_id, "qty": quantidade}, ...]
+    A baixa de estoque é um UPDATE condicional (stock >= qty), então duas
+    vendas simultâneas nunca deixam o estoque negativo; cada baixa vai para
+    o razão (StockMovement) na mesma transação.
+    Retorna (ok, mensagem, order_id).
+    """
+    qty_by_product = {}
+    for item in items:
+        qty = int(item.get("qty", 0))
+        if qty <= 0:
+            return False, "Quantidade inválida", None
+        pid = int(item["id"])
+        qty_by_product[pid] = qty_by_product.get(pid, 0) + qty
+
+    if not qty_by_product:
+        return False, "Carrinho vazio", None
+
+    products = {
+        p.id: p for p in db.query(Product.id, Product.name, Product.price_retail, Product.stock).filter(
+            Product.company_id == company_id,
+            Product.id.in_(list(qty_by_product.keys()))
+        ).all()
+    }
+
+    now = datetime.utcnow()
+    subtotal = 0.0
+    lines = []
+    # Número do cupom antes de qualquer escrita: se o bloco acabou, a reserva
+    # roda numa transação própria e não espera pelos locks desta venda
+    terminal = terminal or receipts.TERMINAL_ID
+    receipt_number = receipts.allocator.take(company_id, terminal)
+    try:
+        # baixas sempre em ordem de id: dois caixas com os mesmos produtos em
+        # ordens diferentes travam as linhas na mesma sequência (sem deadlock)
+        for pid in sorted(qty_by_product):
+            qty = qty_by_product[pid]
+            prod = products.get(pid)
+            if prod is None:
+                db.rollback()
+                receipts.allocator.give_back(company_id, receipt_number, terminal)
+                return False, f"Produto não encontrado (ID {pid})", None
+
+            row = db.execute(
+                update(Product)
+                .where(Product.id == pid, Product.company_id == company_id, Product.stock >= qty)
+                .values(stock=Product.stock - qty)
+                .returning(Product.stock, Product.avg_cost)
+                .execution_options(synchronize_session=False)
+            ).first()
+            if row is None:
+                db.rollback()
+                receipts.allocator.give_back(company_id, receipt_number, terminal)
+                _STOCK_CHECK_FAILURES.inc()
+                stock_now = db.query(Product.stock).filter(Product.id == pid).scalar()
+                return False, f"Estoque insuficiente para {prod.name} ({int(stock_now or 0)} disponível)", None
+
+            price = float(prod.price_retail or 0.0)
+            subtotal += price * qty
+            balance, unit_cost = row
+            lines.append((pid, qty, price, unit_cost, int(balance)))
+
+        discount = min(max(float(discount_amount or 0.0), 0.0), subtotal)
+        order = Order(
+            company_id=company_id,
+            user_id=user_id,
+            subtotal=subtotal,
+            discount=discount,
+            total=subtotal - discount,
+            payment=payment,
+            receipt_number=receipt_number,
+            terminal=terminal,
+            date=now
+        )
+        db.add(order)
+        db.flush()
+        order_id = order.id
+
+        db.add_all([
+            Sale(
+                order_id=order.id,
+                company_id=company_id,
+                product_id=pid,
+                quantity=qty,
+                price=price,
+                unit_cost=unit_cost,
+                user_id=user_id,
+                date=now
+            )
+            for pid, qty, price, unit_cost, _ in lines
+        ])
+        db.add_all([
+            StockMovement(
+                company_id=company_id,
+                product_id=pid,
+                delta=-qty,
+                kind="venda",
+                ref_id=order.id,
+                balance_after=balance,
+                user_id=user_id,
+                date=now
+            )
+            for pid, qty, _, _, balance in lines
+        ])
+        live.notify(db, company_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        receipts.allocator.give_back(company_id, receipt_number, terminal)
+        raise
+
+    dashboard_cache.invalidate(company_id, now)
+    report_cache.invalidate(company_id, now)
+    _schedule_cashier_rollup(company_id, now)
+    _count_stock_movements(company_id, len(lines))
+    _SALES.inc()
+    _SALE_UNITS.inc(sum(qty_by_product.values()))
+    return True, "Venda concluída", order_id
+
+
+def get_receipt_number(db: Session, company_id: int, order_id: int) -> Optional[int]:
+    return db.query(Order.receipt_number).filter(
+        Order.id == order_id,
+        Order.company_id == company_id
+    ).scalar()
+
+
+def process_sale(
+    db: Session,
+    product_id: int,
+    qty: int,
+    kind: str,
+    user_id: int,
+    company_id: int
+) -> Tuple[bool, str]:
+    """Venda avulsa de um produto (um Order com uma linha)."""
+    ok, msg, _ = checkout_cart(db, company_id, user_id, [{"id": product_id, "qty": qty}])
+    return ok, msg
 
 
 # =========================
@@ -244,22 +1149,111 @@ def add_expense(db: Session, company_id: int, desc: str, amount: float, category
         date=date
     )
     db.add(exp)
+    live.notify(db, company_id)
     db.commit()
+    dashboard_cache.invalidate(company_id, exp.date)
     return True, "Despesa lançada"
 
 
+# Linhas por INSERT na importação de extratos
+STATEMENT_IMPORT_CHUNK = int(os.getenv("STATEMENT_IMPORT_CHUNK", "1000"))
+
+
+def _statement_expenses(db: Session, company_id: int, filename: str, data: bytes, rules=None):
+    """Lançamentos de saída do extrato, com categoria e se já foram importados."""
+    lines = [line for line in statements.parse_statement(filename, data) if line.amount < 0]
+    compiled = statements.compile_rules(statements.default_rules() if rules is None else rules)
+
+    hashes = [line.import_hash for line in lines]
+    existing = set()
+    for start in range(0, len(hashes), STATEMENT_IMPORT_CHUNK):
+        existing.update(h for h, in db.query(Expense.import_hash).filter(
+            Expense.company_id == company_id,
+            Expense.import_hash.in_(hashes[start:start + STATEMENT_IMPORT_CHUNK])
+        ).all())
+
+    return [
+        (line, statements.categorize(line.description, compiled), line.import_hash in existing)
+        for line in lines
+    ]
+
+
+def preview_bank_statement(db: Session, company_id: int, filename: str, data: bytes, rules=None) -> pd.DataFrame:
+    """Prévia da importação: uma linha por saída do extrato (erros de leitura viram ValueError)."""
+    import pandas as pd
+
+    rows = _statement_expenses(db, company_id, filename, data, rules)
+    return pd.DataFrame([
+        (line.date, line.description, -line.amount, category, duplicate)
+        for line, category, duplicate in rows
+    ], columns=["date", "description", "amount", "category", "duplicate"])
+
+
+def import_bank_statement(db: Session, company_id: int, filename: str, data: bytes, rules=None) -> Tuple[bool, str]:
+    """
+    Importa as saídas de um extrato OFX/CSV como despesas. Os lançamentos
+    cujo hash já existe na empresa são ignorados, então reimportar o mesmo
+    arquivo não duplica nada. Inserção em blocos, numa transação só.
+    """
+    try:
+        rows = _statement_expenses(db, company_id, filename, data, rules)
+    except ValueError as e:
+        return False, str(e)
+    if not rows:
+        return False, "Nenhuma saída encontrada no extrato"
+
+    new_rows = []
+    seen = set()
+    for line, category, duplicate in rows:
+        if duplicate or line.import_hash in seen:
+            continue
+        seen.add(line.import_hash)
+        new_rows.append({
+            "company_id": company_id,
+            "description": line.description,
+            "category": category,
+            "amount": -line.amount,
+            "date": line.date,
+            "import_hash": line.import_hash,
+        })
+    skipped = len(rows) - len(new_rows)
+    if not new_rows:
+        return True, f"Nada novo: {skipped} lançamento(s) já importado(s)"
+
+    try:
+        for start in range(0, len(new_rows), STATEMENT_IMPORT_CHUNK):
+            db.execute(insert(Expense), new_rows[start:start + STATEMENT_IMPORT_CHUNK])
+        live.notify(db, company_id)
+        db.commit()
+    except IntegrityError:
+        # outra importação do mesmo extrato gravou primeiro
+        db.rollback()
+        return False, "Extrato importado por outra sessão ao mesmo tempo; importe de novo para conferir"
+    except Exception:
+        db.rollback()
+        raise
+
+    dashboard_cache.invalidate(company_id)
+    return True, f"{len(new_rows)} despesa(s) importada(s), {skipped} já existente(s)"
+
+
+@metrics.timed(_FINANCIAL_RANGE_SECONDS)
+@read_only
 def get_financial_by_range(db: Session, company_id: int, start_date: datetime, end_date: datetime):
     """
     Como seu models.py não tem FK/relationship em Sale->Product,
     evitamos join ORM e montamos o dataframe com lookup de produtos.
     """
-    sales = db.query(Sale).filter(
+    import pandas as pd
+
+    # Só as colunas usadas (tuplas, sem entidades ORM)
+    sales = db.query(Sale.date, Sale.quantity, Sale.price, Sale.product_id).filter(
         Sale.company_id == company_id,
         Sale.date >= start_date,
         Sale.date <= end_date
     ).all()
 
-    expenses = db.query(Expense).filter(
+    expenses = db.query(Expense.date, Expense.description, Expense.category, Expense.amount).filter(
         Expense.company_id == company_id,
         Expense.date >= start_date,
         Expense.date <= end_date
@@ -269,28 +1263,903 @@ def get_financial_by_range(db: Session, company_id: int, start_date: datetime, e
     prods = db.query(Product.id, Product.name).filter(Product.company_id == company_id).all()
     prod_map = {pid: name for pid, name in prods}
 
-    df_sales = pd.DataFrame([{
-        "date": s.date,
-        "quantity": s.quantity,
-        "price": s.price,
-        "product_name": prod_map.get(s.product_id, f"Produto #{s.product_id}")
-    } for s in sales])
-
-    df_expenses = pd.DataFrame([{
-        "date": e.date,
-        "description": e.description,
-        "category": e.category,
-        "amount": e.amount
-    } for e in expenses])
-
-    # garante colunas mesmo vazio
-    if df_sales.empty:
-        df_sales = pd.DataFrame(columns=["date", "quantity", "price", "product_name"])
-    if df_expenses.empty:
-        df_expenses = pd.DataFrame(columns=["date", "description", "category", "amount"])
+    df_sales = pd.DataFrame([
+        (date, quantity, price, prod_map.get(product_id, f"Produto #{product_id}"))
+        for date, quantity, price, product_id in sales
+    ], columns=["date", "quantity", "price", "product_name"])
+
+    df_expenses = pd.DataFrame.from_records(expenses, columns=["date", "description", "category", "amount"])
 
     return df_sales, df_expenses
 
+
+# =========================
+# 📈 MARGEM BRUTA (custo médio ponderado)
+# =========================
+#
+# Product.avg_cost é o custo médio do saldo em estoque: cada reposição
+# recalcula (custo_médio × saldo + qtd × custo) / (saldo + qtd) no próprio
+# UPDATE do estoque, e cada venda grava o custo médio do momento em
+# Sale.unit_cost. Margem por produto/dia/período vira um SUM agrupado.
+
+MARGIN_GROUPS = ("product", "day", "total")
+
+# Descrição das reposições gravadas por restock_product
+_RESTOCK_DESCRIPTION = re.compile(r"^Reposição Estoque: (.*) \((\d+)x R\$ ([\d.]+)\)$")
+
+_costs_backfilled = False
+
+
+@read_only
+def get_margin_report(db: Session, company_id: int, start_date: datetime, end_date: datetime,
+                      by: str = "product") -> pd.DataFrame:
+    """
+    Receita, custo (Sale.unit_cost × qtd) e margem bruta das vendas do
+    período, agrupadas por produto, por dia ou num total único.
+    `uncosted_qty` conta unidades vendidas sem custo registrado: o custo
+    delas fica fora da soma e a margem aparece maior do que é.
+    Descontos do pedido não entram (são do cabeçalho, não da linha).
+    """
+    import pandas as pd
+
+    if by not in MARGIN_GROUPS:
+        raise ValueError(f"Agrupamento inválido: {by}")
+
+    measures = (
+        func.sum(Sale.quantity),
+        func.sum(Sale.price * Sale.quantity),
+        func.sum(Sale.unit_cost * Sale.quantity),
+        func.sum(case((Sale.unit_cost.is_(None), Sale.quantity), else_=0)),
+    )
+    in_range = (
+        Sale.company_id == company_id,
+        Sale.date >= start_date,
+        Sale.date <= end_date
+    )
+
+    if by == "product":
+        keys = ["product_id", "product_name", "sku"]
+        rows = db.query(Sale.product_id, Product.name, Product.sku, *measures).outerjoin(
+            Product, Product.id == Sale.product_id
+        ).filter(*in_range).group_by(Sale.product_id, Product.name, Product.sku).all()
+    elif by == "day":
+        keys = ["day"]
+        day = func.date(Sale.date)
+        rows = db.query(day, *measures).filter(*in_range).group_by(day).order_by(day).all()
+    else:
+        keys = []
+        rows = [r for r in db.query(*measures).filter(*in_range).all() if r[0]]
+
+    df = pd.DataFrame.from_records(rows, columns=keys + ["quantity", "revenue", "cost", "uncosted_qty"])
+    for col in ("quantity", "revenue", "cost", "uncosted_qty"):
+        df[col] = pd.to_numeric(df[col]).fillna(0)
+    df["margin"] = df["revenue"] - df["cost"]
+    df["margin_pct"] = (df["margin"] / df["revenue"].where(df["revenue"] > 0) * 100).fillna(0.0)
+    if by == "product":
+        df["product_name"] = df["product_name"].fillna(df["product_id"].map(lambda pid: f"Produto #{pid}"))
+        df = df.sort_values("margin", ascending=False, kind="stable").reset_index(drop=True)
+    elif by == "day":
+        df["day"] = pd.to_datetime(df["day"]).dt.date
+    return df
+
+
+def backfill_product_costs(db: Session, company_id: Optional[int] = None) -> int:
+    """
+    Reconstrói o custo médio dos produtos anteriores a avg_cost (avg_cost
+    nulo) refazendo o histórico em ordem de data:
+    - reposições do razão: custo = valor da despesa ligada / unidades
+    - reposições antigas sem movimento: custo lido da descrição da despesa
+    - vendas: gravam em Sale.unit_cost o custo médio da hora e baixam o saldo
+    - abertura/ajuste: corrigem o saldo que pondera a média
+    Sem nenhuma reposição conhecida o custo é o price_wholesale (custo base).
+    Só preenche custos nulos, então rodar de novo não muda nada. Roda uma vez
+    por processo; devolve quantos produtos foram reconstruídos.
+    """
+    global _costs_backfilled
+    if _costs_backfilled and company_id is None:
+        return 0
+
+    query = db.query(Product.company_id).filter(Product.avg_cost.is_(None))
+    if company_id is not None:
+        query = query.filter(Product.company_id == company_id)
+    company_ids = [cid for cid, in query.distinct().all()]
+
+    rebuilt = 0
+    for cid in company_ids:
+        rebuilt += _backfill_company_costs(db, cid)
+    if company_id is None:
+        _costs_backfilled = True
+    return rebuilt
+
+
+def _backfill_company_costs(db: Session, company_id: int) -> int:
+    products = db.query(Product.id, Product.name, Product.price_wholesale).filter(
+        Product.company_id == company_id,
+        Product.avg_cost.is_(None)
+    ).all()
+    if not products:
+        return 0
+    product_ids = [pid for pid, _, _ in products]
+    pid_by_name = {name: pid for pid, name, _ in products}
+
+    # Eventos por produto: (data, ordem no mesmo instante, tipo, valor, qtd, sale_id)
+    events = {pid: [] for pid in product_ids}
+    for pid, kind, delta, ref_id, date in db.query(
+        StockMovement.product_id, StockMovement.kind, StockMovement.delta, StockMovement.ref_id, StockMovement.date
+    ).filter(
+        StockMovement.company_id == company_id,
+        StockMovement.product_id.in_(product_ids),
+        StockMovement.kind != "venda"       # as vendas vêm de Sale, linha a linha
+    ).all():
+        if kind == "reposicao" and ref_id is not None:
+            events[pid].append((date, 0, "reposicao", ref_id, int(delta), None))
+        elif kind == "abertura":
+            events[pid].append((date, 1, "saldo", None, int(delta), None))
+        else:
+            events[pid].append((date, 1, "ajuste", None, int(delta), None))
+
+    restocks = db.query(Expense.id, Expense.date, Expense.amount, Expense.description).filter(
+        Expense.company_id == company_id,
+        Expense.category == "CMV",
+        Expense.description.like("Reposição Estoque: %")
+    ).all()
+    # despesas já ligadas a um movimento de reposição (de qualquer produto)
+    linked = {ref_id for ref_id, in db.query(StockMovement.ref_id).filter(
+        StockMovement.company_id == company_id,
+        StockMovement.kind == "reposicao"
+    ).all()}
+    amounts = {}
+    for exp_id, date, amount, description in restocks:
+        if exp_id in linked:
+            amounts[exp_id] = float(amount or 0.0)
+            continue
+        match = _RESTOCK_DESCRIPTION.match(description or "")
+        pid = pid_by_name.get(match.group(1)) if match else None
+        if pid is not None and int(match.group(2)) > 0:
+            events[pid].append((date, 0, "compra", float(match.group(3)), int(match.group(2)), None))
+
+    for sale_id, pid, date, quantity, unit_cost in db.query(
+        Sale.id, Sale.product_id, Sale.date, Sale.quantity, Sale.unit_cost
+    ).filter(
+        Sale.company_id == company_id,
+        Sale.product_id.in_(product_ids)
+    ).all():
+        events[pid].append((date, 2, "venda", unit_cost, int(quantity or 0), sale_id))
+
+    product_costs = []
+    sale_costs = []
+    for pid, _, base_cost in products:
+        avg = None
+        opening = None  # primeiro custo conhecido
+        units = 0
+        pending = []    # vendas antes de qualquer custo conhecido
+        for date, _, kind, value, qty, sale_id in sorted(events[pid], key=lambda e: (e[0] or datetime.min, e[1])):
+            if kind in ("reposicao", "compra") and qty > 0:
+                cost = amounts.get(value, 0.0) / qty if kind == "reposicao" else value
+                if opening is None:
+                    opening = cost
+                on_hand = max(units, 0)
+                avg = ((cost if avg is None else avg) * on_hand + qty * cost) / (on_hand + qty)
+                units += qty
+            elif kind == "saldo":
+                units = qty
+            elif kind == "ajuste":
+                units += qty
+            elif kind == "venda":
+                if value is None:
+                    if avg is None:
+                        pending.append(sale_id)
+                    else:
+                        sale_costs.append({"id": sale_id, "unit_cost": avg})
+                units -= qty
+
+        if avg is None:
+            avg = opening = float(base_cost or 0.0)
+        # vendas sem reposição anterior ficam com o primeiro custo conhecido
+        sale_costs.extend({"id": sale_id, "unit_cost": opening} for sale_id in pending)
+        product_costs.append({"id": pid, "avg_cost": avg})
+
+    try:
+        # UPDATE em lote pela chave primária
+        db.execute(update(Product), product_costs)
+        if sale_costs:
+            db.execute(update(Sale), sale_costs)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    dashboard_cache.invalidate(company_id)
+    return len(product_costs)
+
+
+# =========================
+# 📑 FECHAMENTO (paginação e totais no banco)
+# =========================
+
+SALES_SORT_COLUMNS = {
+    "date": Sale.date,
+    "product_name": Product.name,
+    "quantity": Sale.quantity,
+    "price": Sale.price,
+    "total": Sale.price * Sale.quantity,
+}
+
+EXPENSES_SORT_COLUMNS = {
+    "date": Expense.date,
+    "category": Expense.category,
+    "description": Expense.description,
+    "amount": Expense.amount,
+}
+
+
+def _sorted_page(query, sort_columns: dict, sort_by: str, descending: bool, page: int, page_size: int, tiebreak):
+    col = sort_columns.get(sort_by, sort_columns["date"])
+    order = col.desc() if descending else col.asc()
+    page = max(int(page), 1)
+    page_size = max(int(page_size), 1)
+    return (
+        query.order_by(order, tiebreak.desc() if descending else tiebreak.asc())
+        .offset((page - 1) * page_size)
+        .limit(page_size)
+        .all()
+    )
+
+
+def _sales_range_query(query, company_id: int, start_date: datetime, end_date: datetime, search: Optional[str]):
+    query = query.outerjoin(
+        Product, (Product.id == Sale.product_id) & (Product.company_id == Sale.company_id)
+    ).filter(
+        Sale.company_id == company_id,
+        Sale.date >= start_date,
+        Sale.date <= end_date
+    )
+    if search:
+        query = query.filter(Product.name.ilike(f"%{_escape_like(search)}%", escape="\\"))
+    return query
+
+
+@read_only
+def get_sales_page(
+    db: Session,
+    company_id: int,
+    start_date: datetime,
+    end_date: datetime,
+    page: int = 1,
+    page_size: int = 50,
+    sort_by: str = "date",
+    descending: bool = True,
+    search: Optional[str] = None
+) -> Tuple[pd.DataFrame, int]:
+    """
+    Uma página das vendas do período, já ordenada e filtrada no banco.
+    Retorna (dataframe da página, total de linhas que atendem ao filtro).
+    """
+    import pandas as pd
+
+    total_rows = _sales_range_query(db.query(Sale.id), company_id, start_date, end_date, search).count()
+
+    rows = _sorted_page(
+        _sales_range_query(
+            db.query(Sale.id, Sale.date, Sale.product_id, Product.name, Sale.quantity, Sale.price),
+            company_id, start_date, end_date, search
+        ),
+        SALES_SORT_COLUMNS, sort_by, descending, page, page_size, Sale.id
+    )
+
+    df = pd.DataFrame([{
+        "date": r.date,
+        "product_name": r.name or f"Produto #{r.product_id}",
+        "quantity": r.quantity,
+        "price": r.price,
+        "total": float(r.price or 0.0) * int(r.quantity or 0),
+    } for r in rows], columns=["date", "product_name", "quantity", "price", "total"])
+    return df, total_rows
+
+
+def _expenses_range_query(query, company_id: int, start_date: datetime, end_date: datetime,
+                          category: Optional[str], search: Optional[str]):
+    query = query.filter(
+        Expense.company_id == company_id,
+        Expense.date >= start_date,
+        Expense.date <= end_date
+    )
+    if category:
+        query = query.filter(Expense.category == category)
+    if search:
+        query = query.filter(Expense.description.ilike(f"%{_escape_like(search)}%", escape="\\"))
+    return query
+
+
+@read_only
+def get_expenses_page(
+    db: Session,
+    company_id: int,
+    start_date: datetime,
+    end_date: datetime,
+    page: int = 1,
+    page_size: int = 50,
+    sort_by: str = "date",
+    descending: bool = True,
+    category: Optional[str] = None,
+    search: Optional[str] = None
+) -> Tuple[pd.DataFrame, int]:
+    """Mesma ideia de get_sales_page, para as despesas."""
+    import pandas as pd
+
+    total_rows = _expenses_range_query(
+        db.query(Expense.id), company_id, start_date, end_date, category, search
+    ).count()
+
+    rows = _sorted_page(
+        _expenses_range_query(
+            db.query(Expense.id, Expense.date, Expense.category, Expense.description, Expense.amount),
+            company_id, start_date, end_date, category, search
+        ),
+        EXPENSES_SORT_COLUMNS, sort_by, descending, page, page_size, Expense.id
+    )
+
+    df = pd.DataFrame([{
+        "date": r.date,
+        "category": r.category,
+        "description": r.description,
+        "amount": r.amount,
+    } for r in rows], columns=["date", "category", "description", "amount"])
+    return df, total_rows
+
+
+@read_only
+def get_financial_totals(db: Session, company_id: int, start_date: datetime, end_date: datetime) -> dict:
+    """Totais e contagens do período via agregação no banco (sem carregar linhas)."""
+    sales = db.query(
+        func.count(Sale.id),
+        func.coalesce(func.sum(Sale.quantity), 0),
+        func.coalesce(func.sum(Sale.price * Sale.quantity), 0.0),
+    ).filter(
+        Sale.company_id == company_id,
+        Sale.date >= start_date,
+        Sale.date <= end_date
+    ).one()
+
+    expenses = db.query(
+        func.count(Expense.id),
+        func.coalesce(func.sum(Expense.amount), 0.0),
+    ).filter(
+        Expense.company_id == company_id,
+        Expense.date >= start_date,
+        Expense.date <= end_date
+    ).one()
+
+    return {
+        "sales_count": int(sales[0]),
+        "items_count": int(sales[1]),
+        "sales_total": float(sales[2]),
+        "expenses_count": int(expenses[0]),
+        "expenses_total": float(expenses[1]),
+    }
+
+
+@read_only
+def get_order_metrics(db: Session, company_id: int, start_date: datetime, end_date: datetime) -> dict:
+    """
+    Métricas por cupom (Order): quantidade, faturamento líquido de desconto,
+    ticket médio e mix de pagamento, tudo agregado no banco.
+
+    Vendas antigas, gravadas antes da tabela orders, não têm order_id:
+    cada linha dessas conta como um cupom (era assim que eram lançadas).
+    """
+    count, revenue, discount = db.query(
+        func.count(Order.id),
+        func.coalesce(func.sum(Order.total), 0.0),
+        func.coalesce(func.sum(Order.discount), 0.0),
+    ).filter(
+        Order.company_id == company_id,
+        Order.date >= start_date,
+        Order.date <= end_date
+    ).one()
+
+    legacy_count, legacy_revenue = db.query(
+        func.count(Sale.id),
+        func.coalesce(func.sum(Sale.price * Sale.quantity), 0.0),
+    ).filter(
+        Sale.company_id == company_id,
+        Sale.order_id.is_(None),
+        Sale.date >= start_date,
+        Sale.date <= end_date
+    ).one()
+
+    payment_mix = {
+        (payment or "Não informado"): {"orders": int(n), "total": float(total or 0.0)}
+        for payment, n, total in db.query(
+            Order.payment, func.count(Order.id), func.sum(Order.total)
+        ).filter(
+            Order.company_id == company_id,
+            Order.date >= start_date,
+            Order.date <= end_date
+        ).group_by(Order.payment).all()
+    }
+    if legacy_count:
+        payment_mix.setdefault("Não informado", {"orders": 0, "total": 0.0})
+        payment_mix["Não informado"]["orders"] += int(legacy_count)
+        payment_mix["Não informado"]["total"] += float(legacy_revenue)
+
+    orders = int(count) + int(legacy_count)
+    revenue = float(revenue) + float(legacy_revenue)
+    return {
+        "orders": orders,
+        "revenue": revenue,
+        "discount": float(discount),
+        "avg_ticket": revenue / orders if orders else 0.0,
+        "payment_mix": payment_mix,
+    }
+
+
+def get_data_fingerprint(db: Session, company_id: int, start_date: datetime, end_date: datetime) -> list:
+    """
+    Impressão digital barata dos dados do período (contagem e maior id de
+    vendas e despesas). Muda sempre que algo é lançado no período.
+    """
+    sales = db.query(func.count(Sale.id), func.max(Sale.id)).filter(
+        Sale.company_id == company_id,
+        Sale.date >= start_date,
+        Sale.date <= end_date
+    ).one()
+    expenses = db.query(func.count(Expense.id), func.max(Expense.id)).filter(
+        Expense.company_id == company_id,
+        Expense.date >= start_date,
+        Expense.date <= end_date
+    ).one()
+    return [int(sales[0]), sales[1], int(expenses[0]), expenses[1]]
+
+
+@read_only
+def get_expense_categories(db: Session, company_id: int, start_date: datetime, end_date: datetime):
+    rows = db.query(Expense.category).filter(
+        Expense.company_id == company_id,
+        Expense.date >= start_date,
+        Expense.date <= end_date
+    ).distinct().all()
+    return sorted(c for (c,) in rows if c)
+
+
+# =========================
+# 👥 DESEMPENHO POR CAIXA (operador)
+# =========================
+#
+# Mesmo esquema do razão de estoque: as horas já fechadas ficam agregadas
+# em CashierHour (caixa x hora) e só o trecho ainda não agregado é lido de
+# Sale, pelo índice (company_id, user_id, date). Tudo em SQL agrupado.
+# Horas são as gravadas na venda, como no mapa de calor do Dashboard.
+#
+# CashierRollup guarda a marca d'água (maior Sale.id já agregado): vendas
+# acima dela em horas já agregadas (commit atrasado, venda retroativa,
+# importação) entram no relatório direto de Sale e a próxima agregação
+# refaz essas horas. Só uma transação aberta por mais de
+# CASHIER_ROLLUP_LAG_MINUTES escapa (como no painel ao vivo, ver live.py);
+# roll_up_cashier_hours(rebuild=True) refaz tudo.
+
+CASHIER_REPORT_GROUPS = ("total", "hour", "shift")
+
+# Uma hora só é agregada depois desta folga (vendas ainda em commit)
+CASHIER_ROLLUP_LAG_MINUTES = int(os.getenv("CASHIER_ROLLUP_LAG_MINUTES", "5"))
+
+
+def _parse_shifts(raw: str) -> List[Tuple[str, int, int]]:
+    """"Manhã=6-12,Tarde=12-18" -> [("Manhã", 6, 12), ("Tarde", 12, 18)] (início incluso, fim não)."""
+    shifts = []
+    for part in (raw or "").split(","):
+        name, sep, span = part.partition("=")
+        start, dash, end = span.partition("-")
+        if not (sep and dash and name.strip()):
+            continue
+        try:
+            shifts.append((name.strip(), int(start), int(end)))
+        except ValueError:
+            continue
+    return shifts
+
+
+# Turnos para o relatório por caixa: CASHIER_SHIFTS="Manhã=6-12,Tarde=12-18,Noite=18-24"
+CASHIER_SHIFTS = _parse_shifts(
+    os.getenv("CASHIER_SHIFTS", "Madrugada=0-6,Manhã=6-12,Tarde=12-18,Noite=18-24")
+)
+
+
+def _hour_floor(when: datetime) -> datetime:
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+def _sales_by_cashier_hour(company_id: int, start: datetime, end: datetime, end_inclusive: bool = False,
+                           after_id: Optional[int] = None):
+    """
+    SELECT (user_id, dia, hora, cupons, unidades, faturamento) direto de Sale;
+    `after_id` fica só com as vendas acima da marca d'água.
+    """
+    day = func.date(Sale.date)
+    hour = cast(extract("hour", Sale.date), Integer)
+    # vendas antigas sem order_id: cada linha conta como um cupom
+    orders = func.count(func.distinct(Sale.order_id)) + func.sum(case((Sale.order_id.is_(None), 1), else_=0))
+    query = select(
+        Sale.user_id, day, hour, orders, func.sum(Sale.quantity), func.sum(Sale.price * Sale.quantity)
+    ).where(
+        Sale.company_id == company_id,
+        Sale.date >= start,
+        Sale.date <= end if end_inclusive else Sale.date < end
+    )
+    if after_id is not None:
+        query = query.where(Sale.id > after_id)
+    return query.group_by(Sale.user_id, day, hour)
+
+
+def _hour_start(day, hour) -> datetime:
+    return datetime.fromisoformat(str(day)) + timedelta(hours=int(hour))
+
+
+def _hour_ranges(hours) -> List[Tuple[datetime, datetime]]:
+    """Horas soltas -> faixas [início, fim) de horas consecutivas."""
+    ranges = []
+    for h in sorted(set(hours)):
+        if ranges and ranges[-1][1] == h:
+            ranges[-1][1] = h + timedelta(hours=1)
+        else:
+            ranges.append([h, h + timedelta(hours=1)])
+    return [(a, b) for a, b in ranges]
+
+
+def _cashier_rollup_state(db: Session, company_id: int):
+    """(rolled_until, last_sale_id) da empresa, ou None antes da primeira agregação."""
+    return db.query(CashierRollup.rolled_until, CashierRollup.last_sale_id).filter(
+        CashierRollup.company_id == company_id
+    ).first()
+
+
+def roll_up_cashier_hours(db: Session, company_id: int, now: Optional[datetime] = None,
+                          rebuild: bool = False) -> int:
+    """
+    Agrega em CashierHour as horas fechadas ainda não agregadas e refaz as
+    horas já agregadas que ganharam vendas depois (id acima da marca
+    d'água: commit atrasado, venda retroativa, importação). `rebuild`
+    refaz tudo. Retorna quantas linhas gravou.
+
+    Escreve: roda no caminho de escrita (ver _schedule_cashier_rollup),
+    nunca dentro de um relatório.
+    """
+    until = _hour_floor((now or datetime.utcnow()) - timedelta(minutes=CASHIER_ROLLUP_LAG_MINUTES))
+    state = None if rebuild else _cashier_rollup_state(db, company_id)
+
+    if state is None:
+        first = db.query(func.min(Sale.date)).filter(Sale.company_id == company_id).scalar()
+        if first is None:
+            return 0
+        rolled_until, last_sale_id = _hour_floor(first), 0
+        ranges = [(rolled_until, until)] if rolled_until < until else []
+        stale = CashierHour.company_id == company_id
+    else:
+        rolled_until, last_sale_id = state
+        # vendas novas em horas já agregadas: essas horas são refeitas inteiras
+        late_day, late_hour = func.date(Sale.date), cast(extract("hour", Sale.date), Integer)
+        late = [
+            _hour_start(day, hour) for day, hour in db.query(late_day, late_hour).filter(
+                Sale.id > last_sale_id,
+                Sale.company_id == company_id,
+                Sale.date < rolled_until
+            ).group_by(late_day, late_hour).all()
+        ]
+        ranges = _hour_ranges(late)
+        if rolled_until < until:
+            ranges.append((rolled_until, until))
+        stale = and_(
+            CashierHour.company_id == company_id,
+            or_(*[and_(CashierHour.start >= a, CashierHour.start < b) for a, b in ranges])
+        ) if ranges else None
+
+    # vendas com id até a marca já estão nas horas agregadas; as de horas
+    # ainda abertas entram quando a hora fechar, qualquer que seja o id
+    mark = db.query(func.max(Sale.id)).filter(
+        Sale.id > last_sale_id,
+        Sale.company_id == company_id,
+        Sale.date < max(until, rolled_until)
+    ).scalar() or last_sale_id
+    if not ranges and mark == last_sale_id:
+        return 0
+
+    rows = [
+        {
+            "company_id": company_id,
+            "user_id": user_id,
+            "start": _hour_start(day, hour),
+            "orders": int(orders or 0),
+            "units": int(units or 0),
+            "revenue": float(revenue or 0.0),
+        }
+        for a, b in ranges
+        for user_id, day, hour, orders, units, revenue in db.execute(
+            _sales_by_cashier_hour(company_id, a, b)
+        ).all()
+    ]
+    try:
+        if stale is not None:
+            db.query(CashierHour).filter(stale).delete(synchronize_session=False)
+        if rows:
+            db.execute(insert(CashierHour), rows)
+        new_until = max(until, rolled_until)
+        if state is None:
+            db.query(CashierRollup).filter(CashierRollup.company_id == company_id).delete(synchronize_session=False)
+            db.add(CashierRollup(company_id=company_id, rolled_until=new_until, last_sale_id=mark))
+        else:
+            db.execute(
+                update(CashierRollup)
+                .where(CashierRollup.company_id == company_id)
+                .values(rolled_until=new_until, last_sale_id=mark)
+            )
+        db.commit()
+    except IntegrityError:
+        # outra sessão agregou as mesmas horas primeiro
+        db.rollback()
+        return 0
+    return len(rows)
+
+
+# Próxima agregação por empresa: uma vez por hora fechada, disparada pelo checkout
+_cashier_rollup_due: dict = {}
+_cashier_rollup_lock = threading.Lock()
+
+
+def _schedule_cashier_rollup(company_id: int, now: datetime) -> None:
+    """Depois de uma venda: agrega a hora que fechou numa thread com sessão própria."""
+    with _cashier_rollup_lock:
+        due = _cashier_rollup_due.get(company_id)
+        if due is not None and now < due:
+            return
+        _cashier_rollup_due[company_id] = _hour_floor(now) + timedelta(hours=1, minutes=CASHIER_ROLLUP_LAG_MINUTES)
+
+    def retry_on_next_sale():
+        with _cashier_rollup_lock:
+            _cashier_rollup_due.pop(company_id, None)
+
+    _in_background(roll_up_cashier_hours, company_id, now, on_error=retry_on_next_sale)
+
+
+@read_only
+def get_cashier_report(db: Session, company_id: int, start_date: datetime, end_date: datetime,
+                       by: str = "total") -> pd.DataFrame:
+    """
+    Vendas por caixa (Sale.user_id + User.username) no período:
+    - total: cupons, unidades, faturamento, ticket médio e dias com venda
+    - hour: o mesmo por hora do dia; orders_per_hour = cupons / dias em que
+      o caixa vendeu naquela hora (vazão média da hora)
+    - shift: por turno (CASHIER_SHIFTS); orders_per_hour divide também
+      pelas horas do turno
+    Horas inteiras do período vêm de CashierHour (ver roll_up_cashier_hours);
+    as pontas, o que ainda não foi agregado e as vendas acima da marca
+    d'água (chegaram depois da agregação), de Sale. Só lê.
+    """
+    import pandas as pd
+
+    if by not in CASHIER_REPORT_GROUPS:
+        raise ValueError(f"Agrupamento inválido: {by}")
+
+    state = _cashier_rollup_state(db, company_id)
+    first_full = _hour_floor(start_date)
+    if first_full < start_date:
+        first_full += timedelta(hours=1)
+    end_full = _hour_floor(end_date + timedelta(microseconds=1))
+    if state is not None:
+        end_full = min(end_full, state.rolled_until)
+
+    if state is not None and first_full < end_full:
+        parts = [
+            select(
+                CashierHour.user_id,
+                func.date(CashierHour.start),
+                cast(extract("hour", CashierHour.start), Integer),
+                CashierHour.orders,
+                CashierHour.units,
+                CashierHour.revenue
+            ).where(
+                CashierHour.company_id == company_id,
+                CashierHour.start >= first_full,
+                CashierHour.start < end_full
+            ),
+            # vendas que chegaram depois da agregação das horas cheias
+            _sales_by_cashier_hour(company_id, first_full, end_full, after_id=state.last_sale_id),
+            _sales_by_cashier_hour(company_id, start_date, first_full),
+            _sales_by_cashier_hour(company_id, end_full, end_date, end_inclusive=True),
+        ]
+    else:
+        parts = [_sales_by_cashier_hour(company_id, start_date, end_date, end_inclusive=True)]
+
+    hours = union_all(*parts).subquery()
+    c_user, c_day, c_hour, c_orders, c_units, c_revenue = hours.c
+    keys = {
+        "total": [],
+        "hour": [c_hour],
+        "shift": [case(*[((c_hour >= a) & (c_hour < b), name) for name, a, b in CASHIER_SHIFTS], else_="Outro")],
+    }[by]
+    rows = db.execute(
+        select(
+            c_user,
+            User.username,
+            *keys,
+            func.sum(c_orders),
+            func.sum(c_units),
+            func.sum(c_revenue),
+            func.count(func.distinct(c_day))
+        ).select_from(hours).outerjoin(User, User.id == c_user).group_by(c_user, User.username, *keys)
+    ).all()
+
+    key_names = {"total": [], "hour": ["hour"], "shift": ["shift"]}[by]
+    df = pd.DataFrame.from_records(
+        rows, columns=["user_id", "username"] + key_names + ["orders", "units", "revenue", "active_days"]
+    )
+    for col in ("orders", "units", "revenue", "active_days"):
+        df[col] = pd.to_numeric(df[col]).fillna(0)
+    df["username"] = df["username"].fillna(df["user_id"].map(lambda uid: f"Usuário #{uid}"))
+    df["avg_ticket"] = (df["revenue"] / df["orders"].where(df["orders"] > 0)).fillna(0.0)
+
+    active_days = df["active_days"].where(df["active_days"] > 0)
+    if by == "total":
+        df["orders_per_day"] = (df["orders"] / active_days).fillna(0.0)
+        df = df.sort_values("revenue", ascending=False, kind="stable")
+    elif by == "hour":
+        df["orders_per_hour"] = (df["orders"] / active_days).fillna(0.0)
+        df = df.sort_values(["username", "hour"], kind="stable")
+    else:
+        shift_hours = df["shift"].map({name: b - a for name, a, b in CASHIER_SHIFTS}).where(lambda h: h > 0)
+        df["orders_per_hour"] = (df["orders"] / (active_days * shift_hours)).fillna(0.0)
+        order = {name: i for i, (name, _, _) in enumerate(CASHIER_SHIFTS)}
+        df = df.sort_values(["username", "shift"], key=lambda s: s.map(order) if s.name == "shift" else s,
+                            kind="stable")
+    return df.reset_index(drop=True)
+
+
+def get_cashier_report_cached(db: Session, company_id: int, start_date: datetime, end_date: datetime,
+                              by: str = "total") -> pd.DataFrame:
+    """
+    Relatório por caixa compartilhado entre sessões (report_cache); vendas
+    dentro do período invalidam. Só lê: a agregação por hora roda depois
+    das vendas (_schedule_cashier_rollup).
+    """
+    return report_cache.get_or_compute(
+        (company_id, "cashiers", by, start_date, end_date),
+        loader=lambda: get_cashier_report(db, company_id, start_date, end_date, by),
+        refresh=lambda: _with_new_session(get_cashier_report, company_id, start_date, end_date, by),
+        window=(start_date, end_date),
+    )
+
+
+# =========================
+# 📊 DASHBOARD (snapshot em cache)
+# =========================
+
+# Versão dos dados de cada snapshot (chave do cache de figuras)
+_snapshot_versions = itertools.count(1)
+
+
+@read_only
+def compute_dashboard_snapshot(db: Session, company_id: int, days: int = 30) -> dict:
+    """
+    Calcula todos os agregados do Dashboard de uma vez (KPIs, mapa de calor,
+    top produtos e série diária) para os últimos `days` dias, comparando com
+    o período anterior de mesmo tamanho.
+
+    O mapa de calor é uma grade 7 x 24 e a série diária são arrays NumPy
+    (ver charts.py), prontos para virar figura.
+    """
+    from charts import daily_totals, heatmap_grid
+
+    # vendas e despesas são gravadas com utcnow(): a janela usa o mesmo relógio
+    end_date = datetime.utcnow()
+    start_current = end_date - timedelta(days=days)
+    start_previous = start_current - timedelta(days=days)
+
+    df_sales, df_exp = get_financial_by_range(db, company_id, start_current, end_date)
+
+    # Receita da linha = preço unitário x quantidade (usada nos gráficos)
+    df_sales["line_total"] = df_sales["price"].astype(float) * df_sales["quantity"].astype(float)
+
+    # KPIs por cupom, direto da tabela orders
+    cur = get_order_metrics(db, company_id, start_current, end_date)
+    prev = get_order_metrics(db, company_id, start_previous, start_current)
+    desp_atual = float(df_exp["amount"].sum()) if not df_exp.empty else 0.0
+
+    kpis = {
+        "revenue": cur["revenue"],
+        "revenue_prev": prev["revenue"],
+        "revenue_delta": cur["revenue"] - prev["revenue"],
+        "discount": cur["discount"],
+        "expenses": desp_atual,
+        "profit": cur["revenue"] - desp_atual,
+        "avg_ticket": cur["avg_ticket"],
+        "sales_count": cur["orders"],
+        "sales_count_prev": prev["orders"],
+        "payment_mix": cur["payment_mix"],
+    }
+
+    heatmap = heatmap_grid(df_sales["date"], df_sales["line_total"])
+
+    top_products = (
+        df_sales.groupby("product_name")["line_total"].sum()
+        .sort_values(ascending=True)
+        .tail(5)
+    )
+
+    daily = {"Receita": daily_totals(df_sales["date"], df_sales["line_total"])}
+    if not df_exp.empty:
+        daily["Despesa"] = daily_totals(df_exp["date"], df_exp["amount"])
+
+    return {
+        "company_id": company_id,
+        "days": days,
+        "start": start_current,
+        "end": end_date,
+        "computed_at": datetime.utcnow(),   # UTC; a tela converte para exibir
+        "version": next(_snapshot_versions),
+        "kpis": kpis,
+        "heatmap": heatmap,
+        "top_products": (list(top_products.index), top_products.to_numpy(dtype=float)),
+        "daily": daily,
+    }
+
+
+def _with_new_session(fn, *args, **kwargs):
+    """Roda `fn(db, ...)` numa sessão própria de leitura (uso em threads de fundo)."""
+    from database import get_read_session
+
+    db = get_read_session()
+    try:
+        return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+def _in_background(fn, company_id: int, *args, on_error=None) -> None:
+    """
+    Roda `fn(db, company_id, ...)` numa thread com sessão própria no
+    primário: manutenção disparada por uma escrita (agregados, cortes),
+    fora da tela e da transação de quem escreveu.
+    """
+    def run():
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            fn(db, company_id, *args)
+        except Exception:
+            logger.exception("Falha em %s (empresa %s)", fn.__name__, company_id)
+            if on_error is not None:
+                on_error()
+        finally:
+            db.close()
+
+    threading.Thread(target=run, name=f"{fn.__name__}-{company_id}", daemon=True).start()
+
+
+def get_dashboard_snapshot(db: Session, company_id: int, days: int = 30) -> dict:
+    """
+    Snapshot do Dashboard compartilhado entre todas as sessões da empresa.
+    Vendas/despesas novas invalidam o período (ver dashboard_cache.invalidate).
+    """
+    now = datetime.utcnow()
+    return dashboard_cache.get_or_compute(
+        (company_id, "dashboard", int(days)),
+        loader=lambda: compute_dashboard_snapshot(db, company_id, days),
+        refresh=lambda: _with_new_session(compute_dashboard_snapshot, company_id, days),
+        window=(now - timedelta(days=2 * days), None),
+    )
+
+
+PRODUCT_EDIT_CONFLICT = "Produto alterado por outro usuário; confira os valores atuais"
+
+
+def _product_row(db: Session, company_id: int, product_id: int) -> Optional[ProductRow]:
+    row = db.query(*_PRODUCT_ROW_COLUMNS).filter(
+        Product.id == product_id,
+        Product.company_id == company_id
+    ).first()
+    return ProductRow(*row) if row else None
+
+
 def update_product(
     db: Session,
     company_id: int,
@@ -299,32 +2168,66 @@ def update_product(
     sku: str,
     price_retail: float,
     price_wholesale: float,
-    stock_min: int
-):
-    prod = db.query(Product).filter(
-        Product.id == product_id,
-        Product.company_id == company_id
-    ).first()
-    if not prod:
-        return False, "Produto não encontrado"
+    stock_min: int,
+    version: Optional[int] = None
+) -> Tuple[bool, str, Optional[ProductRow]]:
+    """
+    Edição otimista do cadastro: `version` é a versão que a tela carregou.
+    O UPDATE só casa se a versão ainda for a mesma (sem lock: vendas e
+    reposições seguem em paralelo) e só grava as colunas que mudaram, então
+    nunca sobrescreve o estoque. Sem `version`, vale a versão atual.
+    Retorna (ok, mensagem, produto atual); em conflito, o produto atual traz
+    os valores gravados por quem salvou antes.
+    """
+    current = _product_row(db, company_id, product_id)
+    if current is None:
+        return False, "Produto não encontrado", None
+
+    expected = (current.version or 0) if version is None else int(version)
+    if (current.version or 0) != expected:
+        return False, PRODUCT_EDIT_CONFLICT, current
+
+    wanted = {
+        "name": name,
+        "sku": sku,
+        "price_retail": float(price_retail),
+        "price_wholesale": float(price_wholesale),
+        "stock_min": int(stock_min),
+    }
+    changes = {col: value for col, value in wanted.items() if getattr(current, col) != value}
+    if not changes:
+        return True, "Nenhuma alteração", current
 
     # SKU não pode repetir dentro da empresa
-    sku_conflict = db.query(Product).filter(
-        Product.company_id == company_id,
-        Product.sku == sku,
-        Product.id != product_id
-    ).first()
-    if sku_conflict:
-        return False, "Já existe outro produto com esse SKU"
-
-    prod.name = name
-    prod.sku = sku
-    prod.price_retail = float(price_retail)
-    prod.price_wholesale = float(price_wholesale)
-    prod.stock_min = int(stock_min)
-
-    db.commit()
-    return True, "Produto atualizado"
-
+    if "sku" in changes:
+        sku_conflict = db.query(Product.id).filter(
+            Product.company_id == company_id,
+            Product.sku == sku,
+            Product.id != product_id
+        ).first()
+        if sku_conflict:
+            return False, "Já existe outro produto com esse SKU", current
 
+    try:
+        row = db.execute(
+            update(Product)
+            .where(
+                Product.id == product_id,
+                Product.company_id == company_id,
+                func.coalesce(Product.version, 0) == expected
+            )
+            .values(**changes, version=expected + 1)
+            .returning(*_PRODUCT_ROW_COLUMNS)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if row is None:
+            # outra edição entrou entre a leitura e o UPDATE
+            db.rollback()
+            return False, PRODUCT_EDIT_CONFLICT, _product_row(db, company_id, product_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
 
+    dashboard_cache.invalidate(company_id)
+    return True, "Produto atualizado", ProductRow(*row)
@@ -0,0 +1,153 @@
+# session_store.py
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+
+# =========================================================
+# SESSÕES COMPARTILHADAS (login + carrinho fora do processo)
+# =========================================================
+#
+# O st.session_state vive só no processo que atendeu o navegador. Aqui fica
+# uma cópia do login e do carrinho, indexada por um id de sessão que vai
+# assinado num cookie (services.sign_token, ver views/common.py). Qualquer
+# réplica que receber o navegador restaura a sessão, e um restart não perde
+# os carrinhos abertos.
+#
+# O Streamlit não deixa o script mandar Set-Cookie: o cookie é gravado por
+# JavaScript (document.cookie), então NÃO é HttpOnly e um script injetado na
+# página consegue lê-lo. O que limita o estrago: o token é assinado, expira
+# em SESSION_TTL e o sid é trocado a cada restauração (views/common.py).
+#
+# SESSION_STORE=sqlite  (padrão) arquivo SQLite em SESSION_DB_PATH, visto por
+#                       todos os processos da máquina/volume
+# SESSION_STORE=memory  só neste processo (desenvolvimento)
+
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(12 * 3600)))
+SESSION_DB_PATH = os.getenv(
+    "SESSION_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".peegflow_sessions.db")
+)
+
+
+class SessionStore(ABC):
+    """Interface: valores são dicts serializáveis em JSON, com expiração (TTL em segundos)."""
+
+    @abstractmethod
+    def get(self, sid: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def put(self, sid: str, data: dict, ttl: int = SESSION_TTL) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, sid: str) -> None:
+        ...
+
+    @abstractmethod
+    def purge(self) -> int:
+        """Remove as sessões expiradas. Retorna quantas removeu."""
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self):
+        self._data: Dict[str, Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, sid: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None:
+                return None
+            expires_at, raw = entry
+            if expires_at < time.time():
+                del self._data[sid]
+                return None
+        return json.loads(raw)
+
+    def put(self, sid: str, data: dict, ttl: int = SESSION_TTL) -> None:
+        raw = json.dumps(data)
+        with self._lock:
+            self._data[sid] = (time.time() + ttl, raw)
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def purge(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (expires_at, _) in self._data.items() if expires_at < now]
+            for sid in expired:
+                del self._data[sid]
+        return len(expired)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Arquivo SQLite em modo WAL: vários processos leem e gravam ao mesmo tempo.
+    Uma conexão por thread (cada sessão do Streamlit roda na sua thread).
+    """
+
+    PURGE_EVERY = 200   # a cada N gravações, apaga as sessões expiradas
+
+    def __init__(self, path: str = SESSION_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " sid TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT data FROM sessions WHERE sid = ? AND expires_at >= ?", (sid, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, sid: str, data: dict, ttl: int = SESSION_TTL) -> None:
+        self._conn().execute(
+            "INSERT INTO sessions (sid, data, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(sid) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+            (sid, json.dumps(data), time.time() + ttl),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.purge()
+
+    def delete(self, sid: str) -> None:
+        self._conn().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def purge(self) -> int:
+        return self._conn().execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),)).rowcount
+
+
+def create_store(kind: Optional[str] = None) -> SessionStore:
+    kind = (kind or os.getenv("SESSION_STORE", "sqlite")).strip().lower()
+    if kind == "memory":
+        return MemorySessionStore()
+    if kind == "sqlite":
+        return SQLiteSessionStore(SESSION_DB_PATH)
+    raise ValueError(f"SESSION_STORE desconhecido: {kind}")
+
+
+session_store = create_store()
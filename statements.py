@@ -0,0 +1,240 @@
+# statements.py
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Pattern, Sequence, Tuple
+
+
+# =========================================================
+# EXTRATOS BANCÁRIOS (OFX / CSV)
+# =========================================================
+#
+# Cada lançamento vira um StatementLine com um hash do conteúdo, gravado em
+# Expense.import_hash: reimportar o mesmo arquivo (ou um extrato que se
+# sobrepõe ao anterior) não duplica despesas.
+# - OFX: o hash usa conta + FITID (id do lançamento no banco)
+# - CSV: data + valor + descrição + ordem entre lançamentos idênticos do
+#   arquivo (dois cafés de R$ 5,00 no mesmo dia continuam sendo dois)
+
+# Regras padrão: (expressão regular na descrição, categoria). A primeira que
+# casar vale; STATEMENT_RULES_FILE aponta para um JSON [{"pattern", "category"}]
+DEFAULT_CATEGORY = "Variável (Extra)"
+DEFAULT_RULES = [
+    (r"simples nacional|\bdas\b|darf|\bgps\b|inss|icms|\biss\b|iptu|ipva|imposto|tribut", "Impostos"),
+    (r"salario|folha|pro.?labore|fgts|ferias|13o|vale.?transporte|vale.?refeicao", "Pessoal"),
+    (r"aluguel|condominio|energia|\bluz\b|enel|cemig|copel|light|sabesp|\bagua\b|internet|telefon"
+     r"|\bvivo\b|\bclaro\b|\btim\b|contabil|mensalidade|assinatura", "Fixa (Recorrente)"),
+    (r"fornecedor|mercadoria|atacad|distribuidora", "CMV"),
+]
+STATEMENT_RULES_FILE = os.getenv("STATEMENT_RULES_FILE")
+
+
+@dataclass(frozen=True, slots=True)
+class StatementLine:
+    date: datetime
+    amount: float           # negativo = saída (despesa)
+    description: str
+    import_hash: str
+
+
+def _strip_accents(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _normalize(text: str) -> str:
+    """Minúsculas, sem acentos e com espaços simples (para regras e hash)."""
+    return " ".join(_strip_accents(text).lower().split())
+
+
+def _decode(data: bytes) -> str:
+    for encoding in ("utf-8-sig", "cp1252"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("latin-1")
+
+
+def _hash(*parts) -> str:
+    return hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def parse_amount(raw: str) -> float:
+    """Aceita "-1.234,56", "1,234.56", "R$ 10,00", "(10,00)" e "10,00 D"."""
+    text = (raw or "").strip().upper().replace("R$", "").replace(" ", "")
+    negative = False
+    if text.startswith("(") and text.endswith(")"):
+        negative, text = True, text[1:-1]
+    if text.endswith("D"):
+        negative, text = True, text[:-1]
+    elif text.endswith("C"):
+        text = text[:-1]
+    if "," in text and "." in text:
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    elif "," in text:
+        text = text.replace(",", ".")
+    value = float(text)
+    return -abs(value) if negative else value
+
+
+def parse_date(raw: str) -> datetime:
+    raw = (raw or "").strip()
+    for fmt in ("%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d", "%d-%m-%Y", "%d.%m.%Y", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(raw, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Data inválida: {raw}")
+
+
+# =========================
+# 📄 OFX
+# =========================
+
+_OFX_TAG = re.compile(r"<(\w+)>([^<\r\n]*)")
+_OFX_TRANSACTION = re.compile(r"<STMTTRN>(.*?)(?:</STMTTRN>|(?=<STMTTRN>)|</BANKTRANLIST>)", re.S | re.I)
+
+
+def _ofx_fields(block: str) -> dict:
+    return {tag.upper(): value.strip() for tag, value in _OFX_TAG.findall(block) if value.strip()}
+
+
+def parse_ofx(data: bytes) -> List[StatementLine]:
+    """OFX 1.x (SGML, tags sem fechamento) ou 2.x (XML)."""
+    text = _decode(data)
+    header = _ofx_fields(text.split("<BANKTRANLIST>", 1)[0]) if "<BANKTRANLIST>" in text.upper() else {}
+    account = f"{header.get('BANKID', '')}/{header.get('ACCTID', '')}"
+
+    lines = []
+    for block in _OFX_TRANSACTION.findall(text):
+        fields = _ofx_fields(block)
+        if "TRNAMT" not in fields or "DTPOSTED" not in fields:
+            continue
+        date = datetime.strptime(fields["DTPOSTED"][:8], "%Y%m%d")
+        amount = parse_amount(fields["TRNAMT"])
+        description = " ".join(filter(None, (fields.get("NAME"), fields.get("MEMO")))) or fields.get("TRNTYPE", "")
+        fitid = fields.get("FITID")
+        import_hash = (
+            _hash("ofx", account, fitid) if fitid
+            else _hash("ofx", account, date.date(), f"{amount:.2f}", _normalize(description))
+        )
+        lines.append(StatementLine(date, amount, description, import_hash))
+    if not lines and "<OFX>" not in text.upper():
+        raise ValueError("Arquivo OFX inválido")
+    return lines
+
+
+# =========================
+# 📄 CSV
+# =========================
+
+_DATE_HEADERS = ("data", "date", "dt")
+_DESCRIPTION_HEADERS = ("descri", "hist", "memo", "lanc", "detalhe", "estabelecimento")
+_AMOUNT_HEADERS = ("valor", "amount", "montante", "quantia")
+
+
+def _find_column(header: Sequence[str], prefixes, skip=()) -> Optional[int]:
+    for i, name in enumerate(header):
+        if i not in skip and any(_normalize(name).startswith(p) for p in prefixes):
+            return i
+    return None
+
+
+def parse_csv(data: bytes) -> List[StatementLine]:
+    text = _decode(data)
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=";,\t")
+    except csv.Error:
+        dialect = csv.excel
+    rows = list(csv.reader(io.StringIO(text), dialect))
+    if not rows:
+        return []
+
+    header = rows[0]
+    date_col = _find_column(header, _DATE_HEADERS)
+    amount_col = _find_column(header, _AMOUNT_HEADERS, skip={date_col})
+    desc_col = _find_column(header, _DESCRIPTION_HEADERS, skip={date_col, amount_col})
+    if date_col is None or amount_col is None:
+        raise ValueError("CSV sem colunas de data e valor (cabeçalhos esperados: Data, Descrição, Valor)")
+
+    lines = []
+    seen = {}
+    for row in rows[1:]:
+        if len(row) <= max(date_col, amount_col):
+            continue
+        description = row[desc_col].strip() if desc_col is not None and desc_col < len(row) else ""
+        if _normalize(description).startswith("saldo"):
+            continue
+        try:
+            date = parse_date(row[date_col])
+            amount = parse_amount(row[amount_col])
+        except ValueError:
+            continue   # linhas de total/rodapé
+        key = (date.date(), f"{amount:.2f}", _normalize(description))
+        seen[key] = seen.get(key, 0) + 1
+        lines.append(StatementLine(date, amount, description, _hash("csv", *key, seen[key])))
+    return lines
+
+
+def parse_statement(filename: str, data: bytes) -> List[StatementLine]:
+    name = (filename or "").lower()
+    if name.endswith((".ofx", ".qfx")) or data.lstrip()[:20].upper().startswith((b"OFXHEADER", b"<?XML", b"<OFX")):
+        return parse_ofx(data)
+    return parse_csv(data)
+
+
+# =========================
+# 🏷️ REGRAS DE CATEGORIA
+# =========================
+
+def default_rules() -> List[Tuple[str, str]]:
+    if STATEMENT_RULES_FILE and os.path.exists(STATEMENT_RULES_FILE):
+        with open(STATEMENT_RULES_FILE, encoding="utf-8") as f:
+            return [(r["pattern"], r["category"]) for r in json.load(f)]
+    return list(DEFAULT_RULES)
+
+
+def rules_to_text(rules: Sequence[Tuple[str, str]]) -> str:
+    return "\n".join(f"{pattern} => {category}" for pattern, category in rules)
+
+
+def rules_from_text(text: str) -> List[Tuple[str, str]]:
+    """Uma regra por linha: `expressão => Categoria`."""
+    rules = []
+    for line in (text or "").splitlines():
+        if "=>" not in line:
+            continue
+        pattern, category = (part.strip() for part in line.rsplit("=>", 1))
+        if pattern and category:
+            rules.append((pattern, category))
+    return rules
+
+
+def compile_rules(rules: Sequence[Tuple[str, str]]) -> List[Tuple[Pattern, str]]:
+    compiled = []
+    for pattern, category in rules:
+        try:
+            compiled.append((re.compile(_strip_accents(pattern), re.IGNORECASE), category))
+        except re.error as e:
+            raise ValueError(f"Regra inválida ({pattern}): {e}") from e
+    return compiled
+
+
+def categorize(description: str, rules: Sequence[Tuple[Pattern, str]], default: str = DEFAULT_CATEGORY) -> str:
+    text = _normalize(description)
+    for regex, category in rules:
+        if regex.search(text):
+            return category
+    return default
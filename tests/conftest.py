@@ -0,0 +1,59 @@
+# tests/conftest.py
+"""
+Os testes rodam num SQLite temporário (arquivo, para valer entre threads),
+nunca no DATABASE_URL do ambiente. TEST_DATABASE_URL troca o banco, ex.:
+
+    TEST_DATABASE_URL=postgresql://... python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# database.py lê as variáveis no import
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL") or (
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='peegflow_test_'), 'test.db')}"
+)
+os.environ.pop("READ_DATABASE_URL", None)
+
+
+@pytest.fixture(scope="session")
+def session_factory():
+    from database import SessionLocal, init_db
+
+    init_db()
+    return SessionLocal
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_product(db):
+    """Cria um produto de teste com SKU único e devolve o id."""
+    import time
+
+    from models import Product
+
+    def make(company_id: int = 1, stock: int = 0, **fields) -> int:
+        product = Product(company_id=company_id, name="Produto teste", sku=f"TEST-{time.time_ns()}",
+                          price_retail=10.0, price_wholesale=5.0, avg_cost=5.0, stock=stock,
+                          stock_min=1, version=1)
+        for name, value in fields.items():
+            setattr(product, name, value)
+        db.add(product)
+        db.commit()
+        return product.id
+
+    return make
+
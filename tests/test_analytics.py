@@ -0,0 +1,41 @@
+# tests/test_analytics.py
+"""Espelho Parquet (analytics.sync): linhas que chegam abaixo da marca d'água."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func
+
+from models import Sale
+
+analytics = pytest.importorskip("analytics")
+pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+
+
+def _sale(sale_id: int, company_id: int) -> Sale:
+    return Sale(id=sale_id, company_id=company_id, product_id=1, quantity=1, price=10.0, user_id=1,
+                date=datetime.utcnow())
+
+
+def test_row_committed_below_the_watermark_reaches_the_mirror(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, "ANALYTICS_DIR", str(tmp_path))
+    company_id = 9040
+    base = int(db.query(func.max(Sale.id)).scalar() or 0) + 10
+
+    # o id base + 1 fica "em voo": commita só depois do sync
+    db.add_all([_sale(base, company_id), _sale(base + 2, company_id)])
+    db.commit()
+    analytics.sync(db)
+    assert analytics.load_state()["sales"] == base + 2
+
+    db.add(_sale(base + 1, company_id))
+    db.commit()
+    copied = analytics.sync(db)
+    assert copied["sales"] == 1
+
+    ids = analytics.query("SELECT id FROM sales WHERE company_id = ? ORDER BY id", [company_id])["id"].tolist()
+    assert ids == [base, base + 1, base + 2]
+
+    # sem lacunas novas, o sync seguinte não copia nada nem duplica
+    assert analytics.sync(db)["sales"] == 0
+    assert analytics.report(company_id, "quantity", ())["quantity"].tolist() == [3]
@@ -0,0 +1,75 @@
+# tests/test_cashier_report.py
+"""Relatório por caixa: horas agregadas (CashierHour) + Sale acima da marca d'água == só Sale."""
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import services
+from models import Order, Sale
+
+COMPANY_ID = 9049
+DAY = datetime(2026, 1, 12)
+
+
+def _sell(db, when: datetime, user_id: int, lines) -> None:
+    order = Order(company_id=COMPANY_ID, user_id=user_id, date=when)
+    db.add(order)
+    db.flush()
+    db.add_all([Sale(order_id=order.id, company_id=COMPANY_ID, product_id=1, quantity=qty, price=price,
+                     user_id=user_id, date=when) for qty, price in lines])
+    db.commit()
+
+
+def _at(hour: int, minute: int) -> datetime:
+    return DAY + timedelta(hours=hour, minutes=minute)
+
+
+def _roll_up(db, hour: int, minute: int) -> int:
+    return services.roll_up_cashier_hours(
+        db, COMPANY_ID, _at(hour, minute) + timedelta(minutes=services.CASHIER_ROLLUP_LAG_MINUTES))
+
+
+def _report(db, by: str) -> pd.DataFrame:
+    df = services.get_cashier_report(db, COMPANY_ID, _at(8, 30), _at(10, 45), by)
+    return df.sort_values([c for c in ("user_id", "hour", "shift") if c in df.columns]).reset_index(drop=True)
+
+
+def _only_sales(db, by: str, monkeypatch) -> pd.DataFrame:
+    with monkeypatch.context() as m:
+        m.setattr(services, "_cashier_rollup_state", lambda *args: None)
+        return _report(db, by)
+
+
+@pytest.mark.parametrize("by", services.CASHIER_REPORT_GROUPS)
+def test_report_is_the_same_before_and_after_rollup(db, monkeypatch, by):
+    db.query(Sale).filter(Sale.company_id == COMPANY_ID).delete()
+    db.query(Order).filter(Order.company_id == COMPANY_ID).delete()
+    for model in (services.CashierHour, services.CashierRollup):
+        db.query(model).filter(model.company_id == COMPANY_ID).delete()
+    db.commit()
+
+    _sell(db, _at(8, 10), 901, [(1, 5.0)])            # antes do início do período
+    _sell(db, _at(8, 50), 901, [(2, 5.0), (1, 7.5)])
+    _sell(db, _at(9, 5), 902, [(1, 7.5)])
+    _sell(db, _at(9, 40), 901, [(3, 5.0)])
+    _sell(db, _at(10, 15), 902, [(1, 5.0)])           # hora em que a marca d'água está
+    _sell(db, _at(10, 30), 901, [(2, 7.5)])
+
+    before = _report(db, by)
+    assert _roll_up(db, 10, 20) > 0                    # agrega até 10:00
+    assert services._cashier_rollup_state(db, COMPANY_ID).rolled_until == _at(10, 0)
+    pd.testing.assert_frame_equal(_report(db, by), before)
+
+    # chegam depois da agregação: uma numa hora já agregada, outra na hora aberta
+    _sell(db, _at(9, 20), 902, [(4, 5.0)])
+    _sell(db, _at(10, 40), 902, [(1, 7.5)])
+    expected = _only_sales(db, by, monkeypatch)
+    assert not expected.equals(before)
+    pd.testing.assert_frame_equal(_report(db, by), expected)
+
+    assert _roll_up(db, 11, 20) > 0                    # refaz 9h e agrega 10h
+    assert services._cashier_rollup_state(db, COMPANY_ID).rolled_until == _at(11, 0)
+    pd.testing.assert_frame_equal(_report(db, by), expected)
+    assert _roll_up(db, 11, 30) == 0
+    pd.testing.assert_frame_equal(_report(db, by), expected)
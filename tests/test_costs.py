@@ -0,0 +1,72 @@
+# tests/test_costs.py
+"""Custo médio ponderado na reposição, custo por linha de venda e margem bruta."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import services
+from models import Product, Sale
+
+
+def _sell(db, company_id: int, product_id: int, qty: int) -> None:
+    ok, msg, _ = services.checkout_cart(db, company_id, 1, [{"id": product_id, "qty": qty}])
+    assert ok, msg
+
+
+def _unit_costs(db, company_id: int, product_id: int) -> list:
+    return [c for c, in db.query(Sale.unit_cost).filter(
+        Sale.company_id == company_id, Sale.product_id == product_id).order_by(Sale.id)]
+
+
+def _history(db, company_id: int, product_id: int) -> None:
+    """10 a R$ 4,00; vende 4; 10 a R$ 7,00 (média (4 × 6 + 7 × 10) / 16 = 5,875); vende 2."""
+    assert services.restock_product(db, company_id, product_id, 10, 4.0)[0]
+    _sell(db, company_id, product_id, 4)
+    assert services.restock_product(db, company_id, product_id, 10, 7.0)[0]
+    _sell(db, company_id, product_id, 2)
+
+
+def test_weighted_average_cost_and_margin(db, make_product):
+    company_id = 9046
+    start = datetime.utcnow() - timedelta(minutes=1)
+    product_id = make_product(company_id=company_id, stock=0, price_retail=10.0, price_wholesale=3.0)
+    _history(db, company_id, product_id)
+
+    db.expire_all()
+    assert db.get(Product, product_id).avg_cost == pytest.approx(5.875)
+    assert _unit_costs(db, company_id, product_id) == pytest.approx([4.0, 5.875])
+
+    # venda antiga, de antes do custo por linha
+    db.add(Sale(company_id=company_id, product_id=product_id, quantity=3, price=10.0, user_id=1,
+                date=datetime.utcnow()))
+    db.commit()
+
+    end = datetime.utcnow() + timedelta(minutes=1)
+    total = services.get_margin_report(db, company_id, start, end, "total").iloc[0]
+    assert total["quantity"] == 9
+    assert total["revenue"] == pytest.approx(90.0)
+    assert total["cost"] == pytest.approx(4 * 4.0 + 2 * 5.875)
+    assert total["margin"] == pytest.approx(90.0 - 27.75)
+    assert total["uncosted_qty"] == 3
+
+    by_product = services.get_margin_report(db, company_id, start, end, "product")
+    assert by_product["product_id"].tolist() == [product_id]
+    assert by_product.iloc[0]["margin_pct"] == pytest.approx((90.0 - 27.75) / 90.0 * 100)
+
+
+def test_backfill_rebuilds_the_same_costs(db, make_product, monkeypatch):
+    monkeypatch.setattr(services, "_costs_backfilled", False)
+    company_id = 9036
+    product_id = make_product(company_id=company_id, stock=0, price_retail=10.0, price_wholesale=3.0)
+    _history(db, company_id, product_id)
+
+    # dados de antes do custo médio: nada de avg_cost nem Sale.unit_cost
+    db.query(Product).filter(Product.id == product_id).update({Product.avg_cost: None})
+    db.query(Sale).filter(Sale.company_id == company_id, Sale.product_id == product_id).update({Sale.unit_cost: None})
+    db.commit()
+
+    assert services.backfill_product_costs(db) >= 1
+    db.expire_all()
+    assert db.get(Product, product_id).avg_cost == pytest.approx(5.875)
+    assert _unit_costs(db, company_id, product_id) == pytest.approx([4.0, 5.875])
+    assert services.backfill_product_costs(db, company_id) == 0   # só custos nulos: rodar de novo não muda nada
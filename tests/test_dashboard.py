@@ -0,0 +1,36 @@
+# tests/test_dashboard.py
+"""Janelas do Dashboard no mesmo relógio das vendas (utcnow), fora de UTC."""
+import time
+
+import pytest
+
+import live
+import services
+
+
+@pytest.fixture
+def utc_minus_3(monkeypatch):
+    if not hasattr(time, "tzset"):
+        pytest.skip("time.tzset indisponível")
+    monkeypatch.setenv("TZ", "America/Sao_Paulo")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_sale_just_made_counts_in_current_period(db, make_product, utc_minus_3):
+    company_id = 9026
+    product_id = make_product(company_id=company_id, stock=5)
+    ok, _, _ = services.checkout_cart(db, company_id, 1, [{"id": product_id, "qty": 2}])
+    assert ok
+
+    snap = services.compute_dashboard_snapshot(db, company_id, days=30)
+    assert snap["kpis"]["sales_count"] == 1
+    assert snap["kpis"]["revenue"] == pytest.approx(20.0)
+
+    agg = live.LiveAggregates(company_id, days=30)
+    agg.rebuild(db)
+    kpis = agg.snapshot()["kpis"]
+    assert kpis["sales_count"] == 1
+    assert kpis["today_orders"] == 1
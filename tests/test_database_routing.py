@@ -0,0 +1,103 @@
+# tests/test_database_routing.py
+"""Roteamento leitura/escrita (RoutingSession) com primário e réplica em dois arquivos SQLite."""
+import os
+
+import pytest
+from sqlalchemy import create_engine
+
+import database
+import services
+from models import Product
+
+COMPANY_ID = 9031
+
+
+@pytest.fixture
+def replica(session_factory, tmp_path, monkeypatch):
+    """Réplica num segundo arquivo, com um produto que o primário não tem."""
+    replica_engine = create_engine(f"sqlite:///{os.path.join(str(tmp_path), 'replica.db')}")
+    database.Base.metadata.create_all(bind=replica_engine)
+    with replica_engine.begin() as conn:
+        conn.execute(Product.__table__.insert().values(company_id=COMPANY_ID, name="Só na réplica", sku="REPLICA",
+                                                       stock=0, version=1))
+
+    monkeypatch.setattr(database, "read_engine", replica_engine)
+    monkeypatch.setattr(database.replica_health, "lag_probe", lambda bind: 0.0)
+    database.replica_health.reset()
+    yield replica_engine
+    database.replica_health.reset()
+    replica_engine.dispose()
+
+
+@pytest.fixture
+def primary_product(db, make_product):
+    make_product(company_id=COMPANY_ID, stock=3, sku="PRIMARY")
+    yield
+    db.query(Product).filter(Product.company_id == COMPANY_ID).delete()
+    db.commit()
+
+
+def _skus(db):
+    return sorted(p.sku for p in services.get_products(db, COMPANY_ID))
+
+
+def test_read_session_reads_from_replica(replica, primary_product):
+    db = database.get_read_session()
+    try:
+        assert _skus(db) == ["REPLICA"]
+    finally:
+        db.close()
+
+    # sessão comum: @read_only vai para a réplica, consultas soltas ficam no primário
+    db = database.SessionLocal()
+    try:
+        assert _skus(db) == ["REPLICA"]
+        assert [p.sku for p in db.query(Product).filter(Product.company_id == COMPANY_ID)] == ["PRIMARY"]
+    finally:
+        db.close()
+
+
+def test_session_that_wrote_reads_from_primary(replica, primary_product):
+    db = database.get_read_session()
+    try:
+        db.add(Product(company_id=COMPANY_ID, name="Novo", sku="FLUSHED", stock=0, version=1))
+        db.flush()
+        assert _skus(db) == ["FLUSHED", "PRIMARY"]
+    finally:
+        db.rollback()
+        db.close()
+
+
+def _replica_down(bind) -> float:
+    raise RuntimeError("réplica fora do ar")
+
+
+@pytest.mark.parametrize("probe", [
+    pytest.param(lambda bind: 60.0, id="atrasada"),
+    pytest.param(_replica_down, id="fora_do_ar"),
+])
+def test_unhealthy_replica_falls_back_to_primary(replica, primary_product, monkeypatch, probe):
+    monkeypatch.setattr(database, "READ_REPLICA_MAX_LAG", 5.0)
+    monkeypatch.setattr(database.replica_health, "lag_probe", probe)
+    database.replica_health.reset()
+
+    db = database.get_read_session()
+    try:
+        assert _skus(db) == ["PRIMARY"]
+    finally:
+        db.close()
+    assert not database.replica_health.usable()
+
+
+def test_init_db_runs_once(session_factory, monkeypatch):
+    calls = []
+    create_all = database.Base.metadata.create_all
+    monkeypatch.setattr(database.Base.metadata, "create_all", lambda **kw: calls.append(1) or create_all(**kw))
+    monkeypatch.setattr(database, "_schema_ready", False)
+
+    database.init_db()
+    database.init_db()
+    assert len(calls) == 1
+
+    database.init_db(force=True)
+    assert len(calls) == 2
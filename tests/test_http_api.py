@@ -0,0 +1,104 @@
+# tests/test_http_api.py
+"""API HTTP (http_api.py) contra o SQLite dos testes, via TestClient."""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import http_api
+import services
+from models import Company, User
+
+
+@pytest.fixture(scope="module")
+def client(session_factory):
+    with TestClient(http_api.app) as c:   # roda o lifespan (init_db + backfills)
+        yield c
+
+
+@pytest.fixture
+def api_user(db):
+    """Cria empresa + usuário e devolve (username, senha, company_id)."""
+    company = Company(name="Loja API")
+    db.add(company)
+    db.commit()
+    username = f"api-{company.id}"
+    db.add(User(username=username, password_hash=services.hash_password("segredo"), role="admin",
+                company_id=company.id))
+    db.commit()
+    return username, "segredo", company.id
+
+
+@pytest.fixture
+def auth(client, api_user):
+    username, password, _ = api_user
+    resp = client.post("/auth/token", json={"username": username, "password": password})
+    assert resp.status_code == 200
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+def test_auth_token(client, api_user):
+    username, password, company_id = api_user
+    assert client.post("/auth/token", json={"username": username, "password": "errada"}).status_code == 401
+
+    resp = client.post("/auth/token", json={"username": username, "password": password})
+    assert resp.status_code == 200
+    assert resp.json()["company_id"] == company_id
+    assert client.get("/products").status_code == 401
+    assert client.get("/products", headers={"Authorization": "Bearer lixo"}).status_code == 401
+
+
+def test_products_edit_with_version_conflict(client, auth):
+    body = {"name": "Café 500g", "sku": "CAF-500", "price_retail": 20.0, "price_wholesale": 12.0, "stock_min": 2}
+    assert client.post("/products", json=body, headers=auth).status_code == 201
+    assert client.post("/products", json=body, headers=auth).status_code == 400   # SKU repetido
+
+    listed = client.get("/products", params={"search": "CAF"}, headers=auth).json()
+    assert len(listed) == 1
+    product = listed[0]
+
+    resp = client.put(f"/products/{product['id']}", json=dict(body, name="Café 1kg", version=product["version"]),
+                      headers=auth)
+    assert resp.status_code == 200
+    assert resp.json()["version"] == product["version"] + 1
+
+    # segunda tela ainda com a versão antiga: 409 com os valores atuais
+    resp = client.put(f"/products/{product['id']}", json=dict(body, name="Café moído", version=product["version"]),
+                      headers=auth)
+    assert resp.status_code == 409
+    current = resp.json()["detail"]["current"]
+    assert current["name"] == "Café 1kg"
+    assert current["version"] == product["version"] + 1
+
+    assert client.put("/products/999999", json=body, headers=auth).status_code == 404
+
+
+def test_checkout_and_financial(client, auth):
+    body = {"name": "Pão", "sku": "PAO-1", "price_retail": 5.0, "price_wholesale": 2.0, "stock_min": 0}
+    assert client.post("/products", json=body, headers=auth).status_code == 201
+    product_id = client.get("/products", params={"search": "PAO-1"}, headers=auth).json()[0]["id"]
+    resp = client.post(f"/products/{product_id}/restock", json={"qty": 10, "cost_unit": 2.0}, headers=auth)
+    assert resp.status_code == 200
+
+    resp = client.post("/checkout", json={"items": [{"product_id": product_id, "qty": 3}], "payment": "PIX"},
+                       headers=auth)
+    assert resp.status_code == 201
+    assert resp.json()["receipt_number"] is not None
+
+    resp = client.post("/checkout", json={"items": [{"product_id": product_id, "qty": 100}]}, headers=auth)
+    assert resp.status_code == 400   # estoque insuficiente
+
+    # despesa sem data: gravada em UTC, cai na mesma janela das vendas
+    assert client.post("/expenses", json={"description": "Gás", "amount": 4.0}, headers=auth).status_code == 201
+
+    now = datetime.utcnow()
+    params = {"start": (now - timedelta(hours=1)).isoformat(), "end": (now + timedelta(minutes=1)).isoformat()}
+    resp = client.get("/financial", params=params, headers=auth)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["orders"] == 1
+    assert data["sales_total"] == pytest.approx(15.0)
+    assert data["revenue"] == pytest.approx(15.0)
+    # a reposição também é lançada como despesa
+    assert data["expenses_total"] == pytest.approx(24.0)
+    assert data["balance"] == pytest.approx(15.0 - 24.0)
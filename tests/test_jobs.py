@@ -0,0 +1,39 @@
+# tests/test_jobs.py
+"""Poda do cache de relatórios em disco (JobManager._cleanup)."""
+import os
+import time
+
+import jobs
+
+
+def _write(path: str, size: int, age: float) -> None:
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    when = time.time() - age
+    os.utime(path, (when, when))
+
+
+def test_cleanup_prunes_report_files_by_age_and_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "REPORTS_PRUNE_SECONDS", 0)
+    manager = jobs.JobManager(reports_dir=str(tmp_path), keep_files_seconds=3600, max_bytes=250)
+    manager.register("txt", lambda params, progress, out: _write(out, 100, 0), "txt", "text/plain")
+
+    _write(str(tmp_path / "expirado.txt"), 10, 7200)
+    _write(str(tmp_path / "caido.txt.abc.tmp"), 10, 7200)
+    _write(str(tmp_path / "recente.tmp"), 10, 60)
+    _write(str(tmp_path / "antigo.txt"), 100, 600)
+    _write(str(tmp_path / "novo.txt"), 100, 300)
+
+    job = manager.submit("txt", {"n": 1})
+    while not job.finished:
+        time.sleep(0.01)
+    manager.submit("txt", {"n": 2})   # roda a poda de novo, com o arquivo do job em disco
+
+    left = sorted(os.listdir(tmp_path))
+    # idade: sai o vencido e a sobra .tmp de processo que caiu
+    assert "expirado.txt" not in left and "caido.txt.abc.tmp" not in left
+    # tamanho: o menos usado sai primeiro; o do job em memória fica
+    assert "antigo.txt" not in left
+    assert "novo.txt" in left and "recente.tmp" in left
+    assert os.path.basename(job.path) in left
+    assert job.read_bytes() == b"x" * 100
@@ -0,0 +1,96 @@
+# tests/test_product_edits.py
+"""Edições de cadastro concorrentes (versão otimista) com vendas no mesmo produto."""
+import threading
+
+import services
+
+CASHIERS = 4
+SALES = 30
+EDITORS = 4
+EDITS = 15
+
+
+def test_concurrent_edits_and_sales_lose_nothing(db, session_factory, make_product):
+    company_id = 9047
+    initial_stock = CASHIERS * SALES
+    product_id = make_product(company_id=company_id, stock=initial_stock)
+
+    lock = threading.Lock()
+    # todos os editores partem da mesma versão: a primeira rodada sempre disputa
+    same_start = threading.Barrier(EDITORS)
+    sold, accepted, conflicts, errors = [0], [0], [0], []
+
+    def cashier():
+        session = session_factory()
+        try:
+            for _ in range(SALES):
+                try:
+                    ok, _ = services.process_sale(session, product_id, 1, "varejo", 1, company_id)
+                except Exception as exc:
+                    with lock:
+                        errors.append(repr(exc))
+                    continue
+                with lock:
+                    sold[0] += int(ok)
+        finally:
+            session.close()
+
+    def editor():
+        # cada edição soma 1 ao estoque mínimo a partir da versão lida
+        session = session_factory()
+        try:
+            row = services._product_row(session, company_id, product_id)
+            same_start.wait()
+            done = 0
+            while done < EDITS:
+                try:
+                    ok, _, current = services.update_product(
+                        session, company_id, product_id, row.name, row.sku, row.price_retail,
+                        row.price_wholesale, row.stock_min + 1, version=row.version
+                    )
+                except Exception as exc:
+                    with lock:
+                        errors.append(repr(exc))
+                    row = services._product_row(session, company_id, product_id)
+                    continue
+                with lock:
+                    accepted[0] += int(ok)
+                    conflicts[0] += int(not ok)
+                done += int(ok)
+                row = current
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=cashier) for _ in range(CASHIERS)]
+    threads += [threading.Thread(target=editor) for _ in range(EDITORS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert accepted[0] == EDITORS * EDITS
+    assert conflicts[0] > 0
+    final = services._product_row(db, company_id, product_id)
+    # nenhuma edição perdida: cada aceita somou 1 e subiu a versão
+    assert final.stock_min == 1 + accepted[0]
+    assert final.version == 1 + accepted[0]
+    # nenhuma baixa perdida: as edições não sobrescrevem o estoque
+    assert final.stock == initial_stock - sold[0]
+
+
+def test_stale_version_is_rejected_with_current_values(db, make_product):
+    company_id = 9048
+    product_id = make_product(company_id=company_id, stock=10)
+    base = services._product_row(db, company_id, product_id)
+
+    ok, _, saved = services.update_product(db, company_id, product_id, "Primeira", base.sku, base.price_retail,
+                                           base.price_wholesale, base.stock_min, version=base.version)
+    assert ok and saved.version == base.version + 1
+
+    ok, msg, current = services.update_product(db, company_id, product_id, "Segunda", base.sku, base.price_retail,
+                                               base.price_wholesale, base.stock_min, version=base.version)
+    assert not ok
+    assert msg == services.PRODUCT_EDIT_CONFLICT
+    assert current.name == "Primeira"
+    assert current.version == saved.version
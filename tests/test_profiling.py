@@ -0,0 +1,29 @@
+# tests/test_profiling.py
+"""Poda dos .pstats gravados em PROFILE_DIR a cada rerun perfilado."""
+import os
+import time
+
+import profiling
+
+
+def _write(path: str, age: float) -> None:
+    with open(path, "wb") as f:
+        f.write(b"x")
+    when = time.time() - age
+    os.utime(path, (when, when))
+
+
+def test_rerun_prunes_stats_by_count_and_age(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_KEEP_FILES", 3)
+    monkeypatch.setattr(profiling, "PROFILE_KEEP_DAYS", 1)
+
+    _write(str(tmp_path / "vencido.pstats"), 2 * 86400)
+    for k in range(4):
+        _write(str(tmp_path / f"antigo-{k}.pstats"), 3600 * (k + 1))    # antigo-0 é o mais novo
+
+    with profiling.rerun("pagina", "cprofile") as run:
+        sum(range(1000))
+
+    left = sorted(os.listdir(tmp_path))
+    assert left == sorted(["antigo-0.pstats", "antigo-1.pstats", os.path.basename(run.stats_path), "timings.jsonl"])
@@ -0,0 +1,81 @@
+# tests/test_receipts.py
+"""Numeração de cupons com vários terminais fechando vendas ao mesmo tempo."""
+import random
+import threading
+
+import receipts
+import services
+from models import Order
+
+TERMINALS = 8
+SALES = 25
+
+
+def test_concurrent_terminals_never_repeat_or_skip_numbers(db, session_factory, make_product, monkeypatch):
+    # blocos pequenos: muitos terminais disputando o contador da empresa
+    monkeypatch.setattr(receipts, "allocator", receipts.ReceiptAllocator(block_size=5))
+    company_id = 9043
+    product_id = make_product(company_id=company_id, stock=TERMINALS * SALES)
+
+    lock = threading.Lock()
+    sold, failed, errors = [0], [0], []
+
+    def terminal(n: int):
+        session = session_factory()
+        rng = random.Random(n)
+        try:
+            for _ in range(SALES):
+                # parte das vendas falha de propósito: o número volta e é reaproveitado
+                qty = 10 ** 9 if rng.random() < 0.1 else 1
+                try:
+                    ok, _, _ = services.checkout_cart(session, company_id, 1, [{"id": product_id, "qty": qty}],
+                                                      terminal=f"test-{n}")
+                except Exception as exc:
+                    with lock:
+                        errors.append(repr(exc))
+                    continue
+                with lock:
+                    sold[0] += int(ok)
+                    failed[0] += int(not ok)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=terminal, args=(n,)) for n in range(TERMINALS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert failed[0] > 0
+    numbers = [n for n, in db.query(Order.receipt_number).filter(Order.company_id == company_id).all()]
+    assert len(numbers) == sold[0]
+    assert None not in numbers
+    assert len(set(numbers)) == len(numbers)
+
+    check = receipts.check_receipt_numbers(db, company_id)
+    assert check["duplicates"] == []
+    assert check["holes"] == []
+    assert check["outside"] == 0
+    assert check["used"] == sold[0]
+    assert check["ok"]
+
+
+def test_number_given_back_before_restart_is_not_a_hole(db, make_product, monkeypatch):
+    company_id = 9044
+    allocator = receipts.ReceiptAllocator(block_size=5)
+    first, second = allocator.take(company_id, "T1"), allocator.take(company_id, "T1")
+    allocator.give_back(company_id, first, "T1")           # venda que falhou
+    db.add(Order(company_id=company_id, receipt_number=second, terminal="T1"))
+    db.commit()
+
+    # terminal reiniciado antes de reaproveitar o número devolvido
+    monkeypatch.setattr(receipts, "allocator", receipts.ReceiptAllocator(block_size=5))
+    product_id = make_product(company_id=company_id, stock=1)
+    ok, _, _ = services.checkout_cart(db, company_id, 1, [{"id": product_id, "qty": 1}], terminal="T1")
+    assert ok
+
+    check = receipts.check_receipt_numbers(db, company_id)
+    assert check["holes"] == []
+    assert check["returned"] == 1
+    assert check["ok"]
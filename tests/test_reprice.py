@@ -0,0 +1,63 @@
+# tests/test_reprice.py
+"""Reajuste em massa: UPDATE ... CASE id em blocos, versão do cadastro e final .90."""
+import numpy as np
+import pytest
+
+import services
+from models import Product
+
+
+def _prices(db, ids):
+    rows = db.query(Product.id, Product.price_retail, Product.price_wholesale, Product.version).filter(
+        Product.id.in_(ids)).order_by(Product.id).all()
+    return {r.id: (r.price_retail, r.price_wholesale, r.version) for r in rows}
+
+
+def test_reprice_over_several_chunks(db, make_product, monkeypatch):
+    monkeypatch.setattr(services, "REPRICE_CHUNK", 3)
+    company_id = 9041
+    selected = [make_product(company_id=company_id, sku=f"RPC-{k}", price_retail=10.0 * k, price_wholesale=4.0 * k)
+                for k in range(1, 8)]                                      # 7 produtos = 3 blocos
+    other_sku = make_product(company_id=company_id, sku="OUT-1", price_retail=30.0, price_wholesale=12.0)
+    above_band = make_product(company_id=company_id, sku="RPC-99", price_retail=500.0, price_wholesale=200.0)
+    other_company = make_product(company_id=company_id + 1, sku="RPC-1", price_retail=10.0, price_wholesale=4.0)
+    untouched = [other_sku, above_band, other_company]
+    before = _prices(db, untouched)
+
+    filters = {"sku_pattern": "RPC-*", "price_max": 100.0}
+    preview = services.preview_reprice(db, company_id, ("price_retail",), "percent", 10, 0.90, **filters)
+    assert preview["id"].tolist() == selected
+    # +10% e final ,90 mais próximo: 11,00 -> 10,90; 22,00 -> 21,90 ...
+    expected = [round(11.0 * k - 0.1, 2) for k in range(1, 8)]
+    assert preview["new_price_retail"].tolist() == pytest.approx(expected)
+
+    ok, msg = services.apply_reprice(db, company_id, ("price_retail",), "percent", 10, 0.90, **filters)
+    assert ok, msg
+    assert msg == "7 produto(s) reajustado(s)"
+
+    db.expire_all()
+    after = _prices(db, selected)
+    assert [after[i][0] for i in selected] == pytest.approx(expected)
+    assert [after[i][1] for i in selected] == pytest.approx([4.0 * k for k in range(1, 8)])   # custo intacto
+    assert all(after[i][2] == 2 for i in selected)
+    assert _prices(db, untouched) == before
+
+
+def test_markup_over_cost(db, make_product):
+    company_id = 9042
+    ids = [make_product(company_id=company_id, sku=f"MK-{k}", price_retail=1.0, price_wholesale=c)
+           for k, c in enumerate((2.0, 7.5))]
+    ok, _ = services.apply_reprice(db, company_id, ("price_retail",), "markup", 100, None)
+    assert ok
+    db.expire_all()
+    assert [p[0] for p in _prices(db, ids).values()] == pytest.approx([4.0, 15.0])
+
+    ok, msg = services.apply_reprice(db, company_id, ("price_wholesale",), "markup", 100, None)
+    assert not ok and "custo" in msg
+
+
+def test_psychological_round():
+    prices = np.array([12.37, 12.61, 0.30])
+    assert services._psychological_round(prices, 0.90).tolist() == pytest.approx([11.90, 12.90, 0.30])
+    assert services._psychological_round(prices, 0.99).tolist() == pytest.approx([11.99, 12.99, 0.30])
+    assert services._psychological_round(np.array([12.346]), None).tolist() == pytest.approx([12.35])
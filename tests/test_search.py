@@ -0,0 +1,46 @@
+# tests/test_search.py
+"""Busca por texto: %, _ e \\ digitados pelo usuário são literais no LIKE."""
+from datetime import datetime, timedelta
+
+import services
+from models import Expense
+
+
+def _names(db, company_id: int, search: str) -> list:
+    return sorted(p.name for p in services.get_products(db, company_id, search))
+
+
+def test_product_search_treats_wildcards_as_text(db, make_product):
+    company_id = 9028
+    for name in ("50% off", "5 a 10 off", "Caneca_azul", "Caneca azul", "Pasta C:\\docs"):
+        make_product(company_id=company_id, name=name)
+
+    assert _names(db, company_id, "5_") == []
+    assert _names(db, company_id, "50%") == ["50% off"]
+    assert _names(db, company_id, "%") == ["50% off"]
+    assert _names(db, company_id, "caneca_") == ["Caneca_azul"]
+    assert _names(db, company_id, "c:\\d") == ["Pasta C:\\docs"]
+
+
+def test_reprice_filters_escape_everything_but_the_sku_star(db, make_product):
+    company_id = 9029
+    ids = {sku: make_product(company_id=company_id, sku=sku, name=name)
+           for sku, name in (("A_1", "Kit 100%"), ("AB1", "Kit 1000"), ("A_2", "Kit 100% extra"))}
+
+    selected = services.preview_reprice(db, company_id, ("price_retail",), "percent", 10, None, sku_pattern="A_*")
+    assert sorted(selected["id"]) == sorted([ids["A_1"], ids["A_2"]])
+    selected = services.preview_reprice(db, company_id, ("price_retail",), "percent", 10, None, name_contains="100%")
+    assert sorted(selected["id"]) == sorted([ids["A_1"], ids["A_2"]])
+
+
+def test_expense_search_treats_wildcards_as_text(db):
+    company_id = 9030
+    now = datetime.utcnow()
+    db.add_all([Expense(company_id=company_id, description=d, amount=1.0, category="Outros", date=now)
+                for d in ("Taxa 5% cartão", "Taxa 50 boleto")])
+    db.commit()
+
+    df, total = services.get_expenses_page(db, company_id, now - timedelta(days=1), now + timedelta(days=1),
+                                           search="5%")
+    assert total == 1
+    assert df["description"].tolist() == ["Taxa 5% cartão"]
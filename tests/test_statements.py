@@ -0,0 +1,89 @@
+# tests/test_statements.py
+"""Importação de extrato (OFX/CSV) idempotente: import_hash + índice único por empresa."""
+import services
+from models import Expense
+
+
+def _ofx(transactions) -> bytes:
+    body = "\n".join(
+        f"<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>{day}120000[-3:BRT]\n<TRNAMT>{amount}\n<FITID>{fitid}\n<MEMO>{memo}\n</STMTTRN>"
+        for fitid, day, amount, memo in transactions
+    )
+    return ("OFXHEADER:100\nDATA:OFXSGML\nCHARSET:1252\n\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS>"
+            "<BANKACCTFROM><BANKID>0341<ACCTID>12345</BANKACCTFROM><BANKTRANLIST>\n"
+            f"{body}\n</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>").encode("cp1252")
+
+
+JANUARY = [
+    ("0001", "20250103", "-120.00", "PAG ENERGIA ENEL"),
+    ("0002", "20250105", "-2500.00", "ALUGUEL LOJA"),
+    ("0003", "20250107", "800.00", "PIX RECEBIDO"),      # entrada: não vira despesa
+    ("0004", "20250110", "-12.90", "TARIFA BANCARIA"),
+]
+# extrato seguinte repete os dois últimos lançamentos de janeiro
+OVERLAP = JANUARY[2:] + [
+    ("0005", "20250201", "-99.90", "INTERNET FIBRA"),
+    ("0006", "20250203", "-45.00", "PAG AGUA SABESP"),
+]
+
+CSV = ("Data;Histórico;Valor\n"
+       "01/02/2025;SALDO ANTERIOR;1.000,00\n"
+       "03/02/2025;Café;-5,00\n"
+       "03/02/2025;Café;-5,00\n"            # duas compras iguais no mesmo dia: ambas contam
+       "04/02/2025;Conta de Luz;-1.234,56\n"
+       "05/02/2025;PIX recebido;300,00\n").encode("cp1252")
+
+
+def _count(db, company_id: int) -> int:
+    return db.query(Expense).filter(Expense.company_id == company_id).count()
+
+
+def test_ofx_import_twice_is_idempotent(db):
+    company_id = 9451
+    ok, _ = services.import_bank_statement(db, company_id, "janeiro.ofx", _ofx(JANUARY))
+    assert ok
+    assert _count(db, company_id) == 3
+
+    ok, msg = services.import_bank_statement(db, company_id, "janeiro.ofx", _ofx(JANUARY))
+    assert ok and msg.startswith("Nada novo")
+    assert _count(db, company_id) == 3
+    assert services.preview_bank_statement(db, company_id, "janeiro.ofx", _ofx(JANUARY))["duplicate"].all()
+
+
+def test_csv_import_twice_is_idempotent(db):
+    company_id = 9452
+    ok, _ = services.import_bank_statement(db, company_id, "extrato.csv", CSV)
+    assert ok
+    assert _count(db, company_id) == 3
+
+    ok, msg = services.import_bank_statement(db, company_id, "extrato.csv", CSV)
+    assert ok and msg.startswith("Nada novo")
+    assert _count(db, company_id) == 3
+    amounts = sorted(a for a, in db.query(Expense.amount).filter(Expense.company_id == company_id))
+    assert amounts == [5.0, 5.0, 1234.56]
+
+
+def test_overlapping_statement_imports_only_new_lines(db):
+    company_id = 9453
+    services.import_bank_statement(db, company_id, "janeiro.ofx", _ofx(JANUARY))
+
+    ok, msg = services.import_bank_statement(db, company_id, "fevereiro.ofx", _ofx(OVERLAP))
+    assert ok
+    assert msg == "2 despesa(s) importada(s), 1 já existente(s)"
+    assert _count(db, company_id) == 5
+
+    preview = services.preview_bank_statement(db, company_id, "fevereiro.ofx", _ofx(OVERLAP))
+    assert preview["duplicate"].all()
+
+
+def test_concurrent_import_is_rejected_by_unique_index(db, monkeypatch):
+    company_id = 9454
+    services.import_bank_statement(db, company_id, "janeiro.ofx", _ofx(JANUARY))
+
+    # outra sessão gravou entre a checagem e o INSERT: só o índice único barra
+    real = services._statement_expenses
+    monkeypatch.setattr(services, "_statement_expenses",
+                        lambda *a, **kw: [(line, cat, False) for line, cat, _ in real(*a, **kw)])
+    ok, _ = services.import_bank_statement(db, company_id, "janeiro.ofx", _ofx(JANUARY))
+    assert not ok
+    assert _count(db, company_id) == 3
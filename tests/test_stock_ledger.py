@@ -0,0 +1,49 @@
+# tests/test_stock_ledger.py
+"""Razão de estoque: último corte + movimentos posteriores == Product.stock."""
+from datetime import datetime, timedelta
+
+import services
+from models import Product, StockMovement, StockSnapshot
+
+
+def _stock(db, company_id: int) -> dict:
+    return {pid: stock for pid, stock in db.query(Product.id, Product.stock).filter(Product.company_id == company_id)}
+
+
+def test_snapshot_plus_later_movements_match_product_stock(db, make_product, monkeypatch):
+    # o corte é feito aqui, não pela thread disparada pelas escritas
+    monkeypatch.setattr(services, "_count_stock_movements", lambda *args, **kwargs: None)
+    monkeypatch.setattr(services, "_ledger_backfilled", False)
+    company_id = 9035
+
+    legacy = make_product(company_id=company_id, stock=7)          # anterior ao razão: sem movimento
+    assert services.backfill_stock_ledger(db) >= 1
+    a = make_product(company_id=company_id, stock=0)
+    b = make_product(company_id=company_id, stock=0)
+
+    assert services.restock_product(db, company_id, a, 20, 5.0)[0]
+    assert services.restock_product(db, company_id, b, 8, 3.0)[0]
+    assert services.checkout_cart(db, company_id, 1, [{"id": a, "qty": 3}, {"id": b, "qty": 2}])[0]
+    assert services.adjust_stock(db, company_id, a, 15)[0]           # contagem: sumiram 2
+
+    # tudo isso aconteceu antes do corte de hoje à meia-noite
+    db.query(StockMovement).filter(StockMovement.company_id == company_id).update(
+        {StockMovement.date: datetime.utcnow() - timedelta(days=2)}, synchronize_session=False)
+    db.commit()
+    assert services.take_stock_snapshots(db, company_id) == 3
+    snap = {pid: stock for pid, stock in db.query(StockSnapshot.product_id, StockSnapshot.stock).filter(
+        StockSnapshot.company_id == company_id)}
+    assert snap == {legacy: 7, a: 15, b: 6}
+
+    # movimentos depois do corte
+    assert services.checkout_cart(db, company_id, 1, [{"id": a, "qty": 4}, {"id": legacy, "qty": 1}])[0]
+    assert services.restock_product(db, company_id, b, 10, 4.0)[0]
+    assert services.adjust_stock(db, company_id, b, 15)[0]
+
+    db.expire_all()
+    assert _stock(db, company_id) == {legacy: 6, a: 11, b: 15}
+    assert services._ledger_balances(db, company_id) == _stock(db, company_id)
+    assert services.verify_stock_ledger(db, company_id).empty
+    # saldo no instante do corte continua o do corte
+    cut = db.query(StockSnapshot.taken_at).filter(StockSnapshot.company_id == company_id).first()[0]
+    assert services.get_stock_at(db, company_id, cut) == snap
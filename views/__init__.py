@@ -0,0 +1,44 @@
+# views/__init__.py
+"""
+Páginas do app. Cada módulo expõe render(db, cid) e só é importado na
+primeira vez que a página é aberta, então o login e o PDV não pagam o
+import de pandas/plotly/fpdf das outras telas.
+"""
+import importlib
+import sys
+import time
+
+import profiling
+
+PAGES = {
+    "📊 Dashboard": "views.dashboard",
+    "🛒 Checkout (PDV)": "views.pdv",
+    "💰 Fluxo Financeiro": "views.financeiro",
+    "📦 Estoque": "views.estoque",
+    "📈 Análises": "views.analises",
+    "🏢 Multiempresa": "views.multiempresa",
+}
+
+# Segundos gastos no primeiro import de cada página (neste processo)
+IMPORT_TIMES = {}
+
+
+def load(choice: str):
+    module_name = PAGES[choice]
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    t0 = time.perf_counter()
+    module = importlib.import_module(module_name)
+    IMPORT_TIMES[choice] = time.perf_counter() - t0
+    return module
+
+
+def slug(choice: str) -> str:
+    """Nome curto da página (ex.: "dashboard"), usado no perfilamento."""
+    return PAGES[choice].rsplit(".", 1)[-1]
+
+
+def render(choice: str, db, cid: int) -> None:
+    with profiling.section("import"):
+        module = load(choice)
+    module.render(db, cid)
@@ -0,0 +1,96 @@
+# views/analises.py
+from datetime import datetime
+
+import streamlit as st
+
+import analytics
+import profiling
+from jobs import report_jobs
+
+METRIC_LABELS = {
+    "Faturamento líquido (cupons)": "revenue",
+    "Nº de cupons": "orders",
+    "Descontos concedidos": "discount",
+    "Faturamento bruto (itens)": "gross_revenue",
+    "Unidades vendidas": "quantity",
+    "Despesas": "expenses",
+}
+DIMENSION_LABELS = {
+    "Ano": "year",
+    "Mês": "month",
+    "Semana": "week",
+    "Dia": "day",
+    "Dia da semana": "weekday",
+    "Hora": "hour",
+    "Produto": "product",
+    "Categoria": "category",
+    "Forma de pagamento": "payment",
+    "Operador": "user",
+}
+
+
+def render(db, cid: int):
+    st.title("Análises Históricas")
+    st.markdown("Consultas de longo prazo sobre a cópia colunar (Parquet) das vendas, cupons e despesas.")
+
+    if not analytics._duckdb_available():
+        st.info("Instale duckdb e pyarrow para habilitar as análises históricas.")
+        return
+
+    # a cópia roda no pool de jobs; a tela usa o último espelho completo
+    c_sync1, c_sync2 = st.columns([0.75, 0.25])
+    force = c_sync2.button("🔄 Sincronizar agora", use_container_width=True)
+    with profiling.section("sync"):
+        job = analytics.sync_in_background(force=force)
+    if job is not None:
+        st.session_state["an_sync_job"] = job.id
+    job = report_jobs.get(st.session_state.get("an_sync_job", ""))
+
+    state = analytics.load_state()
+    if state.get("synced_at"):
+        c_sync1.caption(f"Última sincronização: {datetime.fromtimestamp(state['synced_at']).strftime('%d/%m/%Y %H:%M:%S')}")
+    if job is not None and not job.finished:
+        @st.fragment(run_every=1.0)
+        def _sync_status():
+            if job.finished:
+                st.rerun()   # espelho novo: refaz a tela com os dados atualizados
+            st.caption("🔄 Sincronizando em segundo plano; os números abaixo são do último espelho.")
+
+        with c_sync1:
+            _sync_status()
+    elif job is not None and job.status == "error":
+        c_sync1.caption(f"⚠️ Última sincronização falhou: {job.error}")
+
+    c1, c2 = st.columns(2)
+    metric = METRIC_LABELS[c1.selectbox("Métrica", list(METRIC_LABELS.keys()), key="an_metric")]
+    table = analytics.METRICS[metric][0]
+    dim_options = [label for label, dim in DIMENSION_LABELS.items() if table in analytics.DIMENSIONS[dim][1]]
+    dims = c2.multiselect("Agrupar por", dim_options, default=["Mês"], key="an_dims")
+
+    use_period = st.checkbox("Filtrar período", key="an_use_period")
+    start_date = end_date = None
+    if use_period:
+        c_per1, c_per2 = st.columns(2)
+        inicio = c_per1.date_input("Data Início", datetime.now().replace(month=1, day=1), key="an_inicio")
+        fim = c_per2.date_input("Data Fim", datetime.now(), key="an_fim")
+        start_date = datetime.combine(inicio, datetime.min.time())
+        end_date = datetime.combine(fim, datetime.max.time())
+
+    by = [DIMENSION_LABELS[label] for label in dims]
+    with profiling.section("consulta"):
+        df = analytics.report(cid, metric, by, start_date=start_date, end_date=end_date)
+
+    if df.empty:
+        st.info("Sem dados para os filtros escolhidos.")
+        return
+
+    labels = {v: k for k, v in {**METRIC_LABELS, **DIMENSION_LABELS}.items()}
+    if len(by) == 1:
+        st.bar_chart(df.set_index(by[0])[metric])
+    st.dataframe(df.rename(columns=labels), use_container_width=True, hide_index=True)
+    st.download_button(
+        "📥 Baixar CSV",
+        df.rename(columns=labels).to_csv(index=False).encode("utf-8"),
+        file_name=f"analise_{metric}.csv",
+        mime="text/csv",
+    )
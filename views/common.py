@@ -0,0 +1,157 @@
+# views/common.py
+import secrets
+import time
+from datetime import datetime, timezone
+
+import streamlit as st
+
+import services as api
+from cart import Cart
+from session_store import SESSION_TTL, session_store
+
+
+def brl(v: float) -> str:
+    try:
+        # Formato brasileiro simples (sem locale)
+        s = f"{float(v):,.2f}"
+        s = s.replace(",", "X").replace(".", ",").replace("X", ".")
+        return f"R$ {s}"
+    except Exception:
+        return "R$ 0,00"
+
+
+def local_time(dt: datetime) -> datetime:
+    """Data gravada em UTC (utcnow) na hora local do servidor, só para exibir."""
+    return dt.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+# --- Tabelas paginadas (ordenação/filtro/página feitos no banco) ---
+def reset_page(page_key: str):
+    st.session_state[page_key] = 1
+
+def current_page(page_key: str) -> int:
+    return int(st.session_state.get(page_key, 1) or 1)
+
+def paged_table_controls(key: str, sort_labels: dict):
+    c1, c2, c3 = st.columns([0.45, 0.3, 0.25])
+    label = c1.selectbox("Ordenar por", list(sort_labels.keys()), key=f"{key}_sort",
+                         on_change=reset_page, args=(f"{key}_page",))
+    descending = c2.toggle("Decrescente", value=True, key=f"{key}_desc",
+                           on_change=reset_page, args=(f"{key}_page",))
+    page_size = c3.selectbox("Linhas", [25, 50, 100], key=f"{key}_size",
+                             on_change=reset_page, args=(f"{key}_page",))
+    return sort_labels[label], descending, int(page_size)
+
+def page_selector(page_key: str, total_rows: int, page_size: int):
+    pages = max(1, -(-int(total_rows) // int(page_size)))
+    if current_page(page_key) > pages:
+        st.session_state[page_key] = pages
+    st.number_input(f"Página (de {pages}) — {total_rows} linhas", min_value=1, max_value=pages,
+                    step=1, key=page_key)
+
+# --- Sessão compartilhada (session_store.py): login + carrinho fora do processo ---
+# O token assinado da sessão fica num cookie (SameSite=Strict), nunca na URL:
+# não vaza por histórico, link compartilhado ou log de proxy. A cada
+# restauração o id da sessão é trocado, então um token antigo não vale mais.
+SESSION_COOKIE = "peegflow_session"
+LEGACY_SESSION_PARAM = "s"   # token na URL (versões antigas): removido, nunca aceito
+SESSION_TOUCH_SECONDS = 300  # renova o TTL no máximo a cada 5 min sem mudanças
+
+def get_cart() -> Cart:
+    cart = st.session_state.get("cart")
+    if not isinstance(cart, Cart):
+        cart = Cart.from_dict({"items": cart}) if isinstance(cart, list) else Cart()
+        st.session_state["cart"] = cart
+    return cart
+
+def _set_session_cookie(token: str, max_age: int):
+    """
+    Grava o cookie de sessão via JavaScript (o Streamlit não expõe Set-Cookie).
+    Por isso ele não pode ser HttpOnly: fica legível em document.cookie.
+    """
+    # token gerado aqui (base64url + assinatura), sem entrada do usuário
+    st.html(
+        "<script>document.cookie = "
+        f"'{SESSION_COOKIE}={token}; Max-Age={int(max_age)}; Path=/; SameSite=Strict'"
+        " + (location.protocol === 'https:' ? '; Secure' : '');</script>",
+        unsafe_allow_javascript=True,
+    )
+
+def _new_session_token():
+    sid = secrets.token_urlsafe(24)
+    st.session_state['sid'] = sid
+    st.session_state['session_token'] = api.sign_token({"kind": "session", "sid": sid}, SESSION_TTL)
+
+def start_session(user):
+    st.session_state.update({
+        'logged_in': True,
+        'user_id': user.id,
+        'company_id': user.company_id,
+        'username': user.username,
+        'role': user.role
+    })
+    _new_session_token()
+    save_session(force=True)
+
+def restore_session() -> bool:
+    """
+    Recupera login e carrinho pelo cookie da sessão (outra réplica ou após
+    restart) e troca o id da sessão: o token antigo deixa de valer.
+    """
+    if LEGACY_SESSION_PARAM in st.query_params:
+        del st.query_params[LEGACY_SESSION_PARAM]
+    token = st.context.cookies.get(SESSION_COOKIE)
+    if not token:
+        return False
+    payload = api.verify_token(token)
+    data = session_store.get(payload["sid"]) if payload and payload.get("kind") == "session" else None
+    if not data:
+        _set_session_cookie("", 0)
+        return False
+
+    cart = Cart.from_dict(data.get("cart"))
+    st.session_state.update({
+        'logged_in': True,
+        'user_id': data["user_id"],
+        'company_id': data["company_id"],
+        'username': data["username"],
+        'role': data.get("role"),
+        'cart': cart,
+        'cart_saved_version': cart.version,
+        'session_saved_at': 0.0,
+        # widgets do desconto voltam com o valor salvo
+        'disc_type': cart.discount_type,
+        'disc_val_pct' if cart.discount_type == "%" else 'disc_val_brl': cart.discount_value,
+    })
+    _new_session_token()
+    save_session(force=True)
+    session_store.delete(payload["sid"])
+    return True
+
+def save_session(force: bool = False):
+    """Grava login + carrinho no store se o carrinho mudou (ou para renovar o TTL)."""
+    sid = st.session_state.get("sid")
+    if not sid:
+        return
+    # todo rerun reenvia o cookie: o do login pode se perder no st.rerun() logo depois
+    _set_session_cookie(st.session_state["session_token"], SESSION_TTL)
+    cart = get_cart()
+    now = time.time()
+    changed = cart.version != st.session_state.get("cart_saved_version")
+    stale = now - st.session_state.get("session_saved_at", 0.0) > SESSION_TOUCH_SECONDS
+    if not (force or changed or stale):
+        return
+    session_store.put(sid, {
+        "user_id": st.session_state["user_id"],
+        "company_id": st.session_state["company_id"],
+        "username": st.session_state["username"],
+        "role": st.session_state.get("role"),
+        "cart": cart.to_dict(),
+    }, SESSION_TTL)
+    st.session_state["cart_saved_version"] = cart.version
+    st.session_state["session_saved_at"] = now
+
+def end_session():
+    sid = st.session_state.get("sid")
+    if sid:
+        session_store.delete(sid)
+    st.session_state.clear()
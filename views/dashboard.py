@@ -0,0 +1,89 @@
+# views/dashboard.py
+import streamlit as st
+
+import charts
+import live
+import profiling
+import services as api
+from views.common import brl, local_time
+
+
+def render(db, cid: int):
+    st.title("Dashboard Executivo")
+    st.markdown("Visão estratégica do seu negócio em tempo real.")
+
+    if st.toggle("🔴 Ao vivo", key="dash_live",
+                 help=f"Atualiza a cada {live.LIVE_REFRESH_SECONDS:.0f}s somando só as vendas e despesas novas."):
+        live_panel(db, cid)
+        return
+
+    with profiling.section("snapshot"):
+        snap = api.get_dashboard_snapshot(db, cid, days=30)
+    render_snapshot(snap, cid)
+
+
+# --- Modo ao vivo: só este fragmento roda a cada intervalo (live.py) ---
+@st.fragment(run_every=live.LIVE_REFRESH_SECONDS)
+def live_panel(db, cid: int):
+    with profiling.section("ao_vivo"):
+        snap = live.get_live_snapshot(db, cid, days=30)
+    kpis = snap["kpis"]
+
+    h1, h2, _ = st.columns([0.25, 0.25, 0.5])
+    h1.metric("Faturamento Hoje", brl(kpis["today_revenue"]))
+    h2.metric("Cupons Hoje", f"{kpis['today_orders']}")
+    render_snapshot(snap, cid)
+
+
+def render_snapshot(snap: dict, cid: int):
+    kpis = snap["kpis"]
+
+    rec_atual = kpis["revenue"]
+    lucro_atual = kpis["profit"]
+    qtd_vendas = kpis["sales_count"]
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Faturamento (30d)", brl(rec_atual), f"{brl(kpis['revenue_delta'])} vs mês ant.", delta_color="normal")
+    col2.metric("Lucro Líquido Est.", brl(lucro_atual),
+                "Margem: " + (f"{lucro_atual/rec_atual:.1%}" if rec_atual > 0 else "0%"),
+                delta_color="off")
+    col3.metric("Ticket Médio", brl(kpis["avg_ticket"]), help="Valor médio por cupom (já com desconto)")
+    col4.metric("Total Cupons", f"{qtd_vendas}", f"{qtd_vendas - kpis['sales_count_prev']} vs mês ant.")
+    st.caption(f"Atualizado às {local_time(snap['computed_at']).strftime('%H:%M:%S')}")
+
+    st.divider()
+
+    col_g1, col_g2 = st.columns([0.65, 0.35], gap="large")
+
+    with col_g1, profiling.section("mapa_calor"):
+        st.subheader("📈 Mapa de Calor de Vendas")
+        if kpis["sales_count"] > 0:
+            fig_heat = charts.cached_figure(cid, "heatmap", snap["version"],
+                                            lambda: charts.heatmap_figure(charts.heatmap_to_local(snap["heatmap"])))
+            st.plotly_chart(fig_heat, use_container_width=True)
+        else:
+            st.info("Sem dados suficientes para gerar o mapa de calor.")
+
+    with col_g2, profiling.section("top_produtos"):
+        st.subheader("🏆 Top Produtos")
+        top_names, top_values = snap["top_products"]
+        if top_names:
+            fig_bar = charts.cached_figure(cid, "top_products", snap["version"],
+                                           lambda: charts.top_products_figure(top_names, top_values))
+            st.plotly_chart(fig_bar, use_container_width=True)
+        else:
+            st.info("Sem vendas registradas.")
+
+        payment_mix = kpis["payment_mix"]
+        if payment_mix:
+            st.subheader("💳 Formas de Pagamento")
+            fig_pay = charts.cached_figure(cid, "payment_mix", snap["version"],
+                                           lambda: charts.payment_mix_figure(payment_mix))
+            st.plotly_chart(fig_pay, use_container_width=True)
+
+    st.subheader("Evolução Diária (Vendas vs Custos)")
+    with profiling.section("evolucao"):
+        if kpis["sales_count"] > 0:
+            fig_evol = charts.cached_figure(cid, "daily", snap["version"],
+                                            lambda: charts.daily_figure(snap["daily"]))
+            st.plotly_chart(fig_evol, use_container_width=True)
@@ -0,0 +1,381 @@
+# views/estoque.py
+from datetime import datetime, timedelta
+
+import pandas as pd
+import streamlit as st
+
+import profiling
+import services as api
+from views.common import brl
+
+
+def render(db, cid: int):
+    st.title("Gestão de Inventário Inteligente")
+
+    prods = api.get_products(db, cid)
+
+    data_list = []
+    low_stock_count = 0
+    for p in prods:
+        status = "🟢 OK"
+        if p.stock <= p.stock_min:
+            status = "🔴 BAIXO"
+            low_stock_count += 1
+
+        data_list.append({
+            "ID": p.id,
+            "SKU": p.sku,
+            "Produto": p.name,
+            "Preço Venda (R$)": p.price_retail,
+            "Custo Médio (R$)": p.avg_cost,
+            "Estoque Atual": p.stock,
+            "Mínimo": p.stock_min,
+            "Status": status
+        })
+    df_estoque = pd.DataFrame(data_list)
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Total de Produtos", len(prods))
+    stock_value = sum(
+        (p.stock or 0) * (p.avg_cost if p.avg_cost is not None else p.price_wholesale or 0.0) for p in prods
+    )
+    m2.metric("Valor em Estoque (Custo Médio)", brl(stock_value))
+    m3.metric("Alertas de Reposição", low_stock_count, delta=-low_stock_count if low_stock_count > 0 else 0, delta_color="inverse")
+
+    st.divider()
+
+    # Previsão de reposição (todos os SKUs de uma vez, em cache por empresa)
+    fc_hist = int(st.session_state.get("fc_hist", 90))
+    fc_lead = int(st.session_state.get("fc_lead", 7))
+    fc_cover = int(st.session_state.get("fc_cover", 14))
+    with profiling.section("previsao_calculo"):
+        df_forecast = api.get_replenishment_forecast_cached(db, cid, fc_hist, fc_lead, fc_cover)
+    forecast_by_id = df_forecast.set_index("product_id") if not df_forecast.empty else None
+
+    tab_visao, tab_repor, tab_previsao, tab_historico, tab_novo, tab_gerenciar, tab_reajuste = st.tabs(
+        ["📋 Visão Geral & Alertas", "➕ Repor Estoque", "🔮 Previsão de Reposição", "📜 Histórico",
+         "✨ Novo Produto", "🛠️ Editar / Excluir", "🏷️ Reajuste em Massa"]
+    )
+
+    with tab_visao, profiling.section("visao"):
+        if low_stock_count > 0:
+            st.warning(f"⚠️ Atenção! Existem {low_stock_count} produtos com estoque abaixo do mínimo.")
+
+        st.dataframe(
+            df_estoque,
+            column_config={
+                "Preço Venda (R$)": st.column_config.NumberColumn(format="R$ %.2f"),
+                "Estoque Atual": st.column_config.ProgressColumn(
+                    "Nível de Estoque",
+                    format="%d",
+                    min_value=0,
+                    max_value=100,
+                ),
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+
+    # ✅ corrigido: tudo dentro do tab_repor
+    with tab_repor, profiling.section("repor"):
+        c_r1, c_r2 = st.columns([1, 1])
+        with c_r1:
+            st.markdown("### 📥 Entrada de Mercadoria")
+            st.info("Esta ação aumentará o estoque e lançará uma despesa no financeiro automaticamente.")
+
+            prods = api.get_products(db, cid)
+            if not prods:
+                st.warning("Nenhum produto cadastrado. Cadastre um produto na aba ✨ Novo Produto para poder repor estoque.")
+            else:
+                prod_options = {f"{p.sku} - {p.name} (Atual: {p.stock})": p.id for p in prods}
+                selected_label = st.selectbox("Selecione o Produto", options=list(prod_options.keys()), key="repor_prod")
+                selected_id = prod_options.get(selected_label)
+
+                suggested = 0
+                if forecast_by_id is not None and selected_id in forecast_by_id.index:
+                    suggested = int(forecast_by_id.at[selected_id, "suggested_qty"])
+
+                with st.form("form_repor"):
+                    r_qty = st.number_input("Quantidade a Adicionar", min_value=1, step=1,
+                                            value=max(suggested, 1), key=f"repor_qty_{selected_id}")
+                    r_cost = st.number_input(
+                        "Custo Unitário de Compra (R$)",
+                        min_value=0.01,
+                        format="%.2f",
+                        help="Quanto você pagou por cada unidade ao fornecedor?"
+                    )
+
+                    if st.form_submit_button("✅ Confirmar Entrada"):
+                        ok, msg = api.restock_product(db, cid, selected_id, r_qty, r_cost)
+                        if ok:
+                            st.success("Estoque atualizado e custo lançado no Financeiro!")
+                            st.rerun()
+                        else:
+                            st.error(msg)
+
+        with c_r2:
+            if forecast_by_id is not None and prods and selected_id in forecast_by_id.index:
+                fc = forecast_by_id.loc[selected_id]
+                st.markdown("### 🔮 Sugestão de Compra")
+                f1, f2, f3 = st.columns(3)
+                f1.metric("Venda média", f"{fc['velocity']:.1f} un/dia")
+                f2.metric("Cobertura", "∞" if fc["days_of_cover"] == float("inf") else f"{fc['days_of_cover']:.0f} dias")
+                f3.metric("Sugerido", f"{int(fc['suggested_qty'])} un")
+                st.caption(f"Prazo do fornecedor {fc_lead} dias + cobertura de {fc_cover} dias, "
+                           f"com base nos últimos {fc_hist} dias de vendas.")
+
+    with tab_previsao, profiling.section("previsao"):
+        st.markdown("### 🔮 Previsão de Reposição")
+        p1, p2, p3 = st.columns(3)
+        p1.number_input("Histórico (dias)", min_value=14, max_value=730, value=fc_hist, step=7, key="fc_hist")
+        p2.number_input("Prazo do fornecedor (dias)", min_value=0, max_value=120, value=fc_lead, key="fc_lead")
+        p3.number_input("Cobertura desejada (dias)", min_value=1, max_value=180, value=fc_cover, key="fc_cover")
+
+        if df_forecast.empty:
+            st.info("Cadastre produtos para ver a previsão.")
+        else:
+            only_needed = st.toggle("Mostrar só produtos que precisam de compra", value=True, key="fc_only")
+            df_view = df_forecast.sort_values(["suggested_qty", "days_of_cover"], ascending=[False, True])
+            if only_needed:
+                df_view = df_view[df_view["suggested_qty"] > 0]
+            st.dataframe(
+                df_view.drop(columns=["product_id"]).head(500),
+                column_config={
+                    "sku": "SKU",
+                    "name": "Produto",
+                    "stock": "Estoque",
+                    "stock_min": "Mínimo",
+                    "velocity": st.column_config.NumberColumn("Venda média (un/dia)", format="%.2f"),
+                    "days_of_cover": st.column_config.NumberColumn("Cobertura (dias)", format="%.0f"),
+                    "forecast": st.column_config.NumberColumn("Demanda prevista", format="%.0f"),
+                    "suggested_qty": st.column_config.NumberColumn("Comprar (un)", format="%d"),
+                },
+                use_container_width=True,
+                hide_index=True
+            )
+            st.caption(f"{int((df_forecast['suggested_qty'] > 0).sum())} produtos com compra sugerida.")
+
+    with tab_historico, profiling.section("historico"):
+        if not prods:
+            st.info("Nenhum produto cadastrado.")
+        else:
+            h_options = {f"{p.sku} - {p.name}": p.id for p in prods}
+            c_h1, c_h2 = st.columns([2, 1])
+            with c_h1:
+                h_label = st.selectbox("Produto", options=list(h_options.keys()), key="hist_prod")
+            with c_h2:
+                h_day = st.date_input("Estoque em", value=datetime.now().date(), key="hist_day")
+            h_id = h_options[h_label]
+
+            h_at = datetime.combine(h_day, datetime.max.time())
+            stock_then = api.get_stock_at(db, cid, h_at, [h_id]).get(h_id, 0)
+            st.metric(f"Estoque ao fim de {h_day:%d/%m/%Y}", stock_then)
+
+            df_mov = api.get_stock_movements(db, cid, h_id, h_at - timedelta(days=90), h_at)
+            if df_mov.empty:
+                st.info("Sem movimentos nos 90 dias anteriores.")
+            else:
+                st.dataframe(
+                    df_mov,
+                    column_config={
+                        "date": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY HH:mm"),
+                        "kind": "Tipo",
+                        "delta": "Movimento",
+                        "balance_after": "Saldo",
+                        "ref_id": "Referência",
+                    },
+                    use_container_width=True,
+                    hide_index=True
+                )
+
+            st.divider()
+            st.markdown("#### 🔎 Conferência")
+            c_v1, c_v2 = st.columns(2)
+            with c_v1:
+                if st.button("Conferir estoque x razão", use_container_width=True):
+                    df_div = api.verify_stock_ledger(db, cid)
+                    if df_div.empty:
+                        st.success("Todos os produtos conferem com o razão.")
+                    else:
+                        st.warning(f"{len(df_div)} produto(s) divergente(s).")
+                        st.dataframe(df_div, use_container_width=True, hide_index=True)
+            with c_v2:
+                with st.form("form_ajuste"):
+                    counted = st.number_input("Contagem física", min_value=0, step=1,
+                                              value=int(next((p.stock for p in prods if p.id == h_id), 0) or 0))
+                    if st.form_submit_button("Ajustar estoque", use_container_width=True):
+                        ok, msg = api.adjust_stock(db, cid, h_id, int(counted), st.session_state.get("user_id"))
+                        if ok:
+                            st.success(msg)
+                            st.rerun()
+                        else:
+                            st.error(msg)
+
+    with tab_novo, profiling.section("novo"):
+        st.markdown("### ✨ Cadastro de Produto")
+        with st.form("form_novo_prod"):
+            c_n1, c_n2 = st.columns(2)
+            with c_n1:
+                n_nome = st.text_input("Nome do Produto", placeholder="Ex: Capa iPhone 15")
+                n_sku = st.text_input("Código SKU / Barras", placeholder="Ex: CAP-IP15-SIL")
+            with c_n2:
+                n_venda = st.number_input("Preço de Venda (R$)", min_value=0.0)
+                n_custo_base = st.number_input("Preço de Custo Base (R$)", min_value=0.0)
+
+            n_min = st.number_input("Estoque Mínimo (Alerta)", min_value=1, value=5,
+                                    help="O sistema avisará quando o estoque for menor que este número.")
+
+            if st.form_submit_button("💾 Salvar Produto"):
+                if n_nome and n_sku:
+                    api.register_product(db, cid, n_nome, n_venda, n_custo_base, n_min, n_sku)
+                    st.success(f"Produto {n_nome} cadastrado com sucesso!")
+                    st.rerun()
+                else:
+                    st.error("Preencha o Nome e o SKU.")
+
+    with tab_gerenciar, profiling.section("gerenciar"):
+        st.markdown("### 🛠️ Editar / Excluir Produto")
+
+        prods = api.get_products(db, cid)
+        if not prods:
+            st.info("Cadastre um produto primeiro para editar ou excluir.")
+        else:
+            options = {f"{p.sku} — {p.name} (ID {p.id})": p for p in prods}
+            label = st.selectbox("Selecione um produto", list(options.keys()))
+            prod = options[label]
+
+            st.markdown("#### ✏️ Editar")
+            # O formulário edita a versão carregada na primeira exibição; se
+            # outro usuário salvar antes, o UPDATE não casa e a tela mostra os
+            # valores atuais no lugar dos digitados
+            base_key = f"edit_base_{prod.id}"
+            base = st.session_state.setdefault(base_key, prod)
+            with st.form(f"form_edit_prod_{prod.id}_{base.version}"):
+                c1, c2 = st.columns(2)
+                with c1:
+                    e_name = st.text_input("Nome", value=base.name or "")
+                    e_sku = st.text_input("SKU", value=base.sku or "")
+                    e_min = st.number_input("Estoque mínimo", min_value=1, value=int(base.stock_min or 1))
+                with c2:
+                    e_retail = st.number_input("Preço venda (R$)", min_value=0.0, value=float(base.price_retail or 0.0))
+                    e_wholesale = st.number_input("Preço custo (R$)", min_value=0.0, value=float(base.price_wholesale or 0.0))
+                    st.write(f"Estoque atual: **{prod.stock}**")
+
+                if st.form_submit_button("💾 Salvar alterações", use_container_width=True):
+                    ok, msg, current = api.update_product(db, cid, prod.id, e_name, e_sku, e_retail, e_wholesale,
+                                                          e_min, version=base.version)
+                    if ok:
+                        st.session_state.pop(base_key, None)
+                        st.session_state["edit_prod_msg"] = msg
+                        st.rerun()
+                    elif current is not None and current.version != base.version:
+                        st.session_state[base_key] = current
+                        st.session_state["edit_prod_conflict"] = {
+                            "Campo": ["Nome", "SKU", "Preço venda", "Preço custo", "Estoque mínimo"],
+                            "Seu valor": [e_name, e_sku, e_retail, e_wholesale, e_min],
+                            "Valor atual": [current.name, current.sku, current.price_retail,
+                                            current.price_wholesale, current.stock_min],
+                        }
+                        st.rerun()
+                    else:
+                        st.error(msg)
+
+            if st.session_state.get("edit_prod_msg"):
+                st.success(st.session_state.pop("edit_prod_msg"))
+            conflict = st.session_state.pop("edit_prod_conflict", None)
+            if conflict:
+                st.warning(f"{api.PRODUCT_EDIT_CONFLICT}. O formulário foi recarregado com os valores atuais; "
+                           "refaça as suas alterações e salve de novo.")
+                st.dataframe(pd.DataFrame(conflict).astype(str), use_container_width=True, hide_index=True)
+
+            st.divider()
+
+            st.markdown("#### 🗑️ Excluir")
+            st.warning("Exclusão é permanente. Se houver vendas desse produto, o sistema bloqueia para não perder histórico.")
+            confirm = st.checkbox("Confirmo que quero excluir este produto", value=False)
+
+            if st.button("🗑️ Excluir produto", type="primary", use_container_width=True, disabled=not confirm):
+                ok, msg = api.delete_product(db, cid, prod.id)
+                if ok:
+                    st.success(msg)
+                    st.rerun()
+                else:
+                    st.error(msg)
+
+    with tab_reajuste, profiling.section("reajuste"):
+        st.markdown("### 🏷️ Reajuste de Preços em Massa")
+
+        c_f1, c_f2, c_f3, c_f4 = st.columns([1, 1, 0.6, 0.6])
+        rp_sku = c_f1.text_input("SKU", placeholder="Ex: CAP-* (use * como curinga)", key="rp_sku")
+        rp_name = c_f2.text_input("Nome contém", key="rp_name")
+        rp_min = c_f3.number_input("Venda de (R$)", min_value=0.0, value=0.0, key="rp_min")
+        rp_max = c_f4.number_input("Venda até (R$)", min_value=0.0, value=0.0, key="rp_max",
+                                   help="0 = sem limite")
+
+        target_labels = {
+            "Preço de venda": ("price_retail",),
+            "Preço de custo": ("price_wholesale",),
+            "Venda e custo": ("price_retail", "price_wholesale"),
+        }
+        rule_labels = {"Percentual (%)": "percent", "Valor fixo (R$)": "absolute", "Markup sobre o custo (%)": "markup"}
+        ending_labels = {"Sem arredondamento": None, "Final ,90": 0.90, "Final ,99": 0.99, "Inteiro (,00)": 0.0}
+
+        c_r1, c_r2, c_r3, c_r4 = st.columns(4)
+        rp_targets = target_labels[c_r1.selectbox("Reajustar", list(target_labels.keys()), key="rp_target")]
+        rp_rule = rule_labels[c_r2.selectbox("Regra", list(rule_labels.keys()), key="rp_rule")]
+        rp_value = c_r3.number_input("Valor", value=0.0, step=1.0, key="rp_value",
+                                     help="Ex.: 8 = +8%; -2 = R$ 2,00 a menos; 60 = custo + 60%")
+        rp_ending = ending_labels[c_r4.selectbox("Arredondamento", list(ending_labels.keys()), key="rp_ending")]
+
+        rp_filters = {
+            "sku_pattern": rp_sku,
+            "name_contains": rp_name,
+            "price_min": rp_min or None,
+            "price_max": rp_max or None,
+        }
+        try:
+            df_rp = api.preview_reprice(db, cid, rp_targets, rp_rule, rp_value, rp_ending, **rp_filters)
+        except ValueError as e:
+            st.error(str(e))
+            df_rp = None
+
+        if df_rp is not None:
+            if df_rp.empty:
+                st.info("Nenhum produto com esses filtros.")
+            else:
+                changed = df_rp[df_rp["changed"]]
+                k1, k2, k3 = st.columns(3)
+                k1.metric("Produtos selecionados", len(df_rp))
+                k2.metric("Preços alterados", len(changed))
+                k3.metric("Margem média",
+                          f"{df_rp['new_margin'].mean():.1%}" if df_rp["new_margin"].notna().any() else "-",
+                          f"{(df_rp['new_margin'].mean() - df_rp['margin'].mean()) * 100:+.1f} p.p."
+                          if df_rp["margin"].notna().any() and df_rp["new_margin"].notna().any() else None)
+
+                st.dataframe(
+                    df_rp.drop(columns=["id", "changed"]).head(500),
+                    column_config={
+                        "sku": "SKU",
+                        "name": "Produto",
+                        "price_retail": st.column_config.NumberColumn("Venda atual", format="R$ %.2f"),
+                        "price_wholesale": st.column_config.NumberColumn("Custo atual", format="R$ %.2f"),
+                        "new_price_retail": st.column_config.NumberColumn("Nova venda", format="R$ %.2f"),
+                        "new_price_wholesale": st.column_config.NumberColumn("Novo custo", format="R$ %.2f"),
+                        "margin": st.column_config.NumberColumn("Margem atual", format="percent"),
+                        "new_margin": st.column_config.NumberColumn("Nova margem", format="percent"),
+                    },
+                    use_container_width=True,
+                    hide_index=True
+                )
+                if len(df_rp) > 500:
+                    st.caption(f"Mostrando 500 de {len(df_rp)} produtos.")
+
+                rp_confirm = st.checkbox(f"Confirmo o reajuste de {len(changed)} produto(s)", key="rp_confirm")
+                if st.button("✅ Aplicar reajuste", type="primary", use_container_width=True,
+                             disabled=not rp_confirm or changed.empty):
+                    ok, msg = api.apply_reprice(db, cid, rp_targets, rp_rule, rp_value, rp_ending, **rp_filters)
+                    if ok:
+                        st.success(msg)
+                        st.rerun()
+                    else:
+                        st.error(msg)
@@ -0,0 +1,331 @@
+# views/financeiro.py
+from datetime import datetime, timedelta
+
+import pandas as pd
+import streamlit as st
+
+import receipts
+import reports
+import profiling
+import statements
+import services as api
+from views.common import brl, current_page, page_selector, paged_table_controls, reset_page
+
+
+# --- Relatórios em segundo plano (jobs.py / reports.py) ---
+def report_jobs_panel():
+    jobs = [reports.report_jobs.get(j) for j in st.session_state.get("report_jobs", [])]
+    jobs = [j for j in jobs if j is not None][:5]
+    if not jobs:
+        return
+    pending = any(not j.finished for j in jobs)
+
+    @st.fragment(run_every=1.0 if pending else None)
+    def _panel():
+        for job in jobs:
+            if job.status == "done":
+                st.download_button(
+                    f"📥 {job.filename} ({job.message})",
+                    job.read_bytes(),
+                    file_name=job.filename,
+                    mime=job.mime,
+                    key=f"dl_{job.id}",
+                    use_container_width=True
+                )
+            elif job.status == "error":
+                st.error(f"{job.filename}: {job.error}")
+            else:
+                st.progress(job.progress, text=f"{job.filename} — {job.message}")
+
+    _panel()
+
+
+def render(db, cid: int):
+    st.title("Gestão Financeira Integrada")
+
+    tab_fechamento, tab_calendario = st.tabs(["📊 Fechamento de Caixa", "🗓️ Calendário Fiscal & Despesas"])
+
+    with tab_fechamento, profiling.section("fechamento"):
+        st.markdown("### Selecione o Período")
+
+        c_date1, c_date2 = st.columns(2)
+        with c_date1:
+            dt_inicio = st.date_input("Data Início", datetime.now().replace(day=1))
+        with c_date2:
+            dt_fim = st.date_input("Data Fim", datetime.now())
+
+        dt_start_full = datetime.combine(dt_inicio, datetime.min.time())
+        dt_end_full = datetime.combine(dt_fim, datetime.max.time())
+
+        if st.button("🔍 Gerar Fechamento"):
+            st.session_state["fechamento_range"] = (dt_start_full, dt_end_full)
+            for k in ("fech_sales_page", "fech_exp_page"):
+                st.session_state.pop(k, None)
+
+        if st.session_state.get("fechamento_range"):
+            f_start, f_end = st.session_state["fechamento_range"]
+            totals = api.get_financial_totals(db, cid, f_start, f_end)
+
+            total_entradas = totals["sales_total"]
+            total_saidas = totals["expenses_total"]
+            saldo = total_entradas - total_saidas
+
+            st.caption(f"Período: {f_start:%d/%m/%Y} a {f_end:%d/%m/%Y}")
+
+            col_kpi1, col_kpi2, col_kpi3 = st.columns(3)
+            col_kpi1.markdown(f"""
+                <div class="fin-card-white" style="padding: 20px;">
+                    <div class="fin-title">Total Entradas ({totals['sales_count']} vendas)</div>
+                    <div style="color: #10B981; font-size: 1.8rem; font-weight: 800;">{brl(total_entradas)}</div>
+                </div>""", unsafe_allow_html=True)
+
+            col_kpi2.markdown(f"""
+                <div class="fin-card-white" style="padding: 20px;">
+                    <div class="fin-title">Total Saídas ({totals['expenses_count']} lançamentos)</div>
+                    <div style="color: #FF4B4B; font-size: 1.8rem; font-weight: 800;">{brl(total_saidas)}</div>
+                </div>""", unsafe_allow_html=True)
+
+            cor_saldo = "#10B981" if saldo >= 0 else "#FF4B4B"
+            col_kpi3.markdown(f"""
+                <div class="fin-card-white" style="padding: 20px; border: 2px solid {cor_saldo};">
+                    <div class="fin-title">Saldo Líquido</div>
+                    <div style="color: {cor_saldo}; font-size: 1.8rem; font-weight: 800;">{brl(saldo)}</div>
+                </div>""", unsafe_allow_html=True)
+
+            st.markdown("#### 📄 Exportar Fechamento")
+            c_exp1, c_exp2, _ = st.columns([0.25, 0.25, 0.5])
+            for col, fmt, label in ((c_exp1, "pdf", "📄 Relatório PDF"), (c_exp2, "csv", "📊 Extrato CSV")):
+                if col.button(label, key=f"fech_export_{fmt}", use_container_width=True):
+                    job = reports.submit_closing_report(db, cid, f_start, f_end, fmt)
+                    jobs_ids = st.session_state.setdefault("report_jobs", [])
+                    if job.id not in jobs_ids:
+                        jobs_ids.insert(0, job.id)
+            report_jobs_panel()
+
+            with st.expander("🔢 Conferir numeração dos cupons"):
+                if st.button("Conferir agora", key="fech_receipts_check"):
+                    check = receipts.check_receipt_numbers(db, cid)
+                    if check["ok"]:
+                        st.success(f"{check['used']} cupons em {check['blocks']} blocos, sem duplicidades nem buracos.")
+                    for number in check["duplicates"]:
+                        st.error(f"Número {number} usado em mais de um cupom.")
+                    for hole in check["holes"]:
+                        st.warning(f"Terminal {hole['terminal']}: número(s) pulado(s) "
+                                   + ", ".join(str(n) for n in hole["numbers"][:20]))
+                    if check["outside"]:
+                        st.error(f"{check['outside']} cupom(ns) com número fora dos blocos reservados.")
+                    st.caption(f"{check['unused']} números reservados ainda não usados "
+                               "(blocos em uso ou de terminais reiniciados).")
+                    if check["returned"]:
+                        st.caption(f"{check['returned']} número(s) devolvido(s) por vendas que não foram "
+                                   "gravadas e não reaproveitados (terminal reiniciado).")
+
+            with st.expander("📈 Margem bruta (custo médio)"):
+                total = api.get_margin_report(db, cid, f_start, f_end, by="total")
+                if total.empty:
+                    st.info("Nenhuma venda neste período.")
+                else:
+                    t = total.iloc[0]
+                    c_m1, c_m2, c_m3 = st.columns(3)
+                    c_m1.metric("Receita", brl(t["revenue"]))
+                    c_m2.metric("Custo das vendas", brl(t["cost"]))
+                    c_m3.metric("Margem bruta", brl(t["margin"]), f"{t['margin_pct']:.1f}%")
+                    if t["uncosted_qty"]:
+                        st.warning(f"{int(t['uncosted_qty'])} unidade(s) vendida(s) sem custo registrado: "
+                                   "a margem está superestimada.")
+
+                    by = st.radio("Agrupar por", ["product", "day"], horizontal=True, key="fech_margin_by",
+                                  format_func={"product": "Produto", "day": "Dia"}.get)
+                    df_margin = api.get_margin_report(db, cid, f_start, f_end, by=by)
+                    st.dataframe(
+                        df_margin.drop(columns=["product_id"], errors="ignore").rename(columns={
+                            "product_name": "Produto", "sku": "SKU", "day": "Dia", "quantity": "Qtd",
+                            "revenue": "Receita (R$)", "cost": "Custo (R$)", "margin": "Margem (R$)",
+                            "margin_pct": "Margem %", "uncosted_qty": "Qtd sem custo"
+                        }),
+                        use_container_width=True,
+                        hide_index=True,
+                        column_config={"Margem %": st.column_config.NumberColumn(format="%.1f%%")}
+                    )
+
+            with st.expander("👥 Desempenho por caixa"):
+                by = st.radio("Visão", ["total", "hour", "shift"], horizontal=True, key="fech_cashier_by",
+                              format_func={"total": "Período", "hour": "Por hora", "shift": "Por turno"}.get)
+                df_cashier = api.get_cashier_report_cached(db, cid, f_start, f_end, by=by)
+                if df_cashier.empty:
+                    st.info("Nenhuma venda neste período.")
+                else:
+                    if by == "hour":
+                        # vazão média (cupons/hora) de cada caixa ao longo do dia
+                        st.dataframe(
+                            df_cashier.pivot_table(index="username", columns="hour", values="orders_per_hour",
+                                                   fill_value=0.0).round(1),
+                            use_container_width=True
+                        )
+                    st.dataframe(
+                        df_cashier.drop(columns=["user_id"]).rename(columns={
+                            "username": "Caixa", "hour": "Hora", "shift": "Turno", "orders": "Cupons",
+                            "units": "Unidades", "revenue": "Faturamento (R$)", "active_days": "Dias com venda",
+                            "avg_ticket": "Ticket médio (R$)", "orders_per_day": "Cupons/dia",
+                            "orders_per_hour": "Cupons/hora"
+                        }),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                    st.download_button(
+                        "📊 Exportar CSV",
+                        df_cashier.to_csv(index=False).encode("utf-8"),
+                        file_name=f"caixas_{by}_{f_start:%Y%m%d}_{f_end:%Y%m%d}.csv",
+                        mime="text/csv",
+                        key="fech_cashier_csv"
+                    )
+
+            st.divider()
+
+            col_det1, col_det2 = st.columns(2)
+
+            with col_det1:
+                st.subheader("📥 Detalhe de Entradas (Vendas)")
+                if totals["sales_count"] > 0:
+                    sort_by, descending, page_size = paged_table_controls("fech_sales", {
+                        "Data": "date", "Produto": "product_name", "Qtd": "quantity",
+                        "Valor Unit.": "price", "Total": "total",
+                    })
+                    v_search = st.text_input("Filtrar produto", key="fech_sales_search",
+                                             on_change=reset_page, args=("fech_sales_page",))
+                    df_vendas, n_vendas = api.get_sales_page(
+                        db, cid, f_start, f_end,
+                        page=current_page("fech_sales_page"), page_size=page_size,
+                        sort_by=sort_by, descending=descending, search=v_search
+                    )
+                    st.dataframe(
+                        df_vendas.rename(
+                            columns={'date': 'Data', 'product_name': 'Produto', 'quantity': 'Qtd',
+                                     'price': 'Valor Unit. (R$)', 'total': 'Total (R$)'}
+                        ),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                    page_selector("fech_sales_page", n_vendas, page_size)
+                else:
+                    st.info("Nenhuma venda neste período.")
+
+            with col_det2:
+                st.subheader("📤 Detalhe de Saídas (Despesas)")
+                if totals["expenses_count"] > 0:
+                    sort_by, descending, page_size = paged_table_controls("fech_exp", {
+                        "Data": "date", "Categoria": "category", "Descrição": "description", "Valor": "amount",
+                    })
+                    c_f1, c_f2 = st.columns(2)
+                    e_category = c_f1.selectbox(
+                        "Categoria", ["Todas"] + api.get_expense_categories(db, cid, f_start, f_end),
+                        key="fech_exp_category", on_change=reset_page, args=("fech_exp_page",)
+                    )
+                    e_search = c_f2.text_input("Filtrar descrição", key="fech_exp_search",
+                                               on_change=reset_page, args=("fech_exp_page",))
+                    df_despesas, n_despesas = api.get_expenses_page(
+                        db, cid, f_start, f_end,
+                        page=current_page("fech_exp_page"), page_size=page_size,
+                        sort_by=sort_by, descending=descending,
+                        category=None if e_category == "Todas" else e_category, search=e_search
+                    )
+                    st.dataframe(
+                        df_despesas.rename(
+                            columns={'date': 'Data', 'category': 'Categoria', 'description': 'Descrição', 'amount': 'Valor (R$)'}
+                        ),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                    page_selector("fech_exp_page", n_despesas, page_size)
+                else:
+                    st.info("Nenhuma despesa neste período.")
+
+    with tab_calendario, profiling.section("calendario"):
+        c_form, c_list = st.columns([0.4, 0.6], gap="large")
+
+        with c_form:
+            st.markdown('<div class="fin-card-purple">', unsafe_allow_html=True)
+            st.markdown("### 📝 Nova Despesa")
+            with st.form("form_despesa"):
+                d_desc = st.text_input("Descrição", placeholder="Ex: Aluguel, Luz, Fornecedor X")
+                d_valor = st.number_input("Valor (R$)", min_value=0.0, format="%.2f")
+                d_tipo = st.selectbox("Tipo de Despesa", ["Fixa (Recorrente)", "Variável (Extra)", "Impostos", "Pessoal"])
+                d_data = st.date_input("Data de Vencimento/Pagamento", datetime.now())
+
+                submitted = st.form_submit_button("💾 Salvar Despesa", use_container_width=True)
+                if submitted:
+                    if d_desc and d_valor > 0:
+                        d_data_full = datetime.combine(d_data, datetime.now().time())
+                        api.add_expense(db, cid, d_desc, d_valor, d_tipo, d_data_full)
+                        st.success("Despesa lançada com sucesso!")
+                        st.rerun()
+                    else:
+                        st.error("Preencha descrição e valor.")
+            st.markdown('</div>', unsafe_allow_html=True)
+
+            with st.expander("🏦 Importar extrato bancário (OFX/CSV)"):
+                up = st.file_uploader("Arquivo do extrato", type=["ofx", "qfx", "csv", "txt"], key="stmt_file")
+                if "stmt_rules" not in st.session_state:
+                    st.session_state["stmt_rules"] = statements.rules_to_text(statements.default_rules())
+                rules_text = st.text_area(
+                    "Regras de categoria (expressão => categoria, a primeira que casar vale)",
+                    height=140, key="stmt_rules"
+                )
+                if up is not None:
+                    data = up.getvalue()
+                    rules = statements.rules_from_text(rules_text)
+                    try:
+                        df_stmt = api.preview_bank_statement(db, cid, up.name, data, rules)
+                    except ValueError as e:
+                        st.error(str(e))
+                        df_stmt = None
+
+                    if df_stmt is not None:
+                        n_dup = int(df_stmt["duplicate"].sum())
+                        st.caption(f"{len(df_stmt)} saídas no extrato, {len(df_stmt) - n_dup} novas, "
+                                   f"{n_dup} já importadas. Total novo: "
+                                   f"{brl(df_stmt.loc[~df_stmt['duplicate'], 'amount'].sum())}")
+                        st.dataframe(
+                            df_stmt.head(300),
+                            column_config={
+                                "date": st.column_config.DateColumn("Data"),
+                                "description": "Descrição",
+                                "amount": st.column_config.NumberColumn("Valor (R$)", format="R$ %.2f"),
+                                "category": "Tipo",
+                                "duplicate": st.column_config.CheckboxColumn("Já importada"),
+                            },
+                            use_container_width=True,
+                            hide_index=True
+                        )
+                        if st.button("📥 Importar despesas", use_container_width=True,
+                                     disabled=n_dup == len(df_stmt), key="stmt_import"):
+                            ok, msg = api.import_bank_statement(db, cid, up.name, data, rules)
+                            if ok:
+                                st.success(msg)
+                            else:
+                                st.error(msg)
+
+        with c_list:
+            st.subheader("📅 Histórico e Previsão de Contas")
+
+            d_start = datetime.now() - timedelta(days=60)
+            d_end = datetime.now() + timedelta(days=30)
+            _, df_all_expenses = api.get_financial_by_range(db, cid, d_start, d_end)
+
+            if not df_all_expenses.empty:
+                df_all_expenses['date'] = pd.to_datetime(df_all_expenses['date'])
+                df_all_expenses = df_all_expenses.sort_values(by='date', ascending=False)
+
+                st.dataframe(
+                    df_all_expenses[['date', 'category', 'description', 'amount']],
+                    column_config={
+                        "date": st.column_config.DateColumn("Data"),
+                        "amount": st.column_config.NumberColumn("Valor (R$)", format="R$ %.2f"),
+                        "category": "Tipo",
+                        "description": "Descrição"
+                    },
+                    use_container_width=True,
+                    hide_index=True
+                )
+            else:
+                st.info("Nenhuma despesa registrada recentemente.")
@@ -0,0 +1,67 @@
+# views/multiempresa.py
+from datetime import datetime
+
+import streamlit as st
+
+import profiling
+import services as api
+from views.common import brl
+
+
+def render(db, cid: int):
+    st.title("Visão Consolidada das Lojas")
+
+    admin_ids = api.get_admin_company_ids(db, st.session_state["user_id"])
+
+    c_per1, c_per2 = st.columns(2)
+    with c_per1:
+        adm_inicio = st.date_input("Data Início", datetime.now().replace(day=1), key="adm_inicio")
+    with c_per2:
+        adm_fim = st.date_input("Data Fim", datetime.now(), key="adm_fim")
+
+    adm_start = datetime.combine(adm_inicio, datetime.min.time())
+    adm_end = datetime.combine(adm_fim, datetime.max.time())
+
+    with profiling.section("resumo"):
+        df_adm = api.get_admin_summary(admin_ids, adm_start, adm_end)
+
+    if df_adm.empty:
+        st.info("Nenhuma loja vinculada a este usuário.")
+    else:
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Lojas", len(df_adm))
+        m2.metric("Faturamento Total", brl(df_adm["revenue"].sum()))
+        m3.metric("Lucro Total Est.", brl(df_adm["profit"].sum()))
+        m4.metric("Produtos em Alerta", int(df_adm["low_stock"].fillna(0).sum()))
+
+        for _, row in df_adm[df_adm["error"].notna()].iterrows():
+            st.error(f"{row['company']}: {row['error']}")
+
+        st.dataframe(
+            df_adm.drop(columns=["company_id", "error"]),
+            column_config={
+                "rank": "#",
+                "company": "Loja",
+                "revenue": st.column_config.NumberColumn("Faturamento", format="R$ %.2f"),
+                "orders": "Cupons",
+                "avg_ticket": st.column_config.NumberColumn("Ticket Médio", format="R$ %.2f"),
+                "expenses": st.column_config.NumberColumn("Despesas", format="R$ %.2f"),
+                "profit": st.column_config.NumberColumn("Lucro Est.", format="R$ %.2f"),
+                "products": "Produtos",
+                "low_stock": "Estoque Baixo",
+                "inventory_value": st.column_config.NumberColumn("Valor em Estoque", format="R$ %.2f"),
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+
+    with st.expander("➕ Nova loja"):
+        with st.form("form_nova_loja"):
+            nova_loja = st.text_input("Nome da loja")
+            if st.form_submit_button("Criar loja"):
+                ok, msg = api.create_company_for_admin(db, st.session_state["user_id"], nova_loja)
+                if ok:
+                    st.success(msg)
+                    st.rerun()
+                else:
+                    st.error(msg)
@@ -0,0 +1,228 @@
+# views/pdv.py
+import io
+from datetime import datetime
+
+import streamlit as st
+
+import profiling
+import services as api
+from views.common import brl, get_cart, save_session
+
+
+def add_to_cart(product, qty_key: str):
+    # callback do botão: roda antes do rerun, sem tocar no banco
+    cart = get_cart()
+    qty = int(st.session_state.get(qty_key, 1))
+    if cart.qty(product.id) + qty > int(product.stock or 0):
+        st.session_state["pdv_error"] = f"Estoque insuficiente para {product.name}. Disponível: {product.stock}"
+        return
+    cart.add(product.id, product.name, float(product.price_retail or 0.0), qty, product.sku)
+
+
+def generate_receipt_80mm(cart, total, payment, discount_amount=0.0, subtotal=None, receipt_number=None):
+    from fpdf import FPDF
+
+    pdf = FPDF("P", "mm", (80, 200))
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=5)
+
+    pdf.set_font("Helvetica", "B", 12)
+    pdf.cell(0, 6, "PEEGFLOW", ln=True, align="C")
+    pdf.set_font("Helvetica", "", 9)
+    pdf.cell(0, 5, "CUPOM NAO FISCAL", ln=True, align="C")
+    if receipt_number is not None:
+        pdf.cell(0, 5, f"No {receipt_number:06d}", ln=True, align="C")
+    pdf.ln(3)
+
+    for item in cart:
+        name = (item.get("name") or "")[:32]
+        qty = int(item.get("qty", 1))
+        price = float(item.get("price", 0.0))
+
+        pdf.set_font("Helvetica", "B", 9)
+        pdf.multi_cell(0, 4, name)
+
+        pdf.set_font("Helvetica", "", 9)
+        pdf.cell(
+            0, 5,
+            f'{qty} x R$ {price:.2f} = R$ {(price * qty):.2f}',
+            ln=True
+        )
+
+    pdf.ln(2)
+    if discount_amount:
+        pdf.set_font("Helvetica", "", 9)
+        if subtotal is not None:
+            pdf.cell(0, 5, f"Subtotal: R$ {subtotal:.2f}", ln=True)
+        pdf.cell(0, 5, f"Desconto: - R$ {discount_amount:.2f}", ln=True)
+
+    pdf.set_font("Helvetica", "B", 11)
+    pdf.cell(0, 6, f"TOTAL: R$ {total:.2f}", ln=True)
+
+    pdf.set_font("Helvetica", "", 9)
+    pdf.cell(0, 5, f"Pagamento: {payment}", ln=True)
+    pdf.cell(0, 5, datetime.now().strftime("%d/%m/%Y %H:%M"), ln=True)
+
+    # ✅ jeito correto: gerar bytes
+    pdf_bytes = pdf.output(dest="S").encode("latin-1")
+    buffer = io.BytesIO(pdf_bytes)
+    buffer.seek(0)
+    return buffer
+
+# --- CUPOM: fragmento próprio (➕/➖/❌ não re-renderizam a vitrine nem consultam o banco) ---
+@st.fragment
+def cart_panel(db, cid: int, user_id: int):
+    st.subheader("🧾 Cupom")
+    cart = get_cart()
+
+    if not cart:
+        st.info("Carrinho vazio.")
+    else:
+        # ---- Desconto ----
+        st.markdown("### 🏷️ Desconto")
+        d1, d2 = st.columns(2)
+
+        with d1:
+            discount_type = st.selectbox("Tipo", ["R$", "%"], key="disc_type")
+        with d2:
+            if discount_type == "%":
+                discount_value = st.number_input("Valor (%)", min_value=0.0, max_value=100.0, step=1.0, key="disc_val_pct")
+            else:
+                discount_value = st.number_input("Valor (R$)", min_value=0.0, step=1.0, key="disc_val_brl")
+        cart.set_discount(discount_type, discount_value)
+
+        # ---- Itens (totais já mantidos pelo carrinho) ----
+        st.markdown(f"### 📦 Itens ({cart.units})")
+
+        for item in reversed(list(cart)):
+            row1, row2 = st.columns([0.7, 0.3])
+            with row1:
+                st.write(f'**{item.name}**  \nSKU: `{item.sku or "-"}`  \n{item.qty} x {brl(item.price)}')
+            with row2:
+                st.write(f'**{brl(item.line_total)}**')
+
+            c1, c2, c3 = st.columns(3)
+            c1.button("➕", key=f"inc_{item.id}", use_container_width=True, on_click=cart.increment, args=(item.id, 1))
+            c2.button("➖", key=f"dec_{item.id}", use_container_width=True, on_click=cart.increment, args=(item.id, -1))
+            c3.button("❌", key=f"del_{item.id}", use_container_width=True, on_click=cart.remove, args=(item.id,))
+
+            st.divider()
+
+        # ---- Quadro de totais ----
+        with st.container(border=True):
+            t1, t2 = st.columns(2)
+            t1.write("Subtotal")
+            t2.write(f"**{brl(cart.subtotal)}**")
+
+            t1, t2 = st.columns(2)
+            t1.write("Desconto")
+            t2.write(f"**- {brl(cart.discount_amount)}**")
+
+            st.divider()
+
+            t1, t2 = st.columns(2)
+            t1.write("TOTAL")
+            t2.markdown(f"## {brl(cart.total)}")
+
+        payment = st.radio("Pagamento", ["PIX", "Dinheiro", "Cartão"], horizontal=True, key="pdv_payment")
+
+        # -------- FINALIZAR VENDA --------
+        if st.button("FINALIZAR VENDA (F10)", type="primary", use_container_width=True):
+            # estoque validado e baixado na mesma transação do cupom
+            ok, msg, order_id = api.checkout_cart(
+                db,
+                cid,
+                user_id,
+                cart.lines(),
+                discount_amount=cart.discount_amount,
+                payment=payment
+            )
+
+            if not ok:
+                st.error(msg)
+            else:
+                st.session_state["last_receipt"] = {
+                    "order_id": order_id,
+                    "receipt_number": api.get_receipt_number(db, cid, order_id),
+                    "cart": cart.lines(),
+                    "total": cart.total,
+                    "subtotal": cart.subtotal,
+                    "discount_amount": cart.discount_amount,
+                    "payment": payment
+                }
+
+                cart.clear()
+                st.success("Venda concluída!")
+                st.rerun()   # app inteiro: a vitrine mostra o estoque novo
+
+    # -------- IMPRIMIR ÚLTIMO CUPOM --------
+    last = st.session_state.get("last_receipt")
+    if last is not None:
+        if st.button("🧾 Imprimir Último Cupom", use_container_width=True):
+            pdf = generate_receipt_80mm(
+                last["cart"],
+                last["total"],
+                last["payment"],
+                discount_amount=last["discount_amount"],
+                subtotal=last["subtotal"],
+                receipt_number=last.get("receipt_number")
+            )
+            st.download_button(
+                "📥 Baixar Último Cupom (80mm)",
+                pdf,
+                file_name=f"cupom_{last.get('receipt_number') or 'ultimo'}.pdf",
+                mime="application/pdf",
+                use_container_width=True
+            )
+
+    if cart:
+        st.button("🗑️ Limpar Carrinho", use_container_width=True, on_click=cart.clear)
+
+    # rerun só do fragmento não chega ao fim do main.py: persiste aqui
+    save_session()
+
+
+def render(db, cid: int):
+    st.title("Ponto de Venda")
+
+    get_cart()
+    if "last_receipt" not in st.session_state:
+        st.session_state["last_receipt"] = None
+
+    col_prod, col_receipt = st.columns([0.6, 0.4], gap="large")
+
+    # ---------------- PRODUTOS ----------------
+    with col_prod, profiling.section("vitrine"):
+        search = st.text_input("🔍 Pesquisar produto ou código de barras...", placeholder="Ex: iPhone...")
+        prods = api.get_product_catalog(db, cid)
+
+        pdv_error = st.session_state.pop("pdv_error", None)
+        if pdv_error:
+            st.error(pdv_error)
+
+        filtered = [
+            p for p in prods
+            if search.lower() in (p.name or "").lower()
+            or search.lower() in (p.sku or "").lower()
+        ]
+
+        p_cols = st.columns(3)
+        for i, p in enumerate(filtered):
+            with p_cols[i % 3]:
+                st.markdown(f"""
+                <div style="background:white;padding:20px;border-radius:15px;border:1px solid #E0E5F2;text-align:center;margin-bottom:10px;">
+                    <div style="font-size:2rem;">📦</div>
+                    <div style="font-weight:700;color:#1B2559;margin:10px 0;">{p.name}</div>
+                    <div style="color:#6366F1;font-weight:800;">{brl(p.price_retail)}</div>
+                    <div style="color:#64748B;font-size:0.85rem;">SKU: {p.sku or "-"}</div>
+                    <div style="color:#64748B;font-size:0.85rem;">Estoque: {p.stock}</div>
+                </div>
+                """, unsafe_allow_html=True)
+
+                st.number_input("Qtd", min_value=1, step=1, value=1, key=f"pdv_qty_{p.id}")
+                st.button("Adicionar", key=f"add_{p.id}", use_container_width=True,
+                          on_click=add_to_cart, args=(p, f"pdv_qty_{p.id}"))
+
+    # ---------------- CUPOM ----------------
+    with col_receipt, profiling.section("cupom"):
+        cart_panel(db, cid, st.session_state["user_id"])